@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from package.utils.data_classes import DataPoint
+from package.utils.file_reader import anaRead, anaReadArrays
+
+"""
+Compares the bulk .ana reader against the original byte-at-a-time loop.
+Run from the project root:
+    python -m benchmarks.ana_reader_benchmark -mb 100 -c 4
+
+The legacy loop is only timed on the first --legacy_mb megabytes since it
+takes minutes on large files; its throughput is extrapolated to the full size.
+"""
+
+
+def legacyAnaRead(filepath: str, limit: int) -> list[DataPoint]:
+    """The original anaDecode/anaRead loop, reading at most limit bytes"""
+    lines = []
+    with open(filepath, "rb") as f:
+        f.read(1)
+        f.read(1)
+        line = ""
+        for _ in range(limit):
+            c = f.read(1)
+            if not c:
+                break
+            if c == b"\n":
+                f.read(1)
+                lines.append(line)
+                line = ""
+            if c != b"\x00":
+                line += c.decode("utf-8", errors="ignore")
+    data = []
+    for elem in lines:
+        if not elem:
+            continue
+        channel, time, voltage = elem.split()
+        data.append(DataPoint(time, voltage, channel))
+    return data
+
+
+def makeAnaFile(filepath: str, size: int, channels: int, sampleRate: int):
+    """Writes a UTF-16 encoded .ana file of roughly size bytes"""
+    rows = []
+    written = 0
+    sample = 0
+    with open(filepath, "wb") as f:
+        f.write(b"\xff\xfe")
+        while written < size:
+            for channel in range(1, channels + 1):
+                voltage = random.uniform(-5, 5)
+                rows.append(f"{channel}\t{sample / sampleRate:.4f}\t{voltage:.6f}\r\n")
+            sample += 1
+            if len(rows) >= 100000:
+                block = "".join(rows).encode("utf-16-le")
+                f.write(block)
+                written += len(block)
+                rows = []
+        f.write("".join(rows).encode("utf-16-le"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-mb", "--megabytes", type=int, help="size of the generated file", default=100
+    )
+    parser.add_argument(
+        "-c", "--channels", type=int, help="the number of channels", default=4
+    )
+    parser.add_argument(
+        "-l",
+        "--legacy_mb",
+        type=float,
+        help="megabytes the legacy reader is timed on",
+        default=2,
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "benchmark.ana")
+        print("Generating data...")
+        makeAnaFile(filepath, args.megabytes * 2**20, args.channels, 100)
+        size = os.path.getsize(filepath)
+
+        start = time.perf_counter()
+        data = anaReadArrays(filepath)
+        bulkTime = time.perf_counter() - start
+
+        legacyBytes = int(args.legacy_mb * 2**20)
+        start = time.perf_counter()
+        legacy = legacyAnaRead(filepath, legacyBytes)
+        legacyTime = (time.perf_counter() - start) * size / legacyBytes
+
+        # Both readers must agree on every row the legacy loop got through
+        prefix = anaRead(filepath)[: len(legacy)]
+        assert prefix == legacy, "bulk reader disagrees with legacy reader"
+
+    print("----Benchmark----")
+    print(f"File size : {size / 2**20:.1f} MB ({len(data)} points)")
+    print(f"Legacy reader : {legacyTime:.2f}s (extrapolated from {args.legacy_mb} MB)")
+    print(f"Bulk reader : {bulkTime:.2f}s")
+    print(f"Speedup : {legacyTime / bulkTime:.0f}x")
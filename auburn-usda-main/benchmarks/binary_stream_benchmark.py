@@ -0,0 +1,182 @@
+import argparse
+import os
+import select
+import tempfile
+import threading
+import time
+import tty
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PySide6.QtCore import QEventLoop
+from PySide6.QtWidgets import QApplication
+
+from package.utils.binary_frames import BINARY_BAUD_RATE, FRAME_SAMPLES, encodeFrame
+from package.utils.serial_reader import SerialData
+
+"""
+Streams samples from a simulated EPG over a pseudo-terminal to SerialData,
+once as ASCII lines and once as binary frames, and measures the rate at
+which samples are saved and drawn.
+Run from the project root:
+    python -m benchmarks.binary_stream_benchmark -r 20000 -t 5
+
+The simulated EPG follows resources/teensy_code/epgSim: it answers the
+INIT/BEGIN/PARAM handshake, agreeing to binary frames when asked, then
+sends samples at the requested rate once recording has started. Binary
+frames must arrive without crc errors or lost samples, and both modes must
+keep up with the requested rate. The baud rate each mode would need on a
+hardware UART (8N1) is shown as well, with the highest sample rate each
+fits in at BINARY_BAUD_RATE.
+"""
+
+ASCII_LINE = b"O,%d,%d\r\n"
+
+
+class SimulatedEPG(threading.Thread):
+    """Device end of a pseudo-terminal that behaves like epgSim"""
+
+    def __init__(self, master: int, rate: int):
+        super().__init__(daemon=True)
+        self.master = master
+        self.rate = rate
+        self.binary = False
+        self.sent = 0
+        self.bytesSent = 0
+        self.streaming = threading.Event()
+        self.stopped = threading.Event()
+        self.received = b""
+
+    def readLine(self) -> str:
+        while b"\n" not in self.received:
+            self.received += os.read(self.master, 1024)
+        line, self.received = self.received.split(b"\n", 1)
+        return line.decode().strip()
+
+    def run(self):
+        # Announce the device until the host answers
+        while not select.select([self.master], [], [], 0.1)[0]:
+            os.write(self.master, b"INIT\r\n")
+        begin = self.readLine()
+        self.binary = "BINARY" in begin.split(",")
+        reply = f"BEGIN,{begin.split(',')[1]}(Hz)" + (",BINARY" if self.binary else "")
+        os.write(self.master, (reply + "\r\n").encode())
+        self.readLine()
+        os.write(self.master, b"PARAM,1,100000,0,1,1000,0\r\n")
+
+        self.streaming.wait()
+        started = time.perf_counter()
+        generator = np.random.default_rng(0)
+        while not self.stopped.is_set():
+            due = int((time.perf_counter() - started) * self.rate)
+            if self.binary:
+                # Whole frames only, as the device does
+                due -= (due - self.sent) % FRAME_SAMPLES
+            count = due - self.sent
+            if count > 0:
+                samples = generator.integers(0, 1023, (count, 2))
+                if self.binary:
+                    data = b"".join(
+                        encodeFrame(self.sent + i, samples[i : i + FRAME_SAMPLES])
+                        for i in range(0, count, FRAME_SAMPLES)
+                    )
+                else:
+                    data = b"".join(ASCII_LINE % (pre, post) for pre, post in samples.tolist())
+                os.write(self.master, data)
+                self.sent = due
+                self.bytesSent += len(data)
+            time.sleep(0.002)
+
+
+def stream(app: QApplication, binary: bool, rate: int, seconds: float, directory: str) -> dict:
+    """Records seconds of samples sent at rate over a pseudo-terminal"""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    device = SimulatedEPG(master, rate)
+    device.start()
+
+    serialData = SerialData()
+    serialData.binaryFraming = binary
+    serialData.sampleRate = rate
+    drawn = []
+    serialData.progress.connect(lambda points: drawn.append(len(points)))
+    maxDepths = []
+    serialData.queueMetrics.connect(lambda maxDepth, overflows: maxDepths.append(maxDepth))
+
+    def spin(duration):
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            app.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 20)
+
+    serialData.setUpRequested.emit(os.ttyname(slave), rate, binary)
+    spin(1)
+    serialData.createFile(os.path.join(directory, "binary.csv" if binary else "ascii.csv"))
+    serialData.startReadingData()
+    device.streaming.set()
+    begin = time.perf_counter()
+    spin(seconds)
+    device.stopped.set()
+    device.join()
+    sent = device.sent
+    # Leave time for the last samples to arrive
+    spin(0.5)
+    serialData.stopRequested.emit()
+    serialData.drainQueue()
+    elapsed = time.perf_counter() - begin - 0.5
+    serialData.closeFile()
+    parser = serialData.worker.frameParser
+    serialData.shutdown()
+    os.close(master)
+    os.close(slave)
+
+    with open(serialData.filename) as file:
+        saved = sum(1 for line in file if ",DATA," in line)
+    return {
+        "negotiated": parser is not None,
+        "sent": sent,
+        "saved": saved,
+        "drawn": sum(drawn),
+        "rate": sum(drawn) / elapsed,
+        "bytesPerSample": device.bytesSent / max(sent, 1),
+        "maxDepth": max(maxDepths, default=0),
+        "crcErrors": parser.crcErrors if parser else 0,
+        "lostSamples": parser.lostSamples if parser else 0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r", "--rate", type=int, help="samples per second sent by the EPG", default=20000
+    )
+    parser.add_argument(
+        "-t", "--time", type=float, help="seconds of streaming per mode", default=5
+    )
+    args = parser.parse_args()
+
+    app = QApplication([])
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, binary in (("ASCII", False), ("Binary", True)):
+            print(f"Streaming {name}...")
+            results[name] = stream(app, binary, args.rate, args.time, directory)
+
+    binary = results["Binary"]
+    assert binary["negotiated"], "binary framing was not agreed on"
+    assert binary["crcErrors"] == 0 and binary["lostSamples"] == 0, "binary frames were lost"
+    for name, result in results.items():
+        assert result["saved"] == result["drawn"] == result["sent"], f"{name} samples were lost"
+        assert result["rate"] >= 0.95 * args.rate, f"{name} did not keep up with {args.rate} Hz"
+
+    print("----Benchmark----")
+    print(f"Requested : {args.rate} Hz for {args.time}s")
+    for name, result in results.items():
+        print(
+            f"{name} : {result['rate']:.0f} samples/s sustained, {result['drawn']} of {result['sent']} sent, "
+            f"{result['bytesPerSample']:.2f} bytes/sample, needs {result['bytesPerSample'] * 10 * args.rate:.0f} baud "
+            f"(at most {BINARY_BAUD_RATE / 10 / result['bytesPerSample']:.0f} Hz at {BINARY_BAUD_RATE} baud), "
+            f"queue depth up to {result['maxDepth']}"
+        )
+    print(f"Binary frames : {binary['crcErrors']} crc errors, {binary['lostSamples']} samples lost")
@@ -0,0 +1,100 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from package.utils.chunked_store import convertToChunked, readChunked
+from package.utils.file_reader import csvReadArrays
+
+"""
+Compares reading a time window of one channel from a csv recording against
+reading it from a compressed chunked recording (.epgz).
+Run from the project root:
+    python -m benchmarks.chunked_store_benchmark -m 60 -c 4 -ws 2400 -we 2700
+
+The csv path has to read and parse the whole file, while the chunked path
+only reads and decompresses the chunks that overlap the window. Both the
+bytes read from disk and the time taken are reported.
+"""
+
+
+def makeCsvFile(filepath: str, minutes: float, channels: int, sampleRate: int):
+    """Writes a csv recording with interleaved channels"""
+    samples = int(minutes * 60 * sampleRate)
+    times = np.repeat(np.arange(samples) / sampleRate, channels)
+    voltages = np.cumsum(np.random.normal(0, 0.05, samples * channels))
+    channelColumn = np.tile(np.arange(1, channels + 1), samples)
+    with open(filepath, "w") as f:
+        f.write("Time,Voltage,Channel\n")
+        np.savetxt(f, np.column_stack([times, voltages, channelColumn]), fmt="%.4f,%.6f,%d")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-m", "--minutes", type=float, help="length of the generated recording", default=60
+    )
+    parser.add_argument(
+        "-c", "--channels", type=int, help="the number of channels", default=4
+    )
+    parser.add_argument(
+        "-sr", "--sample_rate", type=int, help="samples per second per channel", default=100
+    )
+    parser.add_argument(
+        "-ch", "--channel", type=int, help="channel to read the window of", default=2
+    )
+    parser.add_argument(
+        "-ws", "--window_start", type=float, help="start of the window in seconds", default=2400
+    )
+    parser.add_argument(
+        "-we", "--window_end", type=float, help="end of the window in seconds", default=2700
+    )
+    parser.add_argument(
+        "-z",
+        "--compression",
+        choices=["zlib", "lzma"],
+        help="compression of the chunked recording",
+        default="zlib",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csvPath = os.path.join(directory, "benchmark.csv")
+        print("Generating data...")
+        makeCsvFile(csvPath, args.minutes, args.channels, args.sample_rate)
+        csvSize = os.path.getsize(csvPath)
+
+        start = time.perf_counter()
+        chunkedPath = convertToChunked(csvPath, compression=args.compression)
+        convertTime = time.perf_counter() - start
+        chunkedSize = os.path.getsize(chunkedPath)
+
+        start = time.perf_counter()
+        data = csvReadArrays(csvPath)
+        mask = (
+            (data.channels == args.channel)
+            & (data.times >= args.window_start)
+            & (data.times <= args.window_end)
+        )
+        csvWindow = data[mask]
+        csvTime = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with readChunked(chunkedPath) as store:
+            chunkedWindow = store.readRange(args.channel, args.window_start, args.window_end)
+            bytesRead = store.bytesRead
+        chunkedTime = time.perf_counter() - start
+
+        assert np.array_equal(csvWindow.times, chunkedWindow.times), "windows disagree"
+        assert np.array_equal(csvWindow.voltages, chunkedWindow.voltages), "windows disagree"
+
+    print("----Benchmark----")
+    print(f"Window : channel {args.channel}, {args.window_start}s to {args.window_end}s ({len(chunkedWindow)} points)")
+    print(f"Csv file : {csvSize / 2**20:.1f} MB")
+    print(f"Chunked file : {chunkedSize / 2**20:.1f} MB ({args.compression}, converted in {convertTime:.2f}s)")
+    print(f"Csv read : {csvSize / 2**20:.2f} MB in {csvTime:.3f}s")
+    print(f"Chunked read : {bytesRead / 2**20:.2f} MB in {chunkedTime:.3f}s")
+    print(f"Bytes read : {csvSize / bytesRead:.0f}x fewer")
+    print(f"Speedup : {csvTime / chunkedTime:.0f}x")
@@ -0,0 +1,130 @@
+import argparse
+import time
+
+import numpy as np
+
+from package.utils.decimation import (
+    RELATIVE_CHANGE_SENSITIVITY,
+    DecimationEngine,
+    minMaxDecimate,
+    relativeChangeFilter,
+    strideDecimate,
+)
+from package.utils.enums import DecimationMethod
+
+"""
+Checks the vectorized decimation functions against plain Python loops and
+compares their speed, then shows how many points DecimationEngine picks for
+each method at several zoom levels.
+Run from the project root:
+    python -m benchmarks.decimation_benchmark -s 10000000 -ls 200000
+
+The loops follow the per-sample approach of the old Chart.splithelper and
+Chart.point_relative_change_test_func, with one list per decimation level.
+Every vectorized result must equal the loop result, and no zoom level may
+draw more than four points per pixel column.
+"""
+
+
+def loopStride(times, voltages, factor):
+    keptTimes, keptVoltages = [], []
+    for i in range(len(voltages)):
+        if i % factor == 0:
+            keptTimes.append(times[i])
+            keptVoltages.append(voltages[i])
+    return keptTimes, keptVoltages
+
+
+def loopMinMax(times, voltages, factor):
+    keptTimes, keptVoltages = [], []
+    for start in range(0, len(voltages), factor):
+        block = list(voltages[start : start + factor])
+        low = start + block.index(min(block))
+        high = start + block.index(max(block))
+        for i in sorted((low, high)):
+            keptTimes.append(times[i])
+            keptVoltages.append(voltages[i])
+    return keptTimes, keptVoltages
+
+
+def loopRelativeChange(times, voltages):
+    variances = [0]
+    for i in range(1, len(voltages)):
+        variances.append((voltages[i] - voltages[i - 1]) ** 2)
+    threshold = sum(variances) / len(variances) / RELATIVE_CHANGE_SENSITIVITY
+    keptTimes, keptVoltages = [times[0]], [voltages[0]]
+    for i in range(1, len(voltages)):
+        if variances[i] > threshold:
+            keptTimes.append(times[i])
+            keptVoltages.append(voltages[i])
+    return keptTimes, keptVoltages
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s", "--samples", type=int, help="samples in the vectorized runs", default=10000000
+    )
+    parser.add_argument(
+        "-ls", "--loop_samples", type=int, help="samples in the loop runs", default=200000
+    )
+    parser.add_argument(
+        "-f", "--factors", type=int, nargs="+", help="decimation factors", default=[2, 3, 4]
+    )
+    parser.add_argument(
+        "-w", "--width", type=int, help="width of the chart in pixels", default=1200
+    )
+    args = parser.parse_args()
+
+    print("Generating data...")
+    times = np.arange(args.samples) / 100
+    # Mostly small changes with occasional jumps, which the relative change
+    # filter keeps
+    jumps = np.random.random(args.samples) < 0.01
+    voltages = np.cumsum(
+        np.where(jumps, np.random.normal(0, 1, args.samples), np.random.normal(0, 0.01, args.samples))
+    )
+    loopTimes = times[: args.loop_samples]
+    loopVoltages = voltages[: args.loop_samples]
+
+    rows = []
+    functions = [
+        (f"stride {factor}", strideDecimate, loopStride, (factor,)) for factor in args.factors
+    ] + [
+        (f"min/max {factor}", minMaxDecimate, loopMinMax, (factor,)) for factor in args.factors
+    ] + [("relative change", relativeChangeFilter, loopRelativeChange, ())]
+    for name, vectorized, loop, extra in functions:
+        expected, loopTime = timed(loop, loopTimes.tolist(), loopVoltages.tolist(), *extra)
+        result, _ = timed(vectorized, loopTimes, loopVoltages, *extra)
+        assert np.array_equal(result[0], expected[0]), f"{name} times differ"
+        assert np.array_equal(result[1], expected[1]), f"{name} voltages differ"
+        (kept, _), vectorizedTime = timed(vectorized, times, voltages, *extra)
+        rows.append((name, loopTime / args.loop_samples, vectorizedTime / args.samples, len(kept)))
+
+    levels = []
+    for method in DecimationMethod:
+        engine, buildTime = timed(DecimationEngine, times, voltages, method)
+        counts = []
+        for span in (10, 1000, 10000, times[-1] - times[0]):
+            pointTimes, _ = engine.points(times[0], times[0] + span, args.width)
+            assert len(pointTimes) <= 4 * args.width + 4, f"{method.name} draws too many points"
+            counts.append((span, len(pointTimes)))
+        levels.append((method.name, buildTime, counts))
+
+    print("----Benchmark----")
+    print(f"Samples : {args.samples} vectorized, {args.loop_samples} in loops")
+    for name, loopTime, vectorizedTime, kept in rows:
+        print(
+            f"{name} : loop {loopTime * 1e9:.0f} ns/sample, vectorized {vectorizedTime * 1e9:.2f} ns/sample "
+            f"({loopTime / vectorizedTime:.0f}x), {kept} kept"
+        )
+    print(f"Points drawn at {args.width}px")
+    for name, buildTime, counts in levels:
+        shown = ", ".join(f"{span:g}s: {count}" for span, count in counts)
+        print(f"{name} : built in {buildTime:.2f}s, {shown}")
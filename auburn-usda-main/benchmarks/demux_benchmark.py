@@ -0,0 +1,95 @@
+import argparse
+import time
+
+import numpy as np
+
+from package.utils.data_classes import DataArrays
+from package.utils.demux import demultiplex
+
+"""
+Compares channel demultiplexing strategies on synthetic recordings.
+Run from the project root:
+    python -m benchmarks.demux_benchmark -s 50000000 -c 8
+
+Two layouts are timed: channels interleaved in a fixed pattern, as written
+by the EPG and data_maker.py, and channels in random order. The original
+per-point divideData loop is timed on --legacy_size samples and its time is
+extrapolated to the full size.
+"""
+
+
+def legacyDivideData(data: DataArrays) -> tuple[list[int], list[list]]:
+    """The original divideData loop over DataPoints"""
+    splitData = None
+    channels = []
+    for point in data.toDataPoints():
+        if splitData is None:
+            splitData = [[point]]
+            channels = [point.channel]
+            continue
+        try:
+            index = channels.index(point.channel)
+        except ValueError:
+            splitData += [[point]]
+            channels.append(point.channel)
+            continue
+        splitData[index].append(point)
+    return channels, splitData
+
+
+def maskDivideData(data: DataArrays) -> tuple[list[int], list[DataArrays]]:
+    """One boolean mask per channel, as divideData did on arrays before"""
+    _, firstSeen = np.unique(data.channels, return_index=True)
+    channels = data.channels[np.sort(firstSeen)].tolist()
+    return channels, [data[data.channels == channel] for channel in channels]
+
+
+def makeData(size: int, channels: int, shuffled: bool) -> DataArrays:
+    rng = np.random.default_rng(0)
+    channelOfSample = np.tile(np.arange(1, channels + 1), -(-size // channels))[:size]
+    if shuffled:
+        channelOfSample = rng.integers(1, channels + 1, size)
+    return DataArrays(
+        times=np.arange(size) / (100 * channels),
+        voltages=rng.uniform(-5, 5, size),
+        channels=channelOfSample,
+    )
+
+
+def timeIt(func, data: DataArrays) -> float:
+    start = time.perf_counter()
+    func(data)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s", "--sample_size", type=int, help="the number of samples", default=50_000_000
+    )
+    parser.add_argument(
+        "-c", "--channels", type=int, help="the number of channels", default=8
+    )
+    parser.add_argument(
+        "-l",
+        "--legacy_size",
+        type=int,
+        help="samples the legacy loop is timed on",
+        default=200_000,
+    )
+    args = parser.parse_args()
+
+    print("----Benchmark----")
+    print(f"Samples : {args.sample_size} ({args.channels} channels)")
+    for shuffled in (False, True):
+        data = makeData(args.sample_size, args.channels, shuffled)
+        legacyTime = timeIt(legacyDivideData, data[: args.legacy_size])
+        legacyTime *= args.sample_size / args.legacy_size
+        maskTime = timeIt(maskDivideData, data)
+        demuxTime = timeIt(demultiplex, data)
+        del data
+
+        print(f"Layout : {'random' if shuffled else 'interleaved'}")
+        print(f"\tPer-point loop : {legacyTime:.2f}s (extrapolated)")
+        print(f"\tMask per channel : {maskTime:.2f}s")
+        print(f"\tdemultiplex : {demuxTime:.2f}s")
@@ -0,0 +1,105 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PySide6.QtWidgets import QApplication
+
+from package.chart_view import ChartView
+from package.utils.data_classes import DataArrays
+
+"""
+Compares scrolling and zooming several charts one at a time against doing
+it through linked navigation.
+Run from the project root:
+    python -m benchmarks.linked_navigation_benchmark -c 8 -s 1000000 -n 20
+
+Unlinked, every chart is navigated separately and each one is repainted
+straight after its own replot, together with the annotation bar, as
+happens on screen. Linked, one navigation step changes the axes of every
+chart, and the whole view is then repainted once.
+"""
+
+
+def makeChartView(channels: int, samples: int, width: int) -> ChartView:
+    """Creates a view with one chart per channel, each holding a random walk
+    of samples points at 100 Hz"""
+    chartView = ChartView()
+    chartView.resize(width, 150 * channels + 75)
+    chartView.reset()
+    chartView.channels = list(range(1, channels + 1))
+    times = np.arange(samples) / 100
+    for channel in chartView.channels:
+        chartView.createChart()
+        voltages = np.cumsum(np.random.normal(0, 0.05, samples))
+        chartView.charts[-1].displayImportedData(
+            DataArrays(times, voltages, np.full(samples, channel, dtype=np.int64))
+        )
+    chartView.grab()
+    return chartView
+
+
+def navigate(chart, step: int):
+    """Scrolls right, zooming in or out on every fifth step"""
+    if step % 5 == 4:
+        chart.zoomX(2 if step % 10 == 4 else 0.5)
+    else:
+        chart.scroll(1, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c", "--channels", type=int, help="the number of charts", default=8
+    )
+    parser.add_argument(
+        "-s", "--samples", type=int, help="samples per chart", default=1000000
+    )
+    parser.add_argument(
+        "-n", "--steps", type=int, help="the number of navigation steps timed", default=20
+    )
+    parser.add_argument(
+        "-v", "--view", type=float, help="visible time span in seconds", default=300
+    )
+    parser.add_argument(
+        "-w", "--width", type=int, help="width of the view in pixels", default=1200
+    )
+    args = parser.parse_args()
+
+    app = QApplication([])
+    print("Generating data...")
+    chartView = makeChartView(args.channels, args.samples, args.width)
+    start = chartView.charts[0].absMin
+
+    # Every chart navigated and repainted on its own
+    for chart in chartView.charts:
+        chart.setXView(start, start + args.view)
+    chartView.grab()
+    begin = time.perf_counter()
+    for step in range(args.steps):
+        for chart in chartView.charts:
+            navigate(chart, step)
+            chart.grab()
+            chartView.annotationBar.grab()
+    unlinkedTime = (time.perf_counter() - begin) / args.steps
+
+    # One navigation applied to every chart, then a single repaint
+    chartView.setLinkedNavigation(True)
+    chartView.charts[0].setXView(start, start + args.view)
+    chartView.grab()
+    begin = time.perf_counter()
+    for step in range(args.steps):
+        navigate(chartView.charts[0], step)
+        chartView.grab()
+    linkedTime = (time.perf_counter() - begin) / args.steps
+
+    views = {(chart.viewMin, chart.viewMax) for chart in chartView.charts}
+    assert len(views) == 1, "linked charts show different time ranges"
+
+    print("----Benchmark----")
+    print(f"Charts : {args.channels} x {args.samples} samples, {args.view}s visible at {args.width}px")
+    print(f"Unlinked : {unlinkedTime * 1000:.2f} ms per navigation step ({args.channels} replots and repaints)")
+    print(f"Linked : {linkedTime * 1000:.2f} ms per navigation step (1 batched repaint)")
+    print(f"Speedup : {unlinkedTime / linkedTime:.2f}x")
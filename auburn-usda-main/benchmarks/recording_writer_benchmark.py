@@ -0,0 +1,133 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from package.utils.data_classes import DataArrays
+from package.utils.enums import FsyncPolicy
+from package.utils.recording_writer import RecordingWriter, formatDataRows
+
+"""
+Compares the time the acquisition thread spends saving samples when it
+writes each block to the file itself against handing blocks to a
+RecordingWriter, for each fsync policy.
+Run from the project root:
+    python -m benchmarks.recording_writer_benchmark -s 2000000 -b 64 -r 20000
+
+Blocks arrive at the given sample rate, with a PAUSE row and a save every
+second, as when a recording is paused. Every file must hold the same rows
+as the direct writes once the writer is closed. Shown for each run are the
+time the acquisition thread spends saving each sample and its slowest
+block, the longest pause save, and for the writer the longest wait for a
+sample to be written, the most samples waiting at once, and how long
+closing took. With a single CPU, formatting on the writer thread still
+competes with the acquisition thread for the interpreter.
+"""
+
+
+def makeBlocks(samples: int, blockSize: int) -> list[DataArrays]:
+    times = np.round(np.arange(samples) / 1000, 4)
+    voltages = np.round(np.random.normal(0, 100, samples), 4)
+    channels = np.zeros(samples, dtype=np.int64)
+    return [
+        DataArrays(times[i : i + blockSize], voltages[i : i + blockSize], channels[i : i + blockSize])
+        for i in range(0, samples, blockSize)
+    ]
+
+
+def pace(index: int, blockSize: int, rate: int, started: float):
+    """Waits until block index is due at rate samples per second"""
+    if rate:
+        delay = started + index * blockSize / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def directWrites(filename: str, blocks: list[DataArrays], rate: int, pauseEvery: int) -> dict:
+    spent = []
+    saves = []
+    started = time.perf_counter()
+    with open(filename, "w") as file:
+        for index, block in enumerate(blocks):
+            pace(index, len(block), rate, started)
+            begin = time.perf_counter()
+            file.write(formatDataRows(block))
+            spent.append(time.perf_counter() - begin)
+            if index % pauseEvery == pauseEvery - 1:
+                begin = time.perf_counter()
+                file.write("0.0000,PAUSE\n")
+                file.flush()
+                saves.append(time.perf_counter() - begin)
+    return {"spent": spent, "saves": saves, "latency": 0, "backlog": 0, "close": 0}
+
+
+def writerWrites(
+    filename: str, blocks: list[DataArrays], rate: int, pauseEvery: int, policy: FsyncPolicy
+) -> dict:
+    writer = RecordingWriter(filename, policy)
+    spent = []
+    saves = []
+    backlog = 0
+    started = time.perf_counter()
+    for index, block in enumerate(blocks):
+        pace(index, len(block), rate, started)
+        begin = time.perf_counter()
+        writer.append(block)
+        spent.append(time.perf_counter() - begin)
+        if index % pauseEvery == pauseEvery - 1:
+            begin = time.perf_counter()
+            writer.writeEvent("0.0000,PAUSE\n")
+            writer.flush()
+            saves.append(time.perf_counter() - begin)
+        backlog = max(backlog, writer.appended - writer.written)
+    begin = time.perf_counter()
+    writer.close()
+    closed = time.perf_counter() - begin
+    latency = writer.takeMetrics()[0]
+    return {"spent": spent, "saves": saves, "latency": latency, "backlog": backlog, "close": closed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s", "--samples", type=int, help="the number of samples saved", default=2000000
+    )
+    parser.add_argument(
+        "-b", "--block", type=int, help="samples per block", default=64
+    )
+    parser.add_argument(
+        "-r", "--rate", type=int, help="samples per second, 0 to save as fast as possible", default=0
+    )
+    args = parser.parse_args()
+
+    print("Generating data...")
+    blocks = makeBlocks(args.samples, args.block)
+    # About once a second of samples at 20 kHz
+    pauseEvery = max(20000 // args.block, 1)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        expectedFile = os.path.join(directory, "direct.csv")
+        results["Direct writes"] = directWrites(expectedFile, blocks, args.rate, pauseEvery)
+        with open(expectedFile) as file:
+            expected = file.read()
+        for policy in FsyncPolicy:
+            filename = os.path.join(directory, policy.name + ".csv")
+            results[f"Writer, fsync {policy.name}"] = writerWrites(
+                filename, blocks, args.rate, pauseEvery, policy
+            )
+            with open(filename) as file:
+                assert file.read() == expected, f"{policy.name} file differs from the direct writes"
+
+    print("----Benchmark----")
+    print(f"Samples : {args.samples} in blocks of {args.block}" + (f" at {args.rate} Hz" if args.rate else ""))
+    for name, result in results.items():
+        spent = np.array(result["spent"])
+        print(
+            f"{name} : {spent.sum() / args.samples * 1e9:.0f} ns/sample on the acquisition thread, "
+            f"slowest block {spent.max() * 1000:.2f} ms, pause saves up to {max(result['saves']) * 1000:.1f} ms, "
+            f"write latency up to {result['latency'] * 1000:.0f} ms, "
+            f"{result['backlog']} samples behind at most, closed in {result['close'] * 1000:.1f} ms"
+        )
@@ -0,0 +1,80 @@
+import argparse
+import io
+import time
+
+import numpy as np
+
+from package.utils.acquisition_worker import parseDataLines
+from package.utils.data_classes import DataArrays, DataPoint
+from package.utils.recording_writer import formatDataRows
+
+"""
+Compares parsing and saving ASCII lines from the EPG one line at a time, as
+SerialData.readData used to, against parsing each block of lines at once.
+Run from the project root:
+    python -m benchmarks.serial_parse_benchmark -s 200000 -b 256
+
+The line loop splits every line, builds a DataPoint and writes its own row.
+The block path parses every line of a block with parseDataLines and writes
+the rows of the block with one write. A PARAM reply is mixed into every
+tenth block, and both paths must save the same rows.
+"""
+
+
+def lineLoop(blocks: list[bytes], file: io.StringIO) -> int:
+    samples = 0
+    for block in blocks:
+        for line in block.split(b"\n")[:-1]:
+            data = str(line, "utf-8").strip().split(",")
+            if data[0] == "O":
+                point = DataPoint(samples / 1000, data[1], 0)
+                file.write(f"{point.time:.4f},DATA,{point.voltage:.4f},{point.channel}\n")
+                samples += 1
+    return samples
+
+
+def blockPath(blocks: list[bytes], file: io.StringIO) -> int:
+    samples = 0
+    for block in blocks:
+        voltages, _ = parseDataLines(block)
+        times = (samples + np.arange(len(voltages))) / 1000
+        file.write(formatDataRows(DataArrays(times, voltages, np.zeros(len(voltages), dtype=np.int64))))
+        samples += len(voltages)
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s", "--samples", type=int, help="the number of lines parsed", default=200000
+    )
+    parser.add_argument(
+        "-b", "--block", type=int, help="lines read at each wakeup", default=256
+    )
+    args = parser.parse_args()
+
+    print("Generating lines...")
+    values = np.random.randint(0, 1023, (args.samples, 2))
+    lines = [b"O,%d,%d\r\n" % (pre, post) for pre, post in values.tolist()]
+    blocks = []
+    for index, start in enumerate(range(0, args.samples, args.block)):
+        block = b"".join(lines[start : start + args.block])
+        if index % 10 == 9:
+            block += b"PARAM,1,100000,0,1,1000,0\r\n"
+        blocks.append(block)
+
+    results = {}
+    for name, function in (("Line loop", lineLoop), ("Block parse", blockPath)):
+        file = io.StringIO()
+        start = time.perf_counter()
+        count = function(blocks, file)
+        results[name] = (time.perf_counter() - start, count, file.getvalue())
+
+    assert results["Line loop"][1] == results["Block parse"][1] == args.samples, "samples were lost"
+    assert results["Line loop"][2] == results["Block parse"][2], "saved rows differ"
+
+    print("----Benchmark----")
+    print(f"Lines : {args.samples} in blocks of {args.block}")
+    for name, (elapsed, count, _) in results.items():
+        print(f"{name} : {elapsed / count * 1e9:.0f} ns/sample, {count / elapsed:.0f} samples/s")
+    print(f"Speedup : {results['Line loop'][0] / results['Block parse'][0]:.1f}x")
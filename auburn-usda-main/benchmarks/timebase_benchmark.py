@@ -0,0 +1,108 @@
+import argparse
+import time
+
+import numpy as np
+
+from package.utils.timebase import SampleTimebase
+
+"""
+Compares the sample times given by stamping each block with the time it was
+read, as AcquisitionWorker.readData used to, against those of a
+SampleTimebase, for a device whose clock drifts from the negotiated rate.
+Run from the project root:
+    python -m benchmarks.timebase_benchmark -r 1000 -b 16 -d 200 -t 20
+
+Blocks of samples are read in real time as the simulated device finishes
+them, each held up by a random delay, as by the serial port and the event
+loop. Each sample's time is compared with when the device took it,
+counting from the first block. Shown for each method are the mean and
+standard deviation of that error over the last half of the run, the
+largest step between consecutive samples, the number of times that went
+backwards, and the time spent per block. The timebase also reports the
+drift it measured.
+"""
+
+
+def arrivalTimes(now: float, count: int, sampleRate: int) -> np.ndarray:
+    """Times of a block of samples a sample period apart, the last one
+    arriving now"""
+    return now - np.arange(count - 1, -1, -1) / sampleRate
+
+
+def run(args: argparse.Namespace) -> dict:
+    generator = np.random.default_rng(0)
+    deviceRate = args.rate * (1 + args.drift * 1e-6)
+    timebase = SampleTimebase(args.rate, time.time())
+    results = {"Arrival stamping": [[], []], "Timebase": [[], []]}
+    started = time.monotonic()
+    index = 0
+    while index < args.time * deviceRate:
+        # The device finishes a block, then it takes a while to be read
+        index += args.block
+        due = started + index / deviceRate + generator.exponential(args.jitter / 1000)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        actual = (index - args.block + np.arange(args.block)) / deviceRate
+
+        begin = time.perf_counter()
+        times = arrivalTimes(time.monotonic() - started, args.block, args.rate)
+        results["Arrival stamping"][1].append(time.perf_counter() - begin)
+        results["Arrival stamping"][0].append(times - actual)
+
+        begin = time.perf_counter()
+        times = timebase.blockTimes(args.block)
+        results["Timebase"][1].append(time.perf_counter() - begin)
+        results["Timebase"][0].append(times - actual)
+
+    summaries = {}
+    for name, (errors, spent) in results.items():
+        # Times are compared from the first sample, as recordings start there
+        errors = np.concatenate(errors) - errors[0][0]
+        steps = np.diff(errors) + 1 / deviceRate
+        settled = errors[len(errors) // 2 :]
+        summaries[name] = {
+            "mean": settled.mean(),
+            "std": settled.std(),
+            "maxStep": steps.max(),
+            "backwards": int((steps < 0).sum()),
+            "spent": np.mean(spent),
+        }
+    summaries["Timebase"]["drift"] = timebase.drift()
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r", "--rate", type=int, help="sample rate negotiated with the device", default=1000
+    )
+    parser.add_argument(
+        "-b", "--block", type=int, help="samples per block read", default=16
+    )
+    parser.add_argument(
+        "-d", "--drift", type=float, help="parts per million the device clock runs fast", default=200
+    )
+    parser.add_argument(
+        "-j", "--jitter", type=float, help="mean milliseconds blocks are held up", default=2
+    )
+    parser.add_argument(
+        "-t", "--time", type=float, help="seconds of samples", default=20
+    )
+    args = parser.parse_args()
+
+    print("Reading blocks...")
+    summaries = run(args)
+
+    print("----Benchmark----")
+    print(
+        f"Device : {args.rate} Hz {args.drift:+.0f} ppm for {args.time}s, blocks of {args.block} "
+        f"held up {args.jitter} ms on average"
+    )
+    for name, summary in summaries.items():
+        print(
+            f"{name} : error {summary['mean'] * 1000:.3f} ms mean, {summary['std'] * 1000:.3f} ms std, "
+            f"steps up to {summary['maxStep'] * 1000:.3f} ms, {summary['backwards']} backwards, "
+            f"{summary['spent'] * 1e6:.1f} us/block"
+        )
+    print(f"Measured drift : {summaries['Timebase']['drift']:+.0f} ppm")
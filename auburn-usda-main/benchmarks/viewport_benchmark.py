@@ -0,0 +1,87 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PySide6.QtWidgets import QApplication
+
+from package.qwt_chart import Chart
+from package.utils.data_classes import DataArrays
+
+"""
+Times scrolling a zoomed-in chart for recordings of different lengths.
+Run from the project root:
+    python -m benchmarks.viewport_benchmark -s 10000 10000000 -n 50
+
+Each chart is zoomed to the same visible time span, then scrolled and
+repainted n times. Since the curve is only given the samples in view, the
+time per scroll should not depend on the length of the recording. For
+comparison, the largest recording is also repainted once with every
+sample given to the curve, as it was before.
+"""
+
+
+def makeChart(samples: int, width: int) -> Chart:
+    """Creates a chart showing a random walk of samples points at 100 Hz"""
+    times = np.arange(samples) / 100
+    voltages = np.cumsum(np.random.normal(0, 0.05, samples))
+    chart = Chart(id=0)
+    chart.resize(width, 300)
+    chart.displayImportedData(
+        DataArrays(times, voltages, np.ones(samples, dtype=np.int64))
+    )
+    return chart
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        type=int,
+        nargs="+",
+        help="the number of samples of each recording",
+        default=[10000, 10000000],
+    )
+    parser.add_argument(
+        "-n", "--scrolls", type=int, help="the number of scroll steps timed", default=50
+    )
+    parser.add_argument(
+        "-v", "--view", type=float, help="visible time span in seconds", default=30
+    )
+    parser.add_argument(
+        "-w", "--width", type=int, help="width of the chart in pixels", default=1200
+    )
+    args = parser.parse_args()
+
+    app = QApplication([])
+    results = []
+    for samples in args.sizes:
+        print(f"Generating {samples} samples...")
+        chart = makeChart(samples, args.width)
+        chart.viewMin = chart.absMin
+        chart.viewMax = chart.absMin + args.view
+        chart.setAxisScale(chart.xBottom, chart.viewMin, chart.viewMax)
+        chart.replot()
+        chart.grab()
+
+        start = time.perf_counter()
+        for _ in range(args.scrolls):
+            chart.scroll(1, 0)
+            chart.grab()
+        results.append((samples, (time.perf_counter() - start) / args.scrolls, chart.curve.dataSize()))
+
+    # Repaint the largest recording with the full arrays, as before
+    chart.curve.setData(chart.times, chart.voltages)
+    start = time.perf_counter()
+    chart.replot()
+    chart.grab()
+    fullTime = time.perf_counter() - start
+
+    print("----Benchmark----")
+    print(f"Visible span : {args.view}s at {args.width}px")
+    for samples, scrollTime, points in results:
+        print(f"{samples} samples : {scrollTime * 1000:.2f} ms per scroll ({points} points drawn)")
+    print(f"{args.sizes[-1]} samples, full arrays : {fullTime * 1000:.2f} ms per repaint")
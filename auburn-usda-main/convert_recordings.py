@@ -0,0 +1,224 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from package.utils.chunked_store import CHUNKED_EXTENSION, convertToChunked, readChunked
+from package.utils.session_file import SESSION_EXTENSION, convertToSession, readSession
+
+"""
+Converts archives of .ana and .csv recordings into session files (.epgs)
+or compressed chunked recordings (.epgz), and writes a summary of every
+recording next to its converted file.
+    python3 convert_recordings.py old_recordings/ -o sessions/ -j 8
+    python3 convert_recordings.py "archive/**/*.ANA" -o archive/ --format chunked
+
+Directories are searched recursively, and the folder structure below each
+input is kept in the output directory. A recording is skipped if its
+summary shows it was already converted from the same, unmodified file, so
+an interrupted run can simply be started again. Session files and summaries
+are written to temporary files and renamed when complete.
+
+Runs without Qt, so it can be used on machines without a display.
+"""
+
+RECORDING_EXTENSIONS = (".ana", ".csv")
+SUMMARY_EXTENSION = ".json"
+# format -> extension, converter and reader of the converted files
+FORMATS = {
+    "session": (SESSION_EXTENSION, convertToSession, readSession),
+    "chunked": (CHUNKED_EXTENSION, convertToChunked, readChunked),
+}
+
+
+def findRecordings(inputs: list[str]) -> list[tuple[str, str]]:
+    """Finds the recordings to convert
+    :param inputs: directories or glob patterns
+    :returns: path of every recording, and the directory its output path
+        is taken relative to
+    """
+    recordings = {}
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            root = pattern
+            paths = [
+                os.path.join(directory, name)
+                for directory, _, names in os.walk(pattern)
+                for name in names
+            ]
+        else:
+            paths = glob.glob(pattern, recursive=True)
+            root = os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else ""
+        for path in paths:
+            if os.path.splitext(path)[1].lower() in RECORDING_EXTENSIONS:
+                recordings.setdefault(os.path.abspath(path), root)
+    return sorted(recordings.items())
+
+
+def outputPaths(
+    sourcePath: str, root: str, outputDir: str = None, fileFormat: str = "session"
+) -> tuple[str, str]:
+    """Picks where the converted file and summary of a recording are written
+    :param sourcePath: recording to convert
+    :param root: directory the recording was found under
+    :param outputDir: directory to write to, defaults to next to the recording
+    :param fileFormat: key of FORMATS to convert to
+    :returns: converted file path, and summary path, which is the
+        converted file path with SUMMARY_EXTENSION added
+    """
+    stem = os.path.splitext(sourcePath)[0]
+    if outputDir is not None:
+        stem = os.path.join(outputDir, os.path.relpath(stem, os.path.abspath(root)))
+    # Each format has its own summary, so converting to one format does not
+    # overwrite the summary of the other
+    convertedPath = stem + FORMATS[fileFormat][0]
+    return convertedPath, convertedPath + SUMMARY_EXTENSION
+
+
+def isConverted(sourcePath: str, sessionPath: str, summaryPath: str) -> bool:
+    """Whether a recording was already converted and has not changed since"""
+    if not os.path.exists(sessionPath) or not os.path.exists(summaryPath):
+        return False
+    try:
+        with open(summaryPath) as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return False
+    stat = os.stat(sourcePath)
+    return summary.get("sourceSize") == stat.st_size and summary.get("sourceModified") == stat.st_mtime_ns
+
+
+def summarizeSession(sessionPath: str, fileFormat: str = "session") -> dict:
+    """Collects the duration, sample count and voltage range of every
+    channel of a converted file"""
+    with FORMATS[fileFormat][2](sessionPath) as session:
+        channels = {}
+        for channel in session.channels:
+            data = session.channelData(channel)
+            if len(data) == 0:
+                channels[str(channel)] = {"samples": 0}
+                continue
+            channels[str(channel)] = {
+                "samples": len(data),
+                "start": float(data.times[0]),
+                "end": float(data.times[-1]),
+                "duration": float(data.times[-1] - data.times[0]),
+                "min": float(np.min(data.voltages)),
+                "max": float(np.max(data.voltages)),
+            }
+    durations = [summary.get("duration", 0) for summary in channels.values()]
+    return {
+        "channels": session.channels,
+        "sampleRate": session.sampleRate,
+        "samples": sum(summary["samples"] for summary in channels.values()),
+        "duration": max(durations, default=0),
+        "channelSummaries": channels,
+    }
+
+
+def convertRecording(
+    sourcePath: str, sessionPath: str, summaryPath: str, fileFormat: str = "session"
+) -> dict:
+    """Converts one recording and writes its summary. Runs in a worker process.
+    :returns: summary of the recording
+    """
+    os.makedirs(os.path.dirname(sessionPath) or ".", exist_ok=True)
+    # Spill files left behind by an interrupted conversion
+    for leftover in glob.glob(glob.escape(sessionPath) + ".*tmp"):
+        os.remove(leftover)
+
+    stat = os.stat(sourcePath)
+    startTime = time.time()
+    FORMATS[fileFormat][1](sourcePath, sessionPath)
+    summary = {
+        "source": sourcePath,
+        "sourceSize": stat.st_size,
+        "sourceModified": stat.st_mtime_ns,
+        "session": sessionPath,
+        **summarizeSession(sessionPath, fileFormat),
+        "conversionSeconds": round(time.time() - startTime, 3),
+    }
+
+    # The summary is written last, so it marks the conversion as complete
+    tempPath = summaryPath + ".tmp"
+    with open(tempPath, "w") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tempPath, summaryPath)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "inputs", nargs="+", help="directories or glob patterns of .ana and .csv recordings"
+    )
+    parser.add_argument(
+        "-o",
+        "--output_dir",
+        help="directory to write session files and summaries to, defaults to next to each recording",
+        default=None,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="the number of recordings converted in parallel",
+        default=os.cpu_count(),
+    )
+    parser.add_argument(
+        "-fmt",
+        "--format",
+        choices=list(FORMATS),
+        help="session files to memory map, or chunked compressed files for archives",
+        default="session",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="convert recordings again even if they are up to date",
+    )
+
+    args = parser.parse_args()
+
+    recordings = findRecordings(args.inputs)
+    pending = []
+    for sourcePath, root in recordings:
+        sessionPath, summaryPath = outputPaths(sourcePath, root, args.output_dir, args.format)
+        if args.force or not isConverted(sourcePath, sessionPath, summaryPath):
+            pending.append((sourcePath, sessionPath, summaryPath, args.format))
+    print(f"Found {len(recordings)} recordings, {len(pending)} to convert...")
+
+    startTime = time.time()
+    failed = []
+    samples = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(convertRecording, *paths): paths[0] for paths in pending}
+        try:
+            for i, future in enumerate(as_completed(futures), start=1):
+                sourcePath = futures[future]
+                try:
+                    summary = future.result()
+                except Exception as error:
+                    failed.append(sourcePath)
+                    print(f"[{i}/{len(pending)}] Failed {sourcePath}: {error}")
+                    continue
+                samples += summary["samples"]
+                print(f"[{i}/{len(pending)}] Converted {sourcePath} ({summary['samples']} samples)")
+        except KeyboardInterrupt:
+            print("Stopping, run again to resume...")
+            executor.shutdown(cancel_futures=True)
+            sys.exit(1)
+
+    print("----Conversion Stats----")
+    print(f"Converted : {len(pending) - len(failed)} recordings, {samples} samples")
+    print(f"Skipped (up to date) : {len(recordings) - len(pending)}")
+    print(f"Failed : {len(failed)}")
+    print(f"Time : {time.time() - startTime:.2f}s")
+    sys.exit(1 if failed else 0)
@@ -16,6 +16,9 @@ class AnnotationBar(QwtPlot):
 
         self.annotations = []
         self.markers = []
+        # Coalesces replots into frames during live recording, None to
+        # replot right away
+        self.renderScheduler = None
         self.setCanvas(AnnotationBarCanvas(plot=self))
 
         # Set up axes
@@ -42,7 +45,15 @@ class AnnotationBar(QwtPlot):
             
         """
         self.setAxisScale(QwtPlot.xBottom, xMin, xMax)
-        self.replot()
+        self.requestReplot()
+
+    def requestReplot(self):
+        """Replots on the next frame of the render scheduler, if there is
+        one, or right away otherwise"""
+        if self.renderScheduler is None:
+            self.replot()
+        else:
+            self.renderScheduler.markDirty(self)
     
     
 
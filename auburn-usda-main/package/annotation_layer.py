@@ -0,0 +1,141 @@
+import numpy as np
+from PySide6.QtGui import QPainter, QColor, QPen, QStaticText
+from PySide6.QtCore import QLineF, QRectF, QPointF
+from qwt import QwtPlotItem, QwtScaleMap
+
+from package.utils.interval_index import IntervalIndex
+
+# Pixels beyond each side of the canvas searched for markers, so that the
+# borders of markers just out of view are still drawn
+VIEW_MARGIN = 5
+# Markers of the annotation bar starting within this many pixels of each
+# other are drawn as one cluster with a count badge
+CLUSTER_WIDTH = 20
+
+
+class AnnotationLayer(QwtPlotItem):
+    """ Draws the annotation markers of one channel that are in view. The
+        markers are kept in an IntervalIndex instead of being attached to
+        the plot one by one, so markers outside the visible time range are
+        never visited, and the whole layer is shown or hidden at once.
+    """
+    Rtti_AnnotationLayer = QwtPlotItem.Rtti_PlotUserItem + 1
+
+    def __init__(self, z: float = 10):
+        super().__init__()
+        self.setZ(z)
+        self.index = IntervalIndex()
+
+    def rtti(self):
+        return self.Rtti_AnnotationLayer
+
+    def addItem(self, item: QwtPlotItem, start: float, end: float):
+        """ Adds a marker covering the interval from start to end
+
+            :param item: plot item that draws the marker
+            :param start: lower bound of the marker's interval
+            :param end: upper bound of the marker's interval
+        """
+        self.index.add(item, start, end)
+
+    def itemsAt(self, x: float) -> list[QwtPlotItem]:
+        """ Returns the markers whose interval contains x, ordered by start """
+        return self.index.containing(x)
+
+    def visibleIndices(self, xMap: QwtScaleMap) -> np.ndarray:
+        """ Returns the positions in the index of the markers in view """
+        start, end = sorted((xMap.s1(), xMap.s2()))
+        margin = VIEW_MARGIN * abs(xMap.sDist() / xMap.pDist()) if xMap.pDist() else 0
+        return self.index.overlappingIndices(start - margin, end + margin)
+
+    def draw(self, painter: QPainter, xMap: QwtScaleMap, yMap: QwtScaleMap, canvasRect: QRectF):
+        """ Draws the markers that overlap the visible time range
+        """
+        for i in self.visibleIndices(xMap):
+            painter.save()
+            self.index.keys[i].draw(painter, xMap, yMap, canvasRect)
+            painter.restore()
+
+
+class AnnotationBarLayer(AnnotationLayer):
+    """ Layer of the annotation bar. Markers that start within CLUSTER_WIDTH
+        pixels of time of each other are too close together to tell apart,
+        so they are drawn as a single range with a count badge. The number
+        of markers and clusters drawn is then limited by the width of the
+        bar, whatever the number of annotations.
+    """
+
+    def __init__(self, z: float = 10):
+        super().__init__(z)
+        # Laid out badge text for each count
+        self.badgeTexts = {}
+
+    def draw(self, painter: QPainter, xMap: QwtScaleMap, yMap: QwtScaleMap, canvasRect: QRectF):
+        indices = self.visibleIndices(xMap)
+        if len(indices) == 0:
+            return
+
+        # Clusters are aligned to time rather than to the canvas, so they
+        # do not change while scrolling
+        clusterSeconds = CLUSTER_WIDTH * abs(xMap.sDist() / xMap.pDist()) if xMap.pDist() else 0
+        if clusterSeconds > 0:
+            clusters = np.floor(self.index.starts[indices] / clusterSeconds)
+            firsts = np.concatenate(([0], np.flatnonzero(np.diff(clusters)) + 1))
+        else:
+            firsts = np.arange(len(indices))
+        lasts = np.append(firsts[1:], len(indices))
+
+        for first, last in zip(firsts, lasts):
+            painter.save()
+            if last - first == 1:
+                self.index.keys[indices[first]].draw(painter, xMap, yMap, canvasRect)
+            else:
+                self.drawCluster(painter, xMap, canvasRect, indices[first:last])
+            painter.restore()
+
+    def drawCluster(self, painter: QPainter, xMap: QwtScaleMap, canvasRect: QRectF, cluster: np.ndarray):
+        """ Draws markers that start close together as one range from the
+            first start to the last end, with a badge counting them
+
+            :param cluster: positions of the markers in the index
+        """
+        padding = 3
+        x1 = round(xMap.transform(self.index.starts[cluster[0]]))
+        x2 = round(xMap.transform(self.index.ends[cluster].max()))
+        painter.fillRect(
+            QRectF(x1, canvasRect.top(), max(x2 - x1, CLUSTER_WIDTH), canvasRect.height()),
+            self.index.keys[cluster[0]].color,
+        )
+
+        count = len(cluster)
+        if count not in self.badgeTexts:
+            self.badgeTexts[count] = QStaticText(str(count))
+        text = self.badgeTexts[count]
+        size = text.size()
+        badge = QRectF(
+            x1 + padding,
+            canvasRect.top() + padding,
+            size.width() + 2 * padding,
+            size.height() + 2 * padding,
+        )
+        painter.setPen(QPen(QColor("black"), 1))
+        painter.setBrush(QColor("white"))
+        painter.drawRoundedRect(badge, padding, padding)
+        painter.drawStaticText(QPointF(badge.left() + padding, badge.top() + padding), text)
+
+
+class BorderLayer(AnnotationLayer):
+    """ Layer of a chart that draws the borders of its channel's markers,
+        which are vertical lines of the same pen, with a single drawLines
+        call of at most one line per pixel column
+    """
+
+    def draw(self, painter: QPainter, xMap: QwtScaleMap, yMap: QwtScaleMap, canvasRect: QRectF):
+        indices = self.visibleIndices(xMap)
+        if len(indices) == 0:
+            return
+
+        scale = xMap.pDist() / xMap.sDist() if xMap.sDist() else 0
+        xs = np.unique(np.round(xMap.p1() + (self.index.starts[indices] - xMap.s1()) * scale))
+        painter.setPen(self.index.keys[indices[0]].linePen())
+        painter.drawLines([QLineF(x, canvasRect.top(), x, canvasRect.bottom()) for x in xs])
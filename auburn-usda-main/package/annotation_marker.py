@@ -1,5 +1,5 @@
 from qwt import QwtScaleMap
-from PySide6.QtGui import QPainter, QColor, QPen
+from PySide6.QtGui import QPainter, QColor, QPen, QStaticText
 from PySide6.QtCore import QRectF, QPointF
 
 from package.utils.enums import AnnotationType
@@ -10,12 +10,18 @@ class AnnotationMarker(RangeMarker):
         super().__init__(color)
         self.setZ(10)
         self.type = None 
+        self.annotationId = None
+
+    def setAnnotationId(self, annotationId: int):
+        self.annotationId = annotationId
 
     def setType(self, annotationType:AnnotationType):
         self.type = annotationType 
 
     def setText(self, text):
         self.text = text 
+        # Text is laid out once and reused by every repaint
+        self.staticText = QStaticText(text)
 
     def draw(self, painter: QPainter, xMap: QwtScaleMap, yMap: QwtScaleMap, canvasRect: QRectF):
         borderSize = 10
@@ -31,9 +37,9 @@ class AnnotationMarker(RangeMarker):
         else:
             painter.fillRect(QRectF(x1, canvasRect.top(), borderSize, canvasRect.height()), self.color)
 
-        # Draw annotation text in black
-        pos = QPointF(x1 + borderSize + padding, canvasRect.height() // 2)
+        # Draw annotation text in black, with its baseline halfway down
+        pos = QPointF(x1 + borderSize + padding, canvasRect.height() // 2 - painter.fontMetrics().ascent())
         painter.setPen(QPen(QColor("black"), 3))
-        painter.drawText(pos, self.text)
+        painter.drawStaticText(pos, self.staticText)
     
 
@@ -5,13 +5,17 @@ from PySide6.QtWidgets import (
     QWidget,
     QInputDialog
 )
-from qwt import QwtPlot, QwtPlotMarker, QwtPlotItem
+from qwt import QwtPlot, QwtPlotMarker, QwtPlotItem, QwtText
 
 from package.annotation_bar import AnnotationBar
+from package.annotation_layer import AnnotationBarLayer, AnnotationLayer, BorderLayer
 from package.qwt_chart import Chart
+from package.render_scheduler import RenderScheduler
+from package.tiled_curve import TileCache
 from package.annotation_marker import AnnotationMarker
+from package.utils.channel_loader import ChannelLoader
 from package.utils.data_classes import Annotation, MarkerGroup 
-from package.utils.enums import AnnotationType
+from package.utils.enums import AnnotationType, DecimationMethod
 
 class ChartView(QWidget):
     chartMouseReleased = Signal(float, float) # xVal, duration
@@ -31,6 +35,20 @@ class ChartView(QWidget):
         self.charts = []
         self.channels = []
         self.markers = {}
+        # Markers of each channel on the annotation bar and their borders
+        # on the channel's chart, drawn only while they are in view
+        self.markerLayers = {}
+        self.borderLayers = {}
+        # Loads channels on demand, None when all channels are loaded up front
+        self.channelLoader = None
+        # Limits how often charts are replotted during live recording
+        self.renderScheduler = None
+        # Rendered tiles of every chart's curve, within one memory budget
+        self.tileCache = TileCache()
+        # Whether zooming or scrolling one chart navigates every chart
+        self.linkedNavigation = False
+        # How every chart decimates imported data
+        self.decimationMethod = DecimationMethod.MIN_MAX
         
         self.focusedChartIndex = 0
 
@@ -67,6 +85,11 @@ class ChartView(QWidget):
     def createChart(self):
         """ Create a new chart and insert it into the layout """
         chart = Chart(id=len(self.charts))        
+        chart.renderScheduler = self.renderScheduler
+        chart.setTileCache(self.tileCache)
+        chart.decimationMethod = self.decimationMethod
+        if self.linkedNavigation:
+            chart.navigationLink = self
         chart.canvas().mouseReleased.connect(
             lambda xVal, duration: self.chartMouseReleased.emit(xVal, duration)
         )
@@ -89,24 +112,17 @@ class ChartView(QWidget):
         """ If chart focus has changed, update annotation bar to only show
             annotations from currently selected chart """
         # Display annotations corresponding to chart that is currently selected
-        if self.channels == [] or self.focusedChartIndex == chartId:
+        if self.channels == []:
+            return
+        self.loadChart(chartId)
+        if self.focusedChartIndex == chartId:
             return 
         self.focusedChartIndex = chartId 
         selectedChannel = self.getChannels()[chartId]
         self.syncXAxis(chartId)
-        for channel in self.markers:
-            if channel == selectedChannel:
-                for markerGroup in self.markers[channel]:
-                    markerGroup.marker.show()
-                    markerGroup.leftBorder.show()
-                    if markerGroup.rightBorder:
-                        markerGroup.rightBorder.show()
-            else:
-                for markerGroup in self.markers[channel]:
-                    markerGroup.marker.hide()
-                    markerGroup.leftBorder.hide()
-                    if markerGroup.rightBorder:
-                        markerGroup.rightBorder.hide()
+        for layers in (self.markerLayers, self.borderLayers):
+            for channel, layer in layers.items():
+                layer.setVisible(channel == selectedChannel)
         for chart in self.charts:
             print(chart.id, chartId)
             if chart.id == chartId:
@@ -117,6 +133,105 @@ class ChartView(QWidget):
         self.annotationBar.replot()
 
 
+    def toggleVisibleAutoscale(self):
+        """Toggle whether the focused chart fits its y axis to the
+        samples in view"""
+        if self.charts:
+            chart = self.charts[self.focusedChartIndex]
+            chart.setVisibleAutoscale(not chart.autoscaleVisible)
+
+    def setDecimationMethod(self, method: DecimationMethod):
+        """Change how every chart decimates imported data"""
+        self.decimationMethod = method
+        for chart in self.charts:
+            chart.setDecimationMethod(method)
+
+    def setLinkedNavigation(self, linked: bool):
+        """Make zooming or scrolling any chart show the same time range on
+        every chart. When linking, every chart is moved to the time range of
+        the focused chart."""
+        self.linkedNavigation = linked
+        for chart in self.charts:
+            chart.navigationLink = self if linked else None
+        if linked and self.charts:
+            focusedChart = self.charts[self.focusedChartIndex]
+            self.setLinkedXView(focusedChart.viewMin, focusedChart.viewMax)
+
+    def setLinkedXView(self, viewMin: float, viewMax: float):
+        """Show a time range on every chart and the annotation bar. Widget
+        updates are held back while the axes of each chart are changed, so
+        everything is repainted together in a single pass afterwards
+        instead of once per chart.
+        :param viewMin: first time shown
+        :param viewMax: last time shown
+        """
+        self.setUpdatesEnabled(False)
+        try:
+            for chart in self.charts:
+                chart.viewMin = viewMin
+                chart.viewMax = viewMax
+                chart.setAxisScale(QwtPlot.xBottom, viewMin, viewMax)
+                # Only lays out the axes, painting waits for the updates
+                chart.replot()
+        finally:
+            self.setUpdatesEnabled(True)
+
+    def setRenderScheduler(self, renderScheduler: RenderScheduler):
+        """Replot the charts and annotation bar at the scheduler's frame
+        rate instead of on every update"""
+        self.renderScheduler = renderScheduler
+        self.annotationBar.renderScheduler = renderScheduler
+        for chart in self.charts:
+            chart.renderScheduler = renderScheduler
+
+    def setChannelLoader(self, channelLoader: ChannelLoader):
+        """Load the data of each chart only once it is shown or focused"""
+        if self.channelLoader is not None:
+            self.channelLoader.close()
+        self.channelLoader = channelLoader
+        for chart, channel in zip(self.charts, self.channels):
+            chart.retitle(QwtText(f"Channel {channel}  Data (not loaded)"))
+
+    def loadChart(self, chartId: int):
+        """Load the data of a chart if it was loaded on demand and is not
+        loaded yet. Hidden charts are unloaded if too much data is loaded."""
+        if self.channelLoader is None:
+            return
+        channel = self.channels[chartId]
+        chart = self.charts[chartId]
+        isLoaded = self.channelLoader.isLoaded(channel)
+        # Loading an already loaded channel marks it as recently used
+        data = self.channelLoader.load(channel)
+        if not isLoaded:
+            chart.retitle(QwtText(f"Channel {channel}  Data ({len(data)})"))
+            chart.displayImportedData(data, pyramid=self.channelLoader.pyramid(channel))
+            chart.replot()
+        self.unloadHiddenCharts()
+
+    def unloadHiddenCharts(self):
+        """Unload hidden charts, least recently used first, while more data
+        is loaded than the channel loader's memory budget"""
+        if self.channelLoader is None:
+            return
+        shownChannels = [
+            channel
+            for chart, channel in zip(self.charts, self.channels)
+            if not chart.isHidden()
+        ]
+        for channel in self.channelLoader.unloadExcess(shownChannels):
+            chart = self.charts[self.channels.index(channel)]
+            chart.retitle(QwtText(f"Channel {channel}  Data (not loaded)"))
+            chart.unloadData()
+            chart.replot()
+
+    def setChartVisible(self, chartId: int, visible: bool):
+        """Show or hide the chart of a channel"""
+        self.charts[chartId].setVisible(visible)
+        if visible:
+            self.loadChart(chartId)
+        else:
+            self.unloadHiddenCharts()
+
     def changeChartZoom(self):
         """Creates a dialog box that looks for a double input and
         returns that, setting the new zoom scaling value to user
@@ -135,6 +250,14 @@ class ChartView(QWidget):
         in chart layout and the annotation bar"""
         self.channels = []
         self.splitData = None
+        if self.channelLoader is not None:
+            self.channelLoader.close()
+        self.channelLoader = None
+        # The scheduler must not render charts that are about to be deleted
+        if self.renderScheduler is not None:
+            self.renderScheduler.clear()
+            self.setRenderScheduler(None)
+        self.tileCache.clear()
         self.charts = []
         self.centerWidget = QWidget()
         
@@ -152,7 +275,10 @@ class ChartView(QWidget):
 
         # Remove markers from annotation bar
         self.markers = {}
+        self.markerLayers = {}
+        self.borderLayers = {}
         self.annotationBar.detachItems(QwtPlotItem.Rtti_PlotMarker)
+        self.annotationBar.detachItems(AnnotationLayer.Rtti_AnnotationLayer)
         self.annotationBar.replot()
 
 
@@ -163,12 +289,38 @@ class ChartView(QWidget):
     def selectMarker(self, xValue: float):
         """ Select marker in annotation bar and bring up full view in annotation list """
         selectedChannel = self.getChannels()[self.focusedChartIndex]
-        for markerGroup in self.markers[selectedChannel]:
-            if markerGroup.marker.getInterval().contains(xValue):
+        if selectedChannel in self.markerLayers:
+            markers = self.markerLayers[selectedChannel].itemsAt(xValue)
+            if markers:
+                # The marker that starts last is drawn on top
                 print("Marker found")
-                self.annotationSelected.emit(markerGroup.id)
+                self.annotationSelected.emit(markers[-1].annotationId)
                 return 
         print("No marker found") 
+
+    def isFocusedChannel(self, channel: int) -> bool:
+        """ Whether the markers of a channel are currently shown """
+        return bool(self.channels) and channel == self.channels[self.focusedChartIndex]
+
+    def markerLayer(self, channel: int) -> AnnotationLayer:
+        """ Returns the layer of the annotation bar that draws the markers
+            of a channel, creating it if needed """
+        if channel not in self.markerLayers:
+            layer = AnnotationBarLayer()
+            layer.setVisible(self.isFocusedChannel(channel))
+            layer.attach(self.annotationBar)
+            self.markerLayers[channel] = layer
+        return self.markerLayers[channel]
+
+    def borderLayer(self, channel: int) -> AnnotationLayer:
+        """ Returns the layer of a channel's chart that draws the borders of
+            its markers, creating it if needed """
+        if channel not in self.borderLayers:
+            layer = BorderLayer(z=QwtPlotMarker().z())
+            layer.setVisible(self.isFocusedChannel(channel))
+            layer.attach(self.charts[self.getChannels().index(channel)])
+            self.borderLayers[channel] = layer
+        return self.borderLayers[channel]
     
 
     @Slot(Annotation)
@@ -176,6 +328,7 @@ class ChartView(QWidget):
         """ Add annotation marker to annotation bar"""
         marker = AnnotationMarker(QColor(170, 255, 0,50))
         marker.setText(annotation.text)
+        marker.setAnnotationId(annotation.id)
         markerGroup = MarkerGroup(id = annotation.id, marker = marker, leftBorder=self.addVerticalLineMarker(annotation.timeStart, QColor(170, 255, 0,100), annotation.channel))
 
         if annotation.duration == 0:  # Point marker 
@@ -188,7 +341,10 @@ class ChartView(QWidget):
             markerGroup.rightBorder = self.addVerticalLineMarker(annotation.timeStart + annotation.duration, QColor(170, 255, 0,100), annotation.channel)
 
         # Set text label to be aligned to the top-right of the marker
-        marker.attach(self.annotationBar)
+        interval = marker.getInterval()
+        self.markerLayer(annotation.channel).addItem(marker, interval.minValue(), interval.maxValue())
+        if self.renderScheduler is not None:
+            self.annotationBar.requestReplot()
 
         # Divide annotations based on channel
         if annotation.channel not in self.markers:
@@ -205,12 +361,12 @@ class ChartView(QWidget):
         line.setLineStyle(QwtPlotMarker.VLine)
         line.setXValue(xValue)
         line.setLinePen(QPen(color, 5))
-        line.attach(self.charts[self.getChannels().index(annotationChannel)])
+        self.borderLayer(annotationChannel).addItem(line, xValue, xValue)
         return line 
 
     @Slot()
     def displayPause(self):
         """Pause in recording"""
         self.charts[0].isPaused = True 
-        self.charts[0].resetCurve(lastTime=self.charts[0].times[-1], lastVoltage=self.charts[0].voltages[-1])
+        self.charts[0].markPauseStart()
 
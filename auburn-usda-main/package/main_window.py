@@ -8,14 +8,16 @@ from functools import cached_property
 
 import coloredlogs
 from coloredlogs import ColoredFormatter
-from PySide6.QtCore import QEvent, QObject, Qt, Signal, Slot
-from PySide6.QtGui import QAction, QColor
+from PySide6.QtCore import QEvent, QObject, Qt, QThreadPool, Signal, Slot
+from PySide6.QtGui import QAction, QActionGroup, QColor
 from PySide6.QtWidgets import (
     QApplication,
     QFileDialog,
+    QInputDialog,
     QLabel,
     QMainWindow,
     QMessageBox,
+    QProgressDialog,
     QStatusBar,
     QStyle,
     QToolBar,
@@ -27,10 +29,24 @@ from package.annotation_list import AnnotationList
 from package.chart_view import ChartView
 from package.epg_control import EPGControl
 from package.log_msg import LogMsg
-from package.utils.data_classes import Annotation, DataPoint
-from package.utils.enums import Mode
-from package.utils.file_reader import anaRead, csvRead
+from package.render_scheduler import RenderScheduler
+from package.utils.data_classes import Annotation, DataArrays, DataPoint
+from package.utils.enums import DecimationMethod, FsyncPolicy, Mode
+from package.utils.channel_loader import ChannelLoader
+from package.utils.chunked_store import CHUNKED_EXTENSION, ChunkedStore, readChunked
+from package.utils.decimation import DecimationEngine
+from package.utils.demux import demultiplex
+from package.utils.file_cache import FileCache, readPyramid
+from package.utils.import_worker import ImportSignals, ImportWorker
+from package.utils.min_max_pyramid import MinMaxPyramid
+from package.utils.recording_writer import FLUSH_INTERVAL
 from package.utils.serial_reader import SerialData
+from package.utils.session_file import (
+    SESSION_EXTENSION,
+    Session,
+    convertToSession,
+    readSession,
+)
 
 
 class LogSignal(QObject):
@@ -94,6 +110,8 @@ class MainWindow(QMainWindow):
         """
         super().__init__(parent=None)
         self.setWindowTitle("EPG Signal Visualizer")
+        # Limits how often live data is drawn
+        self.renderScheduler = RenderScheduler()
         self.createChartView()
         self._createActions()
         self._createMenu()
@@ -115,6 +133,9 @@ class MainWindow(QMainWindow):
         self.chartView.chartMouseReleased.connect(self.showAddAnnotationWindow)
         self.chartView.annotationSelected.connect(self.viewAnnotation)
         self.splitData = None
+        self.importWorker = None
+        self.runningImports = []
+        self.fileCache = FileCache()
         self.initializeLogFile()
         self.setupLogging()
     
@@ -154,6 +175,18 @@ class MainWindow(QMainWindow):
         self.importAction = QAction("&Import File", self)
         self.importAction.triggered.connect(self.importFile)
 
+        # Import part of a session file or compressed recording
+        self.importTimeRangeAction = QAction("Import &Time Range", self)
+        self.importTimeRangeAction.triggered.connect(self.importTimeRange)
+
+        # Convert csv/ana file to session file
+        self.convertFileAction = QAction("&Convert File to Session", self)
+        self.convertFileAction.triggered.connect(self.convertFile)
+
+        # Remove cached copies of previously imported files
+        self.clearCacheAction = QAction("C&lear File Cache", self)
+        self.clearCacheAction.triggered.connect(self.clearFileCache)
+
         # Import annotations
         self.importAnnotationsAction = QAction("&Import Annotations", self)
         self.importAnnotationsAction.triggered.connect(self.importAnnotations)
@@ -168,6 +201,25 @@ class MainWindow(QMainWindow):
         self.setUpEPGAction.setIcon(setUpEPGIcon)
         self.setUpEPGAction.triggered.connect(self.setUpEPG)
 
+        # Ask the EPG monitor for binary frames when it is set up
+        self.binaryFramingAction = QAction("Request &Binary Framing from EPG", self)
+        self.binaryFramingAction.setCheckable(True)
+
+        # Choose when recordings are forced to disk
+        self.fsyncPolicy = FsyncPolicy.ON_PAUSE
+        self.fsyncActions = QActionGroup(self)
+        for name, policy in (
+            ("&Never", FsyncPolicy.NONE),
+            ("&Periodically", FsyncPolicy.PERIODIC),
+            ("On Pause and &Stop", FsyncPolicy.ON_PAUSE),
+        ):
+            action = QAction(name, self.fsyncActions)
+            action.setCheckable(True)
+            action.setChecked(policy == self.fsyncPolicy)
+            action.triggered.connect(
+                lambda checked, policy=policy: setattr(self, "fsyncPolicy", policy)
+            )
+
         # Start recording serial data
         self.recordSerialDataAction = QAction("&Record serial data", self)
         recordIcon = self.style().standardIcon(getattr(QStyle, "SP_MediaPlay"))
@@ -207,10 +259,41 @@ class MainWindow(QMainWindow):
         self.showLogAction.triggered.connect(self.showLogMsg)
 
 
+        # Only load the data of a channel once its chart is shown
+        self.loadOnDemandAction = QAction("&Load Channels on Demand", self)
+        self.loadOnDemandAction.setCheckable(True)
+
+        # Zoom and scroll every chart together
+        self.linkNavigationAction = QAction("Lin&k Chart Navigation", self)
+        self.linkNavigationAction.setCheckable(True)
+        self.linkNavigationAction.toggled.connect(self.chartView.setLinkedNavigation)
+
+        # Fit the y axis of the focused chart to the data in view (Y key)
+        self.autoscaleVisibleAction = QAction("Toggle &Y Autoscale of Focused Chart", self)
+        self.autoscaleVisibleAction.triggered.connect(self.chartView.toggleVisibleAutoscale)
+
+        # Choose how imported data is decimated when zoomed out
+        self.decimationActions = QActionGroup(self)
+        for name, method in (
+            ("&Min/Max", DecimationMethod.MIN_MAX),
+            ("&Stride", DecimationMethod.STRIDE),
+            ("&Relative Change", DecimationMethod.RELATIVE_CHANGE),
+        ):
+            action = QAction(name, self.decimationActions)
+            action.setCheckable(True)
+            action.setChecked(method == self.chartView.decimationMethod)
+            action.triggered.connect(
+                lambda checked, method=method: self.chartView.setDecimationMethod(method)
+            )
+
         # Manually change the value at which to zoom by
         self.changeZoomAction = QAction("&Change zoom scale", self)
         self.changeZoomAction.triggered.connect(self.chartView.changeChartZoom)
 
+        # Change how many times per second live data is drawn
+        self.changeFrameRateAction = QAction("Change Live &Frame Rate", self)
+        self.changeFrameRateAction.triggered.connect(self.changeFrameRate)
+
     def _createMenu(self):
         """
         Create menu bar with various actions for file operations and settings.
@@ -218,12 +301,27 @@ class MainWindow(QMainWindow):
         """
         menu = self.menuBar().addMenu("&File")
         menu.addAction(self.importAction)
+        menu.addAction(self.importTimeRangeAction)
+        menu.addAction(self.convertFileAction)
         menu.addAction(self.importAnnotationsAction)
+        menu.addAction(self.clearCacheAction)
+        menu.addAction(self.binaryFramingAction)
+        fsyncMenu = menu.addMenu("Sync Recordings to &Disk")
+        fsyncMenu.addActions(self.fsyncActions.actions())
 
         menu = self.menuBar().addMenu("&View")
         menu.addAction(self.changeZoomAction)
+        menu.addAction(self.changeFrameRateAction)
+        menu.addAction(self.linkNavigationAction)
+        menu.addAction(self.autoscaleVisibleAction)
+        decimationMenu = menu.addMenu("&Decimation")
+        decimationMenu.addActions(self.decimationActions.actions())
 
         menu.addAction(self.viewAnnotationsAction)
+        menu.addAction(self.loadOnDemandAction)
+
+        # Filled in with a visibility toggle per channel once a file is imported
+        self.channelsMenu = self.menuBar().addMenu("&Channels")
 
     def _createToolBar(self):
         """Create the tool bar and connect actions with each tool item"""
@@ -249,6 +347,19 @@ class MainWindow(QMainWindow):
         self.timer = QLabel("0s")
         self.statusBar.addWidget(self.timer)
 
+        # Show how smoothly live data is being drawn
+        self.renderMetrics = QLabel("")
+        self.statusBar.addPermanentWidget(self.renderMetrics)
+        self.renderScheduler.metricsUpdated.connect(self.updateRenderMetrics)
+
+        # Show whether samples are waiting to be drawn or were dropped
+        self.queueMetrics = QLabel("")
+        self.statusBar.addPermanentWidget(self.queueMetrics)
+
+        # Show how far writing the recording to file is behind
+        self.writerMetrics = QLabel("")
+        self.statusBar.addPermanentWidget(self.writerMetrics)
+
     def createSerialDataConnections(self):
         """After serial port is set up, connect all signals to slots
         Qt.ConnectionType.UniqueConnection ensures that there are not
@@ -264,7 +375,7 @@ class MainWindow(QMainWindow):
         self.serialData.startTime.connect(self.assignStartTime)
 
         self.serialData.progress.connect(
-            self.chartView.getCharts()[0].addDataPoints,
+            self.chartView.getCharts()[0].addLiveData,
             Qt.ConnectionType.UniqueConnection,
         )
         self.serialData.progress.connect(
@@ -283,7 +394,7 @@ class MainWindow(QMainWindow):
             self.chartView.displayPause, Qt.ConnectionType.UniqueConnection
         )
         self.serialData.processed.connect(
-            lambda filename: self.importFileGivenName([filename + "_processed.csv"]), Qt.ConnectionType.UniqueConnection
+            lambda filename: self.importFileGivenName([filename + "_processed" + SESSION_EXTENSION]), Qt.ConnectionType.UniqueConnection
         )
         self.serialData.processed.connect(
             lambda filename: self.importAnnotationsGivenName([filename+ "_annotations.csv"]), Qt.ConnectionType.UniqueConnection
@@ -291,10 +402,18 @@ class MainWindow(QMainWindow):
         self.serialData.addAnnotation.connect(
             self.chartView.addMarker, Qt.ConnectionType.UniqueConnection
         )
+        self.serialData.queueMetrics.connect(
+            self.updateQueueMetrics, Qt.ConnectionType.UniqueConnection
+        )
+        self.serialData.writerMetrics.connect(
+            self.updateWriterMetrics, Qt.ConnectionType.UniqueConnection
+        )
 
     @Slot(QEvent)
     def closeEvent(self, event):
         """Close all open windows when main window is closed"""
+        if self.serialData is not None:
+            self.serialData.shutdown()
         QApplication.closeAllWindows()
 
     """ 
@@ -304,9 +423,14 @@ class MainWindow(QMainWindow):
     @Slot()
     def setUpEPG(self):
         """Scan open serial ports and select EPG monitor"""
+        if self.serialData is not None:
+            self.serialData.shutdown()
         self.serialData = SerialData()
+        self.serialData.binaryFraming = self.binaryFramingAction.isChecked()
         self.chartView.reset()
+        self.updateChannelsMenu()
         self.chartView.createChart()  # Must create chart first before hooking up connections
+        self.chartView.setRenderScheduler(self.renderScheduler)
 
         self.createSerialDataConnections()
         self.serialData.setUpSerial()
@@ -344,6 +468,7 @@ class MainWindow(QMainWindow):
                 messageBox.exec()
                 return
             if not self.serialData.file:
+                self.serialData.fsyncPolicy = self.fsyncPolicy
                 self.serialData.createFile(filename)
 
         self.serialData.startReadingData()
@@ -364,9 +489,9 @@ class MainWindow(QMainWindow):
         dlg.setText("Recording paused")
         dlg.show()
 
-    @Slot(bool, list)
+    @Slot(bool, DataArrays, float)
     def resumeSerialData(
-        self, savePausedData: bool, buffer: list[DataPoint], timePausedFor: float
+        self, savePausedData: bool, buffer: DataArrays, timePausedFor: float
     ):
         """When user clicks the play button after pausing, update chart
         depending on whether user chose to keep paused portion or not
@@ -382,6 +507,9 @@ class MainWindow(QMainWindow):
     def stopSerialData(self):
         """When user clicks stop recording, end recording session"""
         self.serialData.stopData()
+        # Unless the processed recording was opened instead, let the user
+        # navigate everything that was recorded
+        self.chartView.getCharts()[0].finishLiveRecording()
 
         self.recordSerialDataAction.setEnabled(True)
         self.pauseSerialDataAction.setEnabled(False)
@@ -394,15 +522,58 @@ class MainWindow(QMainWindow):
         """
         self.startTime = startTime
 
-    @Slot(DataPoint)
-    def updateCurrentDataPoint(self, points: list[DataPoint]):
+    @Slot(DataArrays)
+    def updateCurrentDataPoint(self, data: DataArrays):
         """Keep track of most recent point sent over serial data
-        :param points: list of most recent packet of serial data
+        :param data: most recent samples of serial data
         """
-        lastPoint = points[-1]
+        lastPoint = DataPoint(data.times[-1], data.voltages[-1], data.channels[-1])
         self.timer.setText(f"{lastPoint.time:.2f}s")
         self.currentDataPoint = lastPoint
 
+    @Slot(float, float, int)
+    def updateRenderMetrics(self, fps: float, samplesPerFrame: float, droppedFrames: int):
+        """Show the latest metrics of the render scheduler
+        :param fps: frames drawn per second
+        :param samplesPerFrame: average number of samples drawn by each frame
+        :param droppedFrames: frames that were late since the last update
+        """
+        self.renderMetrics.setText(
+            f"{fps:.0f} fps, {samplesPerFrame:.1f} samples/frame, {droppedFrames} dropped"
+        )
+        if droppedFrames:
+            logging.info(f"Render: {fps:.0f} fps, {samplesPerFrame:.1f} samples/frame, {droppedFrames} dropped frames")
+
+    @Slot(int, int)
+    def updateQueueMetrics(self, maxDepth: int, overflows: int):
+        """Show the latest metrics of the queue of samples read from the EPG
+        :param maxDepth: most blocks of samples waiting to be drawn at once
+        :param overflows: blocks dropped from the chart since the last update
+        """
+        self.queueMetrics.setText(f"queue {maxDepth}, {overflows} dropped")
+        if overflows:
+            logging.error(f"Sample queue overflowed, {overflows} blocks were not drawn (still saved to file)")
+
+    @Slot(float, int)
+    def updateWriterMetrics(self, maxLatency: float, backlog: int):
+        """Show the latest metrics of the writer of the recording file
+        :param maxLatency: longest time in seconds a sample waited to be written
+        :param backlog: samples not written to file yet
+        """
+        self.writerMetrics.setText(f"write {maxLatency * 1000:.0f} ms, {backlog} behind")
+        # Samples are normally written within FLUSH_INTERVAL
+        if maxLatency > 2 * FLUSH_INTERVAL:
+            logging.info(f"Recording writer: {maxLatency:.2f}s latency, {backlog} samples behind")
+
+    @Slot()
+    def changeFrameRate(self):
+        """Ask the user for the most frames per second live data is drawn at"""
+        value, ok = QInputDialog.getInt(
+            self, "Live Frame Rate", "Frames per second", self.renderScheduler.maxFps, 1, 240
+        )
+        if ok:
+            self.renderScheduler.setMaxFps(value)
+
     def showLogMsg(self):
         self.logMsg.show()
 
@@ -418,8 +589,8 @@ class MainWindow(QMainWindow):
         print("User selecting file...")
         dialog = QFileDialog(self)
         dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
-        dialog.setNameFilters(["Text files (*.CSV *.csv *.ANA *.ana)"])
-        dialog.selectNameFilter("Text files")
+        dialog.setNameFilters(["EPG files (*.CSV *.csv *.ANA *.ana *.EPGS *.epgs *.EPGZ *.epgz)"])
+        dialog.selectNameFilter("EPG files")
 
         if dialog.exec():
             fileName = dialog.selectedFiles()
@@ -429,36 +600,308 @@ class MainWindow(QMainWindow):
             self.splitData = None
             self.importFileGivenName(fileName)
 
-    def importFileGivenName(self, filename: str):
-        """Import data given a filename and display it on the chart
+    @Slot()
+    def convertFile(self):
+        """Convert a csv or ana recording into a session file that opens
+        without having to be parsed again"""
+        fileName = QFileDialog.getOpenFileName(
+            self, "Convert File", "", "Text files (*.CSV *.csv *.ANA *.ana)"
+        )[0]
+        if not fileName:
+            print("File not given or found...")
+            return
+        sessionFile = convertToSession(fileName)
+        logging.info("Converted " + fileName + " to " + sessionFile)
+        QMessageBox(text=f"Saved session file {sessionFile}").exec()
+
+    @Slot()
+    def importTimeRange(self):
+        """Import a time range of a session file or compressed recording,
+        reading only the part of the file that holds it"""
+        fileName = QFileDialog.getOpenFileName(
+            self, "Import Time Range", "", "EPG sessions (*.EPGS *.epgs *.EPGZ *.epgz)"
+        )[0]
+        if not fileName:
+            print("File not given or found...")
+            return
+        start, ok = QInputDialog.getDouble(
+            self, "Import Time Range", "Start time (s)", 0, 0, 1e9, 2
+        )
+        if not ok:
+            return
+        end, ok = QInputDialog.getDouble(
+            self, "Import Time Range", "End time (s)", start + 300, start, 1e9, 2
+        )
+        if not ok:
+            return
+        self.splitData = None
+        self.importFileGivenName([fileName], (start, end))
+
+    @Slot()
+    def clearFileCache(self):
+        """Remove the cached copies of all previously imported files"""
+        size = self.fileCache.size()
+        self.fileCache.clear()
+        QMessageBox(text=f"Cleared {size / 2**20:.1f} MB from the file cache").exec()
+
+    def importFileGivenName(self, filename: str, timeRange: tuple[float, float] = None):
+        """Import data given a filename and display it on the chart. Csv
+        and ana files are parsed on a worker thread; the charts are filled
+        in as the data arrives. Files that were imported before and have not
+        changed since are opened from the file cache instead.
+
+        When channels are loaded on demand, only the first channel is shown
+        and loaded; the others are loaded once shown from the Channels menu.
 
         :param filename: filename of file to read from
+        :param timeRange: start and end time in seconds to import from a
+            session file or compressed recording, or None for all of it
         """
+        if self.importWorker is not None:
+            self.importWorker.cancel()
+            self.importWorker = None
         self.chartView.reset()
+        self.updateChannelsMenu()
 
         _, fileType = os.path.splitext(filename[0])
-        data = None
         print("Reading in data...")
-        if fileType.lower() == ".ana":
-            data = anaRead(filename[0])
-        if fileType.lower() == ".csv":
-            data = csvRead(filename[0])
+        if fileType.lower() == SESSION_EXTENSION:
+            source = readSession(filename[0])
+        elif fileType.lower() == CHUNKED_EXTENSION:
+            source = readChunked(filename[0])
+        else:
+            source = self.fileCache.load(filename[0])
+            if source is not None:
+                print("Opening cached copy of " + filename[0])
+
+        if source is not None and self.loadOnDemandAction.isChecked():
+            self.showSessionOnDemand(source, timeRange)
+        elif source is not None:
+            # Session files and compressed recordings are already separated
+            # by channel, and only the chunks within timeRange are read.
+            # Mapped blocks stay readable once the file is closed.
+            with source:
+                splitData = [
+                    source.channelData(channel)
+                    if timeRange is None
+                    else source.readRange(channel, *timeRange)
+                    for channel in source.channels
+                ]
+                # Decimation levels stored with the file, e.g. by the cache
+                pyramids = None
+                if timeRange is None and isinstance(source, Session):
+                    pyramids = [
+                        readPyramid(source, channel, data)
+                        for channel, data in zip(source.channels, splitData)
+                    ]
+            self.showImportedData(list(source.channels), splitData, pyramids=pyramids)
+        else:
+            self.startImportWorker(filename[0])
 
-        print("Separating data channels...")
-        self.divideData(data)
+    def startImportWorker(self, filename: str):
+        """Parse a csv or ana file on a worker thread, with a progress
+        dialog that allows the user to cancel the import. When channels are
+        loaded on demand, the file is only separated by channel into the
+        file cache.
+
+        :param filename: filename of file to read from
+        """
+        worker = ImportWorker(
+            filename,
+            self.fileCache,
+            indexOnly=self.loadOnDemandAction.isChecked(),
+            decimationMethod=self.chartView.decimationMethod,
+        )
+        progressDialog = QProgressDialog("Reading in data...", "Cancel", 0, worker.fileSize, self)
+        progressDialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progressDialog.setMinimumDuration(0)
+        progressDialog.canceled.connect(worker.cancel)
+
+        worker.signals.progress.connect(progressDialog.setValue)
+        worker.signals.partial.connect(self.showPartialImport)
+        worker.signals.finished.connect(self.showImportedData)
+        worker.signals.indexed.connect(self.showIndexedFile)
+        worker.signals.cancelled.connect(self.importCancelled)
+        worker.signals.failed.connect(self.importFailed)
+        for signal in (
+            worker.signals.finished,
+            worker.signals.indexed,
+            worker.signals.cancelled,
+            worker.signals.failed,
+        ):
+            signal.connect(progressDialog.reset)
+            # Each import has its own dialog, so it is deleted once done
+            signal.connect(progressDialog.deleteLater)
+            signal.connect(self.releaseImportWorker)
+
+        # Workers are kept alive until they finish so that signals from a
+        # replaced import can still be recognized as stale
+        self.runningImports.append(worker)
+        self.importWorker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    @Slot()
+    def releaseImportWorker(self):
+        """Drop the reference to an import worker that has finished"""
+        self.runningImports = [
+            worker for worker in self.runningImports if worker.signals is not self.sender()
+        ]
+
+    @Slot(list, list)
+    def showPartialImport(self, channels: list[int], splitData: list[DataArrays]):
+        """Show the data read so far while a file is still being imported.
+        Only stride views are drawn, as decimating everything read so far
+        on every partial result would stall the GUI thread.
+
+        :param channels: channels found so far, in the order they appear
+        :param splitData: samples of each channel read so far
+        """
+        if self.isStaleImport():
+            return
+        self.createChannelCharts(channels)
+        self.displayChannels(
+            splitData,
+            [DecimationEngine(data.times, data.voltages, preview=True) for data in splitData],
+        )
+
+    @Slot(list, list, list)
+    def showImportedData(
+        self,
+        channels: list[int],
+        splitData: list[DataArrays],
+        decimations: list[DecimationEngine] = None,
+        pyramids: list[MinMaxPyramid] = None,
+    ):
+        """Display the data of a fully imported file
+
+        :param channels: channels of the file, in the order they appear
+        :param splitData: samples of each channel
+        :param decimations: decimation levels of each channel, or None to
+            build them when they are displayed
+        :param pyramids: min/max levels of each channel that were already
+            built, used when building the decimation levels
+        """
+        if self.isStaleImport():
+            return
+        self.importWorker = None
+        self.splitData = splitData
+        self.createChannelCharts(channels)
 
         # Display data on chart
         print("Displaying data...")
-        for i in range(len(self.chartView.getChannels())):
-            self.chartView.createChart()
-            title = QwtText(f"Channel {self.chartView.getChannels()[i]}  Data ({len(self.splitData[i])})")
-            self.chartView.getCharts()[i].retitle(title)
-            self.chartView.getCharts()[i].displayImportedData(self.splitData[i])
+        self.displayChannels(self.splitData, decimations, pyramids)
         self.chartView.syncXAxis(0)
         # Show first graph as selected by displaying red title
         title = self.chartView.getCharts()[0].title().setColor(QColor("red"))
         self.changeMode(Mode.POST_ACQUISITION)
 
+    @Slot(str)
+    def showIndexedFile(self, sessionFile: str):
+        """Display a file that was separated by channel into a session file
+
+        :param sessionFile: session file holding the channels of the file
+        """
+        if self.isStaleImport():
+            return
+        self.showSessionOnDemand(readSession(sessionFile))
+
+    def showSessionOnDemand(
+        self, source: Session | ChunkedStore, timeRange: tuple[float, float] = None
+    ):
+        """Create a chart for every channel of a session file or compressed
+        recording, but only show and load the first one
+
+        :param source: file holding the channels to display
+        :param timeRange: start and end time in seconds to load, or None for
+            whole channels
+        """
+        self.importWorker = None
+        self.splitData = None
+        self.createChannelCharts(list(source.channels))
+        self.chartView.setChannelLoader(ChannelLoader(source, timeRange=timeRange))
+        for i, chart in enumerate(self.chartView.getCharts()):
+            self.chartView.setChartVisible(i, i == 0)
+        self.updateChannelsMenu()
+
+        self.chartView.syncXAxis(0)
+        self.chartView.getCharts()[0].title().setColor(QColor("red"))
+        self.changeMode(Mode.POST_ACQUISITION)
+
+    def updateChannelsMenu(self):
+        """List a visibility toggle for the chart of every channel"""
+        self.channelsMenu.clear()
+        for i, channel in enumerate(self.chartView.getChannels()):
+            action = self.channelsMenu.addAction(f"Channel {channel}")
+            action.setCheckable(True)
+            action.setChecked(not self.chartView.getCharts()[i].isHidden())
+            action.toggled.connect(
+                lambda checked, chartId=i: self.chartView.setChartVisible(chartId, checked)
+            )
+
+    @Slot()
+    def importCancelled(self):
+        """Clear the partially imported file"""
+        if self.isStaleImport():
+            return
+        print("Import cancelled")
+        self.importWorker = None
+        self.splitData = None
+        self.chartView.reset()
+        self.updateChannelsMenu()
+
+    @Slot(str)
+    def importFailed(self, message: str):
+        """Report a file that could not be imported"""
+        if self.isStaleImport():
+            return
+        logging.error("Unable to import file, " + message)
+        self.importCancelled()
+        QMessageBox(text=f"Unable to import file: {message}").exec()
+
+    def isStaleImport(self):
+        """Whether the signal being handled comes from an import that has
+        since been cancelled or replaced by another one"""
+        sender = self.sender()
+        return isinstance(sender, ImportSignals) and (
+            self.importWorker is None or sender is not self.importWorker.signals
+        )
+
+    def createChannelCharts(self, channels: list[int]):
+        """Create a chart for each channel that does not have one yet
+
+        :param channels: channels to show, in the order they appear
+        """
+        newChannels = channels[len(self.chartView.getCharts()):]
+        for channel in newChannels:
+            self.chartView.channels.append(channel)
+            self.chartView.createChart()
+        if newChannels:
+            self.updateChannelsMenu()
+
+    def displayChannels(
+        self,
+        splitData: list[DataArrays],
+        decimations: list[DecimationEngine] = None,
+        pyramids: list[MinMaxPyramid] = None,
+    ):
+        """Show the data of each channel on its chart
+
+        :param splitData: samples of each channel, in the order of channels
+        :param decimations: decimation levels of each channel, or None to
+            build them on each chart
+        :param pyramids: min/max levels of each channel that were already
+            built, used when building the decimation levels
+        """
+        for i, data in enumerate(splitData):
+            chart = self.chartView.getCharts()[i]
+            chart.retitle(QwtText(f"Channel {self.chartView.getChannels()[i]}  Data ({len(data)})"))
+            chart.displayImportedData(
+                data,
+                decimations[i] if decimations else None,
+                pyramids[i] if pyramids else None,
+            )
+            chart.replot()
+
     def changeMode(self, mode: Mode):
         """ Set software mode to data acquisition mode or post acquisition mode """
         if self.mode != mode:
@@ -467,28 +910,13 @@ class MainWindow(QMainWindow):
             for chart in self.chartView.getCharts():
                 chart.canvas().mode = mode
 
-    def divideData(self, data: list[DataPoint]):
+    def divideData(self, data: DataArrays):
         """After data has been obtained, the data is then
         split up based on which channel it belongs to. The sets
         of data representing channels are stored 'splitData'.
         The channel order is stored in 'channels'
         """
-
-        for point in data:
-            if data is None:
-                break
-            if self.splitData is None:
-                self.splitData = [[point]]
-                self.chartView.channels = [point.channel]
-                continue
-            try:
-                index = self.chartView.channels.index(point.channel)
-            except ValueError:
-                self.splitData += [[point]]
-                self.chartView.channels.append(point.channel)
-                continue
-
-            self.splitData[index].append(point)
+        self.chartView.channels, self.splitData = demultiplex(data)
 
     def importAnnotations(self):
         """Given csv of annotations, import them into the current imported file"""
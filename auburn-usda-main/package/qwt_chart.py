@@ -1,12 +1,34 @@
 import time
 
-from PySide6.QtCore import Qt, Signal, Slot
-from PySide6.QtGui import QColor, QPen
-from qwt import QwtPlot, QwtPlotCurve, QwtPlotItem, QwtPlotGrid
+import numpy as np
+from PySide6.QtCore import QRectF, Qt, Signal, Slot
+from PySide6.QtGui import QColor
+from qwt import QwtPlot, QwtPlotItem, QwtPlotGrid, QwtPointArrayData
 
 from package.chart_canvas import ChartCanvas
 from package.range_marker import RangeMarker
-from package.utils.data_classes import DataPoint
+from package.tiled_curve import TileCache, TiledCurve
+from package.utils.channel_store import ChannelStore
+from package.utils.data_classes import DataArrays, DataPoint
+from package.utils.decimation import DecimationEngine
+from package.utils.enums import DecimationMethod
+from package.utils.min_max_pyramid import MinMaxPyramid, visiblePoints
+from package.utils.ring_buffer import RingBuffer
+
+LIVE_BUFFER_CAPACITY = 2**20  # most recent samples of a live recording kept for plotting
+
+
+class CurveData(QwtPointArrayData):
+    """Points of a curve that only cover part of its channel. The bounding
+    rectangle is that of the whole channel, so autoscaling does not depend
+    on which part is shown."""
+
+    def __init__(self, x, y, boundingRect: QRectF):
+        super().__init__(x, y, finite=False)
+        self.rect = boundingRect
+
+    def boundingRect(self):
+        return self.rect
 
 
 class Chart(QwtPlot):
@@ -33,7 +55,9 @@ class Chart(QwtPlot):
         self.setAxisMaxMajor(self.xBottom, 10)
         QwtPlotGrid.make(self, color=QColor(211, 211, 211, 255), width=0, style=Qt.PenStyle.DotLine)
 
-        self.curve = QwtPlotCurve()
+        # Rendered tiles of the curve, shared with the other charts
+        self.tileCache = None
+        self.curve = TiledCurve()
         self.curve.attach(self)
 
         self.canvas().mouseButtonPressed.connect(self.pointSelected)
@@ -44,8 +68,25 @@ class Chart(QwtPlot):
         # Data Storage
         self.times = []
         self.voltages = []
-        self.timeSets = []
-        self.voltageSets = []
+        # Decimated imported data used to draw it at any zoom level
+        self.decimationMethod = DecimationMethod.MIN_MAX
+        self.decimation = None
+        self.dataRect = QRectF()
+        # Time range and width the curve's points were last picked for
+        self.curveView = None
+        # Samples of a live recording, the most recent and all of them
+        self.liveBuffer = None
+        self.history = None
+        self.pauseStart = 0
+        # Live samples received since the chart was last drawn
+        self.pendingTimes = []
+        self.pendingVoltages = []
+        self.pendingChannel = 0
+        # Coalesces live updates into frames, None to draw every update
+        self.renderScheduler = None
+        # Applies x-axis navigation to every linked chart, None to only
+        # navigate this chart
+        self.navigationLink = None
 
         # Viewing Axes
         self.viewMin = 0
@@ -58,6 +99,10 @@ class Chart(QwtPlot):
         self.yMin = -2
         self.yMax = 8
         self.setAxisScale(QwtPlot.xBottom, 0, self.xRange)
+        self.axisWidget(QwtPlot.xBottom).scaleDivChanged.connect(self.updateCurveData)
+
+        # Whether the y axis fits the samples in the visible time range
+        self.autoscaleVisible = False
 
         self.isPaused = False
         self.pauseMarker = None
@@ -117,118 +162,291 @@ class Chart(QwtPlot):
             case Qt.Key.Key_Down:
                 self.scroll(-1, 1)
                 print("Scrolling down by 1 unit")
+            case Qt.Key.Key_Y:
+                print("Toggling y-axis autoscaling to the visible data")
+                self.setVisibleAutoscale(not self.autoscaleVisible)
             case _:
                 pass
 
-    def displayImportedData(self, data: list[DataPoint]):
+    def displayImportedData(
+        self, data: DataArrays, decimation: DecimationEngine = None, pyramid: MinMaxPyramid = None
+    ):
         """Displays data from an imported EPG file on chart
-        :param data: List of DataPoints
+        :param data: DataArrays holding the samples of this chart's channel
+        :param decimation: decimation levels of data, built here if None or
+            built for another method
+        :param pyramid: min/max levels of data that were already built, used
+            when the decimation levels are built here
         """
-
-        for point in data:
-            self.times.append(point.time)
-            self.voltages.append(point.voltage)
-            if point.voltage >= self.yMax:
-                self.yMax = point.voltage
-            elif point.voltage <= self.yMin:
-                self.yMin = point.voltage
-
-        self.curve.setData(self.times, self.voltages)
-        self.curve.attach(self)
+        if len(data) == 0:
+            self.unloadData()
+            return
+        self.times = data.times
+        self.voltages = data.voltages
+        if decimation is None or (not decimation.preview and decimation.method != self.decimationMethod):
+            decimation = DecimationEngine(
+                self.times, self.voltages, self.decimationMethod, pyramid=pyramid
+            )
+        self.decimation = decimation
+        self.curve.setDecimation(self.decimation)
+        voltageMin, voltageMax = self.decimation.voltageRange()
+        self.yMax = max(self.yMax, voltageMax)
+        self.yMin = min(self.yMin, voltageMin)
 
         self.absMin = self.times[0]  # Finds the range of the data
         self.absMax = self.times[-1]
+        self.dataRect = QRectF(
+            self.absMin, voltageMin, self.absMax - self.absMin, voltageMax - voltageMin
+        )
 
-        if len(data) > 4000:  # Ensures that only =<2000 points are plotted
-            self.viewMin = self.absMin
-            self.viewMax = self.times[3999]
-            self.setAxisScale(self.xBottom, self.viewMin, self.viewMax)
-        else:  # Plots all points if data is 2000 pts or less
-            self.viewMin = self.absMin
-            self.viewMax = self.absMax
-            self.setAxisAutoScale(self.xBottom, True)
+        # Only the points needed at the current zoom level are plotted, so
+        # the whole recording can be shown
+        self.viewMin = self.absMin
+        self.viewMax = self.absMax
+        self.setAxisScale(self.xBottom, self.viewMin, self.viewMax)
+        self.curveView = None
+        self.updateCurveData()
+        self.curve.attach(self)
 
         self.setAxisAutoScale(self.yLeft, True)
 
         # print(f'Current Range: {self.viewMin} to {self.viewMax}')
         # print(f'Total Range: {self.absMin} to {self.absMax}')
 
+    @Slot()
+    def updateCurveData(self):
+        """Gives the curve only the points needed to draw the visible time
+        range at the chart's width. Called whenever the x axis changes; the
+        visible samples are found by binary search, so this costs the same
+        for any length of recording. Replots that leave the view unchanged
+        reuse the points already given to the curve."""
+        if self.decimation is None and self.liveBuffer is None:
+            return
+        xAxis = self.axisScaleDiv(QwtPlot.xBottom)
+        view = (xAxis.lowerBound(), xAxis.upperBound(), self.canvas().width())
+        if view == self.curveView:
+            return
+        self.curveView = view
+        if self.decimation is not None:
+            times, voltages = self.decimation.points(*view)
+        else:
+            times, voltages = visiblePoints(self.liveBuffer.times, self.liveBuffer.voltages, *view)
+        self.curve.setData(CurveData(times, voltages, self.dataRect))
+
+    def setVisibleAutoscale(self, enabled: bool):
+        """Fits the y axis to the samples in the visible time range, or to
+        the whole channel if disabled
+        :param enabled: whether the y axis follows the visible samples
+        """
+        self.autoscaleVisible = enabled
+        if not enabled:
+            self.setAxisAutoScale(self.yLeft, True)
+        self.replot()
+
+    def visibleVoltageRange(self) -> tuple[float, float] | None:
+        """Smallest and largest voltage in the visible time range, from the
+        min/max summaries of imported data, or from the points drawn for
+        live data, which are at most a few per pixel
+        :returns: None if no samples are visible
+        """
+        xAxis = self.axisScaleDiv(QwtPlot.xBottom)
+        start, end = sorted((xAxis.lowerBound(), xAxis.upperBound()))
+        if self.decimation is not None:
+            return self.decimation.windowVoltageRange(start, end)
+        if self.liveBuffer is not None and self.curve.dataSize():
+            data = self.curve.data()
+            return float(np.min(data.yData())), float(np.max(data.yData()))
+        return None
+
+    def updateAxes(self):
+        """Updates the axes, then fits the y axis to the visible samples if
+        enabled. The x axis has to be updated first to know which samples
+        are visible, so the axes are updated again if the y axis changed."""
+        super().updateAxes()
+        if not self.autoscaleVisible:
+            return
+        voltageRange = self.visibleVoltageRange()
+        if voltageRange is None:
+            return
+        low, high = voltageRange
+        margin = (high - low) * 0.05 or 1
+        yAxis = self.axisScaleDiv(QwtPlot.yLeft)
+        if (yAxis.lowerBound(), yAxis.upperBound()) != (low - margin, high + margin):
+            self.setAxisScale(self.yLeft, low - margin, high + margin)
+            super().updateAxes()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.updateCurveData()
+
+    def unloadData(self):
+        """Drops the samples shown on the chart, keeping its markers"""
+        self.times = []
+        self.voltages = []
+        self.decimation = None
+        self.curve.setDecimation(None)
+        self.curve.setData(self.times, self.voltages)
+
+    def setDecimationMethod(self, method: DecimationMethod):
+        """Changes how imported data is decimated, recomputing the
+        decimation levels of data that is already shown
+        :param method: how samples are dropped at lower resolutions
+        """
+        self.decimationMethod = method
+        if self.decimation is None or self.decimation.method == method:
+            return
+        # The min/max summary of every sample does not depend on the method
+        self.decimation = DecimationEngine(
+            self.times, self.voltages, method, pyramid=self.decimation.rangePyramid
+        )
+        self.curve.setDecimation(self.decimation)
+        self.curveView = None
+        self.updateCurveData()
+        self.replot()
+
+    def setTileCache(self, tileCache: TileCache | None):
+        """Draws imported data from tiles kept in tileCache, which may be
+        shared with other charts, or directly if None"""
+        self.tileCache = tileCache
+        self.curve.setTileCache(tileCache)
+
     def addDataPoint(self, point: DataPoint):
         """Adds a new data point to a pre-existing chart and updates accordingly
         :param point: DataPoint retrieved from live serial data
         """
-        self.times.append(point.time)
-        self.voltages.append(point.voltage)
-        print("Plotting...")
-        self.curve.setData(self.times, self.voltages)
-        self.curve.attach(self)
-        self.setAxisAutoScale(QwtPlot.xBottom, True)
-        # self.setAxisAutoScale(QwtPlot.yLeft, False)
-        self.replot()
+        self.addDataPoints([point])
 
     @Slot(DataPoint)
     def addDataPoints(self, points: list[DataPoint]):
         """Adds a new data point to a pre-existing chart and updates accordingly
         :param points: list of DataPoints retrieved from live serial data
         """
+        if not points:
+            return
+        self.appendLiveData(
+            np.fromiter((point.time for point in points), dtype=np.float64, count=len(points)),
+            np.fromiter((point.voltage for point in points), dtype=np.float64, count=len(points)),
+            points[0].channel,
+        )
+
+    @Slot(DataArrays)
+    def addLiveData(self, data: DataArrays):
+        """Adds a block of samples of a live recording to the chart
+        :param data: samples retrieved from live serial data
+        """
+        if len(data) == 0:
+            return
+        self.appendLiveData(data.times, data.voltages, int(data.channels[0]))
+
+    def appendLiveData(self, times: np.ndarray, voltages: np.ndarray, channel: int = 0):
+        """Adds samples of a live recording to the chart. With a render
+        scheduler, samples are queued and drawn together on the next frame;
+        otherwise they are drawn right away.
+        :param times: sample times in seconds
+        :param voltages: sample voltages
+        :param channel: channel the samples belong to
+        """
+        if len(times) == 0:
+            return
+        self.pendingTimes.append(times)
+        self.pendingVoltages.append(voltages)
+        self.pendingChannel = channel
+        if self.renderScheduler is None:
+            self.renderFrame()
+        else:
+            self.renderScheduler.addSamples(len(times))
+            self.renderScheduler.markDirty(self)
+
+    def renderFrame(self):
+        """Adds the queued live samples to the chart and replots it"""
+        self.flushLiveData()
+        self.replot()
+
+    def flushLiveData(self):
+        """Adds the queued live samples to the chart. The most recent
+        samples are kept in a ring buffer that the curve reads views of,
+        and every sample is kept in a history that can be navigated once
+        the recording is finished."""
+        if not self.pendingTimes:
+            return
+        times = np.concatenate(self.pendingTimes)
+        voltages = np.concatenate(self.pendingVoltages)
+        self.pendingTimes = []
+        self.pendingVoltages = []
+
+        if self.liveBuffer is None:
+            self.liveBuffer = RingBuffer(LIVE_BUFFER_CAPACITY)
+            self.history = ChannelStore(self.pendingChannel)
+            self.curve.attach(self)
+        self.liveBuffer.append(times, voltages)
+        self.history.append(times, voltages)
+        self.times = self.liveBuffer.times
+        self.voltages = self.liveBuffer.voltages
+
+        self.yMax = max(self.yMax, self.history.voltageMax)
+        self.yMin = min(self.yMin, self.history.voltageMin)
+        firstTime = self.history.times[0]
+        self.dataRect = QRectF(
+            firstTime,
+            self.history.voltageMin,
+            times[-1] - firstTime,
+            self.history.voltageMax - self.history.voltageMin,
+        )
 
-        # yChanged = False
-        # xChanged = False
-        for point in points:
-            self.times.append(point.time)
-            self.voltages.append(point.voltage)
-            if self.yMax <= point.voltage:
-                self.yMax = point.voltage
-            elif self.yMin >= point.voltage:
-                self.yMin = point.voltage
         xAxis = self.axisScaleDiv(QwtPlot.xBottom)
-        self.absMax = points[-1].time + self.xRange
-        if points[-1].time > xAxis.upperBound():
+        self.absMax = times[-1] + self.xRange
+        if times[-1] > xAxis.upperBound():
             self.scroll(9, 0)
 
-        self.curve.setData(self.times, self.voltages)
-
+        self.curveView = None
+        self.updateCurveData()
 
         if self.isPaused:
             if self.pauseMarker is None:
                 self.pauseMarker = RangeMarker(QColor(255, 140, 0, 50))
-                self.pauseMarker.setInterval(points[-1].time, points[-1].time)
+                self.pauseMarker.setInterval(times[-1], times[-1])
                 self.pauseMarker.attach(self)
-            self.pauseMarker.setX2(points[-1].time)
-
+            self.pauseMarker.setX2(times[-1])
+
+    def finishLiveRecording(self):
+        """Shows the whole history of a finished live recording so that it
+        can be navigated like an imported file"""
+        self.flushLiveData()
+        if self.history is None:
+            return
+        data = self.history.data()
+        self.liveBuffer = None
+        self.history = None
+        if len(data):
+            self.displayImportedData(data)
         self.replot()
 
     def savePausedRecording(
-        self, savePaused: bool, buffer: list[DataPoint], timePausedFor
+        self, savePaused: bool, buffer: DataArrays, timePausedFor
     ):
         currentTime = time.time()
+        self.flushLiveData()
 
         # Remove orange background in chart that indicates pause
         self.isPaused = False
         self.pauseMarker.detach()
         self.pauseMarker = None
 
-        firstPoint = buffer[0]
-        if savePaused:
-            self.curve.setPen(QPen(Qt.GlobalColor.black))
-        else:
+        if not savePaused and self.history is not None:
             # Clear paused portion of graph
-            self.curve.detach()  # is this needed
-            self.replot()
-            self.resetCurve(firstPoint.time, firstPoint.voltage)
+            pausedSamples = len(self.history) - self.pauseStart
+            self.history.truncate(self.pauseStart)
+            self.liveBuffer.dropNewest(pausedSamples)
+            self.times = self.liveBuffer.times
+            self.voltages = self.liveBuffer.voltages
 
-        self.addDataPoints(buffer)
+        self.addLiveData(buffer)
 
-    def resetCurve(self, lastTime: float, lastVoltage: float):
-        """Clears current curve from graph and creates a new one"""
-        # Take last point of previous curve to make old curve and
-        # new curve "connected"
-        self.times = [lastTime]
-        self.voltages = [lastVoltage]
-        self.curve = QwtPlotCurve()
-        self.curve.setData(self.times, self.voltages)
-        self.curve.setPen(QPen(Qt.GlobalColor.black))
-        self.curve.attach(self)
+    def markPauseStart(self):
+        """Remembers where the paused portion of a live recording starts,
+        so that it can be removed if the user does not keep it"""
+        self.flushLiveData()
+        self.pauseStart = len(self.history) if self.history is not None else 0
 
     def zoomX(self, x):
         """Zooms the chart view by value x in the X axis.
@@ -241,15 +459,30 @@ class Chart(QwtPlot):
         new_scale_diff = round(time_diff / x * 0.5, 3)
         self.total_zoom *= x
 
+        viewMin = self.viewMin
+        viewMax = self.viewMax
         if x > 1:
-            self.viewMin += new_scale_diff
-            self.viewMax -= new_scale_diff
+            viewMin += new_scale_diff
+            viewMax -= new_scale_diff
         elif x < 1 and x > 0:
-            self.viewMin -= new_scale_diff
-            self.viewMax += new_scale_diff
+            viewMin -= new_scale_diff
+            viewMax += new_scale_diff
         else:
             pass
 
+        self.setXView(viewMin, viewMax)
+
+    def setXView(self, viewMin: float, viewMax: float):
+        """Shows a time range, on every linked chart at once if navigation
+        is linked
+        :param viewMin: first time shown
+        :param viewMax: last time shown
+        """
+        if self.navigationLink is not None:
+            self.navigationLink.setLinkedXView(viewMin, viewMax)
+            return
+        self.viewMin = viewMin
+        self.viewMax = viewMax
         self.setAxisScale(self.xBottom, self.viewMin, self.viewMax)
         self.replot()
 
@@ -264,16 +497,8 @@ class Chart(QwtPlot):
         to any zoom changes
         """
         print("Resetting the view...")
-        if len(self.times) > 4000:
-            self.zoomFactor = 1
-            self.viewMin = self.absMin
-            self.viewMax = self.times[3999]
-        else:
-            self.viewMin = self.absMin
-            self.viewMax = self.absMax
-
-        self.setAxisScale(self.xBottom, self.viewMin, self.viewMax)
-        self.replot()
+        self.zoomFactor = 1
+        self.setXView(self.absMin, self.absMax)
 
     def changeZoomScalar(self, x: float):
         """Changes the value by which zoomX() zooms in by
@@ -314,16 +539,14 @@ class Chart(QwtPlot):
                 viewMax = self.absMax
                 viewMin -= range_diff
             
-            self.viewMin = viewMin
-            self.viewMax = viewMax
-            self.setAxisScale(self.xBottom, self.viewMin, self.viewMax)
+            self.setXView(viewMin, viewMax)
         elif axis == 1:
             self.yMin = viewMin
             self.yMax = viewMax
             self.setAxisScale(self.yLeft, self.yMin, self.yMax)
+            self.replot()
         else: 
             print("Bruh")
-        self.replot()
 
     def retitle(self, name: str):
         """Changes the title of the chart
@@ -332,74 +555,24 @@ class Chart(QwtPlot):
         self.setTitle(name)
 
     def maxView(self):
-        self.viewMin = self.absMin
-        self.viewMax = self.absMax
-        self.setAxisScale(self.xBottom, self.viewMin, self.viewMax)
-        self.replot()
-
-    def splithelper(self, voltages, times, decimation_list):
-        filtered_values = [[]] * len(decimation_list)
-        filtered_times = [[]] * len(decimation_list)
-
-        for i in range(len(voltages)):
-            for n in range(len(decimation_list)):
-                if i % decimation_list[n] == 0:
-                    filtered_values[n].append(voltages[i])
-                    filtered_times[n].append(times[i])
-
-        return filtered_values, filtered_times
-
-    def point_relative_change_test_func(self):
-        diffs = [0]
-        variances = [0]
-
-        for i in range(1, len(self.voltages)):
-            diff_before = self.voltages[i] - self.voltages[i - 1]
-            variances.append(diff_before**2)
-            diffs.append(diff_before)
-
-        var_avg = sum(variances) / len(variances)
-        assert len(diffs) == len(self.voltages) == len(self.times) == len(variances)
-
-        filtered_data = [self.voltages[0]]
-        filtered_times = [self.times[0]]
-
-        for i in range(1, len(diffs)):
-            if variances[i] > var_avg / 6:
-                filtered_data.append(self.voltages[i])
-                filtered_times.append(self.times[i])
-
-        filtered_data = [x + 30 for x in filtered_data]
-
-        return filtered_data, filtered_times
-
-    def initialize_subgraphs(self):
-        if self.voltages == [] or self.times == []:
-            print("Insufficient data for initialization")
-
-        filter_values = [2, 3, 4]
-        residuals_data, residuals_times = self.point_relative_change_test_func()
-        decimated_vals_lsts, decimated_times_lsts = self.splithelper(
-            self.voltages, self.times, filter_values
-        )
-
-        self.voltageSets = decimated_vals_lsts.append(residuals_data)
-        self.timeSets = decimated_times_lsts.append(residuals_times)
-
-        pass
+        self.setXView(self.absMin, self.absMax)
 
     def clearChart(self):
         """Erase all curves and markers from the chart"""
         self.detachItems(QwtPlotItem.Rtti_PlotCurve)
         self.detachItems(QwtPlotItem.Rtti_PlotMarker)
 
-        self.curve = QwtPlotCurve()
+        self.curve = TiledCurve()
+        self.curve.setTileCache(self.tileCache)
         self.curve.attach(self)
 
         self.times = []
         self.voltages = []
-        self.timeSets = []
-        self.voltageSets = []
+        self.decimation = None
+        self.liveBuffer = None
+        self.history = None
+        self.pendingTimes = []
+        self.pendingVoltages = []
         self.curve.setData(self.times, self.voltages)
         self.xRange = 30
         self.xMin = 0
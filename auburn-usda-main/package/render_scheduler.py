@@ -0,0 +1,100 @@
+import time
+
+from PySide6.QtCore import QObject, Qt, QTimer, Signal, Slot
+from PySide6.QtWidgets import QWidget
+
+DEFAULT_MAX_FPS = 30
+METRICS_INTERVAL = 1  # seconds between metrics updates
+
+
+class RenderScheduler(QObject):
+    """Repaints plots at most maxFps times per second. Instead of replotting
+    for every packet of live data, widgets are marked dirty and all dirty
+    widgets are rendered together on the next frame, so everything that
+    arrived in between is drawn at once. A widget is rendered by calling its
+    renderFrame method if it has one, otherwise its replot method.
+    """
+
+    metricsUpdated = Signal(float, float, int)  # fps, samples per frame, dropped frames
+
+    def __init__(self, maxFps: int = DEFAULT_MAX_FPS, parent=None):
+        super().__init__(parent)
+        self.dirty = {}  # ordered set of widgets to render on the next frame
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.renderFrame)
+        self.setMaxFps(maxFps)
+
+        # Metrics
+        self.frames = 0
+        self.samples = 0
+        self.droppedFrames = 0
+        self.lastFrameTime = None
+        self.metricsStart = time.perf_counter()
+        self.fps = 0.0
+        self.samplesPerFrame = 0.0
+
+    def setMaxFps(self, maxFps: int):
+        """Changes how often dirty widgets are rendered
+        :param maxFps: the most frames rendered per second
+        """
+        self.maxFps = max(int(maxFps), 1)
+        self.timer.setInterval(round(1000 / self.maxFps))
+
+    def markDirty(self, widget: QWidget):
+        """Renders the widget on the next frame
+        :param widget: plot whose contents changed
+        """
+        self.dirty[widget] = None
+        if not self.timer.isActive():
+            self.lastFrameTime = None
+            self.timer.start()
+
+    def addSamples(self, count: int):
+        """Counts samples that will be drawn by the next frame
+        :param count: number of samples received
+        """
+        self.samples += count
+
+    def clear(self):
+        """Forgets every dirty widget without rendering it, for example
+        before the widgets are deleted"""
+        self.dirty = {}
+        self.timer.stop()
+
+    @Slot()
+    def renderFrame(self):
+        """Renders every dirty widget. The timer is stopped once there is
+        nothing left to render and restarted by the next markDirty."""
+        now = time.perf_counter()
+        if not self.dirty:
+            self.timer.stop()
+            self.updateMetrics(now)
+            return
+
+        # Frame intervals that passed without a frame, because the event
+        # loop was busy, are counted as dropped
+        if self.lastFrameTime is not None:
+            missed = int((now - self.lastFrameTime) * self.maxFps + 0.5) - 1
+            self.droppedFrames += max(missed, 0)
+        self.lastFrameTime = now
+
+        dirty, self.dirty = self.dirty, {}
+        for widget in dirty:
+            getattr(widget, "renderFrame", widget.replot)()
+        self.frames += 1
+        self.updateMetrics(now)
+
+    def updateMetrics(self, now: float):
+        """Emits the frame rate, samples per frame and dropped frames once
+        every METRICS_INTERVAL seconds"""
+        elapsed = now - self.metricsStart
+        if elapsed < METRICS_INTERVAL:
+            return
+        self.fps = self.frames / elapsed
+        self.samplesPerFrame = self.samples / self.frames if self.frames else 0.0
+        self.metricsUpdated.emit(self.fps, self.samplesPerFrame, self.droppedFrames)
+        self.frames = 0
+        self.samples = 0
+        self.droppedFrames = 0
+        self.metricsStart = now
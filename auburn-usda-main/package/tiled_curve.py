@@ -0,0 +1,168 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QPainter, QPixmap
+from qwt import QwtPlotCurve, QwtPlotItem
+from qwt.plot_curve import array2d_to_qpolygonf
+
+from package.utils.decimation import DecimationEngine
+
+TILE_WIDTH = 256  # width of each tile in pixels
+TILE_MEMORY_BUDGET = 64 * 2**20  # bytes of tiles kept by a TileCache
+
+
+class TileCache:
+    """Least recently used cache of rendered curve tiles, shared by every
+    chart so that they all stay within one memory budget."""
+
+    def __init__(self, memoryBudget: int = TILE_MEMORY_BUDGET):
+        """
+        :param memoryBudget: bytes of tiles kept before the least recently
+            used ones are dropped
+        """
+        self.memoryBudget = memoryBudget
+        self.tiles = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def tileSize(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def get(self, key: tuple) -> QPixmap | None:
+        """Returns a cached tile and marks it as recently used
+        :param key: key the tile was stored with, starting with its owner
+        """
+        pixmap = self.tiles.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.tiles.move_to_end(key)
+        return pixmap
+
+    def put(self, key: tuple, pixmap: QPixmap):
+        """Stores a tile, dropping the least recently used tiles while the
+        cache is over its memory budget
+        :param key: key of the tile, starting with its owner
+        :param pixmap: rendered tile
+        """
+        if key in self.tiles:
+            self.size -= self.tileSize(self.tiles.pop(key))
+        self.tiles[key] = pixmap
+        self.size += self.tileSize(pixmap)
+        while self.size > self.memoryBudget and len(self.tiles) > 1:
+            _, dropped = self.tiles.popitem(last=False)
+            self.size -= self.tileSize(dropped)
+
+    def discard(self, owner):
+        """Drops every tile of an owner, for example when its data changes"""
+        for key in [key for key in self.tiles if key[0] is owner]:
+            self.size -= self.tileSize(self.tiles.pop(key))
+
+    def clear(self):
+        """Drops every tile"""
+        self.tiles.clear()
+        self.size = 0
+
+
+class TiledCurve(QwtPlotCurve):
+    """Curve that draws imported data from pixmap tiles, each covering
+    TILE_WIDTH pixels of time at the current zoom level. Scrolling only
+    shifts the tiles, so only tiles coming into view are rendered; zooming
+    or resizing the chart renders new tiles. Without a tile cache or a
+    DecimationEngine, such as while recording live, the curve is drawn
+    normally from its points."""
+
+    def __init__(self):
+        super().__init__()
+        self.tileCache = None
+        self.decimation = None
+
+    def setTileCache(self, tileCache: TileCache | None):
+        """Draws the curve from tiles kept in tileCache, or normally if None"""
+        if self.tileCache is not None:
+            self.tileCache.discard(self)
+        self.tileCache = tileCache
+
+    def setDecimation(self, decimation: DecimationEngine | None):
+        """Sets the data tiles are rendered from, dropping the old tiles
+        :param decimation: decimated levels of the curve's whole channel
+        """
+        if self.tileCache is not None:
+            self.tileCache.discard(self)
+        self.decimation = decimation
+
+    def draw(self, painter, xMap, yMap, canvasRect):
+        if (
+            self.tileCache is None
+            or self.decimation is None
+            or self.style() != QwtPlotCurve.Lines
+            or xMap.sDist() <= 0
+            or xMap.pDist() <= 0
+            or yMap.sDist() == 0
+        ):
+            super().draw(painter, xMap, yMap, canvasRect)
+            return
+
+        # Round the time per pixel so that views scrolled by adding the
+        # same step to both ends keep using the same tiles
+        secondsPerPixel = float(f"{xMap.sDist() / xMap.pDist():.9g}")
+        tileSeconds = TILE_WIDTH * secondsPerPixel
+        height = math.ceil(canvasRect.height())
+        ratio = painter.device().devicePixelRatioF()
+        pen = self.pen()
+        zoomKey = (
+            secondsPerPixel,
+            yMap.s1(),
+            yMap.s2(),
+            yMap.p1() - canvasRect.top(),
+            yMap.p2() - canvasRect.top(),
+            height,
+            ratio,
+            pen.color().rgba(),
+            pen.widthF(),
+        )
+
+        first = math.floor(min(xMap.s1(), xMap.s2()) / tileSeconds)
+        last = math.floor(max(xMap.s1(), xMap.s2()) / tileSeconds)
+        for index in range(first, last + 1):
+            key = (self, zoomKey, index)
+            pixmap = self.tileCache.get(key)
+            if pixmap is None:
+                pixmap = self.renderTile(index * tileSeconds, secondsPerPixel, yMap, canvasRect, ratio)
+                self.tileCache.put(key, pixmap)
+            x = round(xMap.transform(index * tileSeconds))
+            painter.drawPixmap(x, round(canvasRect.top()), pixmap)
+
+    def renderTile(self, start: float, secondsPerPixel: float, yMap, canvasRect, ratio: float) -> QPixmap:
+        """Renders the part of the curve from start onwards that covers one tile
+        :param start: time at the left edge of the tile
+        :param secondsPerPixel: time covered by each pixel column
+        :param yMap: map of voltages into canvas coordinates
+        :param canvasRect: contents rectangle of the canvas
+        :param ratio: device pixel ratio of the canvas
+        """
+        height = math.ceil(canvasRect.height())
+        pixmap = QPixmap(round(TILE_WIDTH * ratio), round(height * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+
+        end = start + TILE_WIDTH * secondsPerPixel
+        times, voltages = self.decimation.points(start, end, TILE_WIDTH)
+        if len(times) > 1:
+            xs = (np.asarray(times) - start) / secondsPerPixel
+            yScale = (yMap.p2() - yMap.p1()) / (yMap.s2() - yMap.s1())
+            ys = yMap.p1() - canvasRect.top() + (np.asarray(voltages) - yMap.s1()) * yScale
+            painter = QPainter(pixmap)
+            painter.setPen(self.pen())
+            painter.setRenderHint(
+                QPainter.RenderHint.Antialiasing,
+                self.testRenderHint(QwtPlotItem.RenderAntialiased),
+            )
+            painter.drawPolyline(array2d_to_qpolygonf(xs, ys))
+            painter.end()
+        return pixmap
@@ -0,0 +1,413 @@
+import logging
+import os
+import warnings
+from collections import deque
+
+import numpy as np
+from PySide6.QtCore import QObject, Qt, Signal, Slot
+from PySide6.QtSerialPort import QSerialPort
+
+from package.utils.binary_frames import BINARY_BAUD_RATE, FrameParser
+from package.utils.data_classes import DataArrays, EPGParameters
+from package.utils.enums import FsyncPolicy
+from package.utils.recording_writer import RecordingWriter
+from package.utils.session_file import SESSION_EXTENSION, SessionWriter
+from package.utils.timebase import SampleTimebase
+
+QUEUE_CAPACITY = 1024  # blocks of samples waiting to be drawn
+DATA_LABEL = b"O,"
+
+
+def parseDataLines(lines: bytes) -> tuple[np.ndarray, list[bytes]]:
+    """Parses complete lines of the form 'O, pre-rect voltage, post-rect
+    voltage' all at once. The labels and line breaks are replaced by commas
+    in bulk so that NumPy reads every value in one call, and only blocks
+    with other lines, such as PARAM replies, are split into lines first.
+    :param lines: bytes ending with a line break
+    :returns: pre-rect voltage of every data line, and the other lines
+    """
+    lines = lines.replace(b"\r", b"")
+    lineCount = lines.count(b"\n")
+    otherLines = []
+    if lines.count(b"\n" + DATA_LABEL) + lines.startswith(DATA_LABEL) != lineCount:
+        dataLines = []
+        for line in lines.split(b"\n")[:-1]:
+            (dataLines if line.startswith(DATA_LABEL) else otherLines).append(line)
+        lines = b"\n".join(dataLines) + b"\n" if dataLines else b""
+        lineCount = len(dataLines)
+    if lineCount == 0:
+        return np.empty(0), otherLines
+
+    # Values per line are taken from the first line, and a block that does
+    # not match is parsed line by line instead
+    valueCount = lines[: lines.find(b"\n")].count(b",")
+    text = lines[len(DATA_LABEL) : -1].replace(b"\n" + DATA_LABEL, b",")
+    with warnings.catch_warnings():
+        # Raised by NumPy when a value cannot be read
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(text.decode("ascii", "replace"), sep=",")
+        except (DeprecationWarning, ValueError):
+            values = np.empty(0)
+    if valueCount > 0 and len(values) == lineCount * valueCount:
+        return values[::valueCount], otherLines
+
+    voltages = []
+    for line in lines.split(b"\n")[:-1]:
+        try:
+            voltages.append(float(line.split(b",")[1]))
+        except (IndexError, ValueError):
+            otherLines.append(line)
+    return np.array(voltages, dtype=np.float64), otherLines
+
+
+class SampleQueue:
+    """Bounded queue of sample blocks handed from the acquisition thread to
+    the GUI thread. There is one producer and one consumer, and deque
+    appends and pops are atomic, so neither side ever takes a lock or waits
+    for the other. When the GUI falls so far behind that the queue is full,
+    the oldest block is dropped and counted as an overflow. Dropped blocks
+    are only missing from the live chart: they were already written to the
+    recording file by the acquisition thread.
+    """
+
+    def __init__(self, capacity: int = QUEUE_CAPACITY):
+        """
+        :param capacity: most blocks kept before the oldest is dropped
+        """
+        self.capacity = capacity
+        self.blocks = deque()
+        self.overflows = 0
+        self.maxDepth = 0
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def put(self, block: list):
+        """Adds a block, dropping the oldest one if the queue is full.
+        Only called by the producer.
+        """
+        if len(self.blocks) >= self.capacity:
+            try:
+                self.blocks.popleft()
+                self.overflows += 1
+            except IndexError:
+                # The consumer emptied the queue in the meantime
+                pass
+        self.blocks.append(block)
+        self.maxDepth = max(self.maxDepth, len(self.blocks))
+
+    def drain(self) -> list:
+        """Takes every block in the queue, oldest first. Only called by
+        the consumer.
+        :returns: list of blocks
+        """
+        blocks = []
+        try:
+            for _ in range(len(self.blocks)):
+                blocks.append(self.blocks.popleft())
+        except IndexError:
+            pass
+        return blocks
+
+    def takeMaxDepth(self) -> int:
+        """Returns the most blocks that were waiting at once since the last
+        call, and starts measuring again from the current depth"""
+        maxDepth = self.maxDepth
+        self.maxDepth = len(self.blocks)
+        return maxDepth
+
+
+class AcquisitionWorker(QObject):
+    """Owns the serial port and the recording file, and lives on its own
+    thread. Each time the port has data, the complete lines are parsed,
+    handed to a RecordingWriter, and put in a SampleQueue as one block, without
+    waiting for the GUI thread, so slow repaints or modal dialogs cannot
+    hold up serial reads.
+
+    Slots are meant to be called through signals from the GUI thread, see
+    SerialData.
+    """
+
+    ready = Signal()
+
+    def __init__(self, queue: SampleQueue):
+        super().__init__()
+        self.queue = queue
+        self.serial = None
+        self.writer = None
+        self.started = 0
+        self.totalTimePaused = 0
+        self.elapsedTime = 0  # in seconds
+        self.sampleRate = 100  # samples per second, Hz
+        self.epgParameters = None  # EPG settings stored with the session file
+        # Whether to ask the EPG for binary frames, and the parser of the
+        # frames once it agrees to
+        self.binaryFraming = False
+        self.frameParser = None
+        self.timebase = None  # times samples from their index in the recording
+        self.lineCarry = b""  # start of a line whose end has not arrived yet
+
+    """
+    Serial port-related functions
+    """
+
+    @Slot(str, int, bool)
+    def setUpSerial(self, portName: str, sampleRate: int, binaryFraming: bool):
+        """Opens the port of the EPG monitor and starts the INIT, BEGIN and
+        PARAM handshake
+        :param portName: name of the serial port of the EPG monitor
+        :param sampleRate: samples per second requested from the EPG
+        :param binaryFraming: whether to ask the EPG to send binary frames
+        """
+        self.sampleRate = sampleRate
+        self.binaryFraming = binaryFraming
+        self.frameParser = None
+        # Created here so that the port belongs to the acquisition thread
+        self.serial = QSerialPort()
+        self.serial.setPortName(portName)
+        self.serial.setBaudRate(
+            QSerialPort.BaudRate.Baud9600, QSerialPort.Direction.Input
+        )
+
+        # Wait for EPG to be ready before streaming data
+        if (not self.serial.open(QSerialPort.OpenModeFlag.ReadWrite)):
+                print("Unable to open serial port")
+                logging.error("Unable to open serial port.")
+                return
+
+        # Wait for response from EPG
+        self.serial.readyRead.connect(lambda message = "INIT":self.waitForMessageFromEPG(message), Qt.ConnectionType.UniqueConnection)
+
+        # To test without dealing with EPG setup, comment out everything after
+        # the line that says wait for EPG to be ready before streaming data.
+        # Also upload code in resources/teensy_code/noInitialization to Teensy
+
+        self.ready.emit()
+        self.serial.readyRead.connect(self.readData)
+
+    @Slot(str)
+    def waitForMessageFromEPG(self, message: str):
+        """Waits until serial data matching specific message can be read.
+        param message: message that should be waited for before proceeding
+        to next step of initialization
+
+        :param message: message that should be waited for
+        """
+        while self.serial.canReadLine():
+            data = str(self.serial.readLine().data(), "utf-8").strip()
+            label = data.split(",")[0]
+            if label != message:
+                return
+
+            match label:
+                case "INIT":
+                    logging.info("INIT message received  - teensy initialization is complete.")
+                    logging.info("Sending BEGIN message...")
+                    self.serial.readyRead.disconnect()
+                    self.serial.readyRead.connect(
+                        lambda message="BEGIN": self.waitForMessageFromEPG(message)
+                    )
+                    self.serial.flush()
+                    self.serial.readAll()
+                    begin = f"BEGIN,{self.sampleRate}"
+                    if self.binaryFraming:
+                        begin += ",BINARY"
+                    self.serial.write(bytes(f"{begin}\n".encode()))
+                    break
+                case "BEGIN":
+                    logging.info("BEGIN message received - teensy is ready to read parameters.")
+                    # An EPG that can send binary frames says so in its reply
+                    self.binaryFraming = self.binaryFraming and "BINARY" in data.split(",")
+                    logging.info("Data will be sent in " + ("binary frames." if self.binaryFraming else "ASCII lines."))
+                    logging.info("Sending default parameters, Ri = 100000, Gain = 0, Bias = 0, Freq = 100, Amp = 0.")
+                    self.serial.readyRead.disconnect()
+                    self.serial.readyRead.connect(
+                        lambda message="PARAM": self.waitForMessageFromEPG(message)
+                    )
+                    # PARAM, channel #, input resistance, amplifier gain, DC bias, excitation frequency, excitation amplitude
+                    self.serial.write(bytes("PARAM,1,100000,0,1,1000,0\n".encode()))
+                    break
+                case "PARAM":
+                    logging.info("Default parameter values are set, ready to record.")
+                    self.serial.readyRead.disconnect()
+                    self.serial.readyRead.connect(
+                        self.readData, Qt.ConnectionType.UniqueConnection
+                    )
+                    self.serial.close()
+                    if self.binaryFraming:
+                        self.serial.setBaudRate(BINARY_BAUD_RATE)
+                        self.frameParser = FrameParser()
+                    self.ready.emit()
+                    break
+
+    @Slot(float, float)
+    def startReadingData(self, started: float, totalTimePaused: float):
+        """Opens the serial port if needed so that data is read when available
+        :param started: time the recording started at, according to the Unix epoch
+        :param totalTimePaused: seconds of pauses removed from the recording
+        """
+        self.started = started
+        self.totalTimePaused = totalTimePaused
+        self.timebase = SampleTimebase(self.sampleRate, started)
+        self.lineCarry = b""
+        if self.serial is not None and not self.serial.isOpen():
+            if not self.serial.open(QSerialPort.OpenModeFlag.ReadWrite):
+                logging.error("Unable to open serial port.")
+
+    @Slot(float)
+    def discardPause(self, totalTimePaused: float):
+        """Marks the paused portion of the recording as not saved, and from
+        the next sample on removes it from sample times
+        :param totalTimePaused: seconds of pauses removed from the recording
+        """
+        self.writeEvent("SAVE,F")
+        self.totalTimePaused = totalTimePaused
+
+    @Slot()
+    def readData(self):
+        """Given output in the form of 'O, pre-rect voltage, post-rect voltage',
+        saves every complete line to file and queues the samples for display
+        as one block. Everything available is read at once, and a partial
+        last line is kept until the rest of it arrives.
+        """
+        if self.frameParser is not None:
+            self.readFrames()
+            return
+        received = self.lineCarry + self.serial.readAll().data()
+        end = received.rfind(b"\n") + 1
+        self.lineCarry = received[end:]
+        if end == 0:
+            return
+
+        voltages, otherLines = parseDataLines(received[:end])
+        for line in otherLines:
+            line = str(line, "utf-8", "replace").strip()
+            if line.startswith("PARAM"): # The Teensy writes back if it reads a parameter change request
+                logging.info("Change in parameters registered by Teensy, " + line)
+            elif line:
+                print("Error in parsing")
+                logging.error("Unable to parse the received data, " + line)
+        if len(voltages) == 0:
+            return
+
+        # Lines are numbered in the order they arrive
+        self.queueSamples(self.sampleTimes(count=len(voltages)), voltages)
+
+    def readFrames(self):
+        """Decodes the binary frames read so far, saves their samples to file
+        and queues them for display as one block. Sample times follow from
+        the sample counter of the frames, so samples lost between frames
+        leave a gap.
+        """
+        indices, samples = self.frameParser.feed(self.serial.readAll().data())
+        if len(indices) == 0:
+            return
+        # Only the pre-rect voltage is kept, as with ASCII lines
+        self.queueSamples(self.sampleTimes(indices=indices), samples[:, 0])
+
+    def sampleTimes(self, count: int = 0, indices: np.ndarray = None) -> np.ndarray:
+        """Times a block of samples with the timebase of the recording, less
+        the pauses removed from it
+        :param count: number of samples, when the EPG does not number them
+        :param indices: sample counter of each sample
+        :returns: sample times in seconds, rounded as they are saved
+        """
+        if self.timebase is None:
+            # Samples read before the recording started
+            self.timebase = SampleTimebase(self.sampleRate, self.started)
+        times = self.timebase.blockTimes(count, indices)
+        return np.round(times - self.totalTimePaused, 4)
+
+    def queueSamples(self, times: np.ndarray, voltages: np.ndarray):
+        """Hands a block of samples to the recording writer and queues it for
+        display
+        :param times: sample times in seconds
+        :param voltages: sample voltages
+        """
+        channel = 0 # Placeholder value
+        block = DataArrays(times, voltages, np.full(len(times), channel, dtype=np.int64))
+        self.elapsedTime = float(times[-1])
+        if self.writer is not None:
+            self.writer.append(block)
+        self.queue.put(block)
+
+    @Slot(str)
+    def sendParam(self, param: str):
+        """Writes parameters to the serial port to update configurations on
+        the hardware side
+        :param param: string representing parameters to change
+        """
+        isOpen = self.serial.isOpen()
+        if not isOpen:
+            if not self.serial.open(QSerialPort.OpenModeFlag.ReadWrite):
+                print("Couldn't open port")
+                logging.error("Serial port is not open, unable to send to parameters.")
+                #TODO: report attempted values, and the original value
+                return
+        self.serial.write(bytes(param.encode()))
+        if not isOpen:
+            self.serial.close()
+
+    @Slot()
+    def stopReadingData(self):
+        """Closes the serial port, after which no more samples are read"""
+        if self.serial is not None:
+            # Keep the lines that already arrived
+            self.readData()
+            self.serial.close()
+        if self.timebase is not None:
+            self.timebase.logStatistics()
+        if self.frameParser is not None:
+            logging.info(
+                f"Binary frames: {self.frameParser.crcErrors} crc errors, "
+                f"{self.frameParser.lostSamples} samples lost, {self.frameParser.skippedBytes} bytes skipped."
+            )
+
+    """
+    File operations
+    """
+
+    @Slot(str, int)
+    def createFile(self, name: str, fsyncPolicy: int):
+        """Creates a new csv file where data is stored, and the session file
+        of the processed recording next to it
+        :param fsyncPolicy: value of the FsyncPolicy of the file
+        """
+        session = SessionWriter(
+            os.path.splitext(name)[0] + "_processed" + SESSION_EXTENSION,
+            self.sampleRate,
+            self.epgParameters,
+        )
+        self.writer = RecordingWriter(name, FsyncPolicy(fsyncPolicy), session=session)
+
+    @Slot(object)
+    def setEpgParameters(self, epgParameters: EPGParameters):
+        """:param epgParameters: EPG settings the recording is made with"""
+        self.epgParameters = epgParameters
+        if self.writer is not None:
+            self.writer.session.epgParameters = epgParameters
+
+    @Slot(str)
+    def writeEvent(self, event: str):
+        """Writes a row that is not a sample, stamped with the elapsed time
+        of the last sample
+        :param event: label of the row followed by its values, comma separated
+        """
+        self.writer.writeEvent(f"{self.elapsedTime:.4f},{event}\n")
+
+    @Slot()
+    def saveFile(self):
+        """Saves data by writing out every sample so far"""
+        self.writer.flush()
+
+    @Slot()
+    def closeFile(self):
+        """Closes current file that EPG data is saved to, once every sample
+        has been written"""
+        self.writer.close()
+        self.writer = None
+        self.timebase = None
+        self.elapsedTime = 0
+        self.started = 0
+        self.totalTimePaused = 0
@@ -0,0 +1,157 @@
+import binascii
+import struct
+
+import numpy as np
+
+"""
+Binary framing of samples streamed by the EPG, used instead of ASCII lines
+when both sides agree to it during the handshake (BEGIN,<rate>,BINARY).
+
+Every frame holds FRAME_SAMPLES samples and is laid out little-endian as
+    sync word      2 bytes   0xA5 0x5A
+    format         1 byte    SAMPLE_INT16 or SAMPLE_FLOAT32
+    values         1 byte    values per sample, 2 for pre and post-rect
+    count          2 bytes   samples in the frame
+    counter        4 bytes   index of the first sample since streaming began
+    samples        count * values * 2 or 4 bytes
+    crc            2 bytes   CRC-16/CCITT-FALSE of format to last sample
+"""
+
+SYNC_WORD = b"\xa5\x5a"
+SAMPLE_INT16 = 0
+SAMPLE_FLOAT32 = 1
+SAMPLE_DTYPES = {SAMPLE_INT16: np.dtype("<i2"), SAMPLE_FLOAT32: np.dtype("<f4")}
+FRAME_SAMPLES = 64  # samples per frame sent by the EPG
+FRAME_VALUES = 2  # values per sample sent by the EPG
+BINARY_BAUD_RATE = 921600  # baud rate of the port once binary framing is agreed on
+
+HEADER = struct.Struct("<2sBBHI")
+CRC = struct.Struct("<H")
+CRC_SEED = 0xFFFF
+
+
+def frameSize(sampleFormat: int, values: int, count: int) -> int:
+    """Number of bytes of a frame, from sync word to crc"""
+    return HEADER.size + count * values * SAMPLE_DTYPES[sampleFormat].itemsize + CRC.size
+
+
+def encodeFrame(counter: int, samples: np.ndarray, sampleFormat: int = SAMPLE_INT16) -> bytes:
+    """Packs samples into a frame, as the EPG does
+    :param counter: index of the first sample
+    :param samples: array of shape (count, values)
+    :param sampleFormat: SAMPLE_INT16 or SAMPLE_FLOAT32
+    :returns: bytes of the frame
+    """
+    samples = np.asarray(samples).reshape(len(samples), -1)
+    body = HEADER.pack(SYNC_WORD, sampleFormat, samples.shape[1], len(samples), counter & 0xFFFFFFFF)
+    body += samples.astype(SAMPLE_DTYPES[sampleFormat]).tobytes()
+    return body + CRC.pack(binascii.crc_hqx(body[len(SYNC_WORD) :], CRC_SEED))
+
+
+class FrameParser:
+    """Decodes the frames of a binary stream from bytes read in any sizes.
+    Consecutive frames of the same layout are decoded together as one 2D
+    array instead of one at a time. Only frames of the layout agreed on
+    with the EPG are decoded, so a sync word whose header does not match it
+    is skipped at once instead of waiting for a frame of whatever size the
+    header claims. Bytes that do not start a valid frame are skipped until
+    the next sync word, and frames that fail their crc are dropped. Bytes
+    after the last complete frame are kept for the next call.
+    """
+
+    def __init__(self, count: int = FRAME_SAMPLES, values: int = FRAME_VALUES):
+        """
+        :param count: samples per frame
+        :param values: values per sample
+        """
+        self.count = count
+        self.values = values
+        self.carry = b""
+        self.crcErrors = 0
+        self.skippedBytes = 0
+        self.lostSamples = 0  # gaps in the sample counter
+        self.nextCounter = None
+
+    def feed(self, data: bytes) -> tuple[np.ndarray, np.ndarray]:
+        """Decodes the complete frames of the bytes read so far
+        :param data: bytes read from the serial port
+        :returns: sample indices and an array of shape (samples, values)
+            with their values
+        """
+        buffer = self.carry + data
+        indices = []
+        samples = []
+        position = 0
+        decodedBytes = 0
+        while True:
+            found = buffer.find(SYNC_WORD, position)
+            if found < 0:
+                # Keep a last byte that may be the start of a sync word
+                position = max(len(buffer) - 1, position)
+                break
+            position = found
+            if len(buffer) - position < HEADER.size:
+                break
+            _, sampleFormat, values, count, _ = HEADER.unpack_from(buffer, position)
+            if sampleFormat not in SAMPLE_DTYPES or values != self.values or count != self.count:
+                position += 1
+                continue
+            size = frameSize(sampleFormat, values, count)
+            if len(buffer) - position < size:
+                break
+
+            # Every following frame of the same layout is decoded at once
+            frames = (len(buffer) - position) // size
+            rows = np.frombuffer(buffer, np.uint8, frames * size, position).reshape(frames, size)
+            same = (
+                (rows[:, 0] == SYNC_WORD[0])
+                & (rows[:, 1] == SYNC_WORD[1])
+                & (rows[:, 2] == sampleFormat)
+                & (rows[:, 3] == values)
+                & (rows[:, 4:6].copy().view("<u2")[:, 0] == count)
+            )
+            frames = int(np.argmin(same)) if not same.all() else frames
+            rows = rows[:frames]
+            valid = np.fromiter(
+                (
+                    binascii.crc_hqx(row[2:-2].tobytes(), CRC_SEED) == int(row[-2]) | int(row[-1]) << 8
+                    for row in rows
+                ),
+                dtype=bool,
+                count=frames,
+            )
+            if not valid[0]:
+                # Not a frame after all, or a corrupted one: look for the
+                # next sync word inside it
+                self.crcErrors += 1
+                position += 1
+                continue
+            # Stop before the first corrupted frame so it is resynchronized
+            frames = int(np.argmin(valid)) if not valid.all() else frames
+            rows = rows[:frames]
+            counters = rows[:, 6:10].copy().view("<u4")[:, 0].astype(np.int64)
+            indices.append((counters[:, None] + np.arange(count)).ravel())
+            samples.append(
+                rows[:, HEADER.size : size - CRC.size]
+                .copy()
+                .view(SAMPLE_DTYPES[sampleFormat])
+                .reshape(frames * count, values)
+            )
+            position += frames * size
+            decodedBytes += frames * size
+
+        self.skippedBytes += position - decodedBytes
+        self.carry = buffer[position:]
+        if not indices:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.values), dtype=np.float64)
+        indices = np.concatenate(indices)
+        self.countLost(indices)
+        return indices, np.concatenate(samples).astype(np.float64)
+
+    def countLost(self, indices: np.ndarray):
+        """Counts samples missing between and within the decoded frames"""
+        if self.nextCounter is not None and len(indices):
+            self.lostSamples += max(int(indices[0]) - self.nextCounter, 0)
+        gaps = np.diff(indices)
+        self.lostSamples += int(np.sum(gaps[gaps > 1] - 1))
+        self.nextCounter = int(indices[-1]) + 1
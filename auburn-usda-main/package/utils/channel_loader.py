@@ -0,0 +1,101 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from package.utils.chunked_store import ChunkedStore
+from package.utils.data_classes import DataArrays
+from package.utils.file_cache import readPyramid
+from package.utils.min_max_pyramid import MinMaxPyramid
+from package.utils.session_file import Session
+
+CHANNEL_MEMORY_BUDGET = 1 * 2**30  # bytes of loaded samples before hidden channels are unloaded
+
+
+class ChannelLoader:
+    """Loads the channels of a session file or compressed recording into
+    memory one at a time. The file's index of where each channel's samples
+    are means a channel is only read when its chart needs it. Once the
+    loaded channels take up more than the memory budget, the least recently
+    used channels that are not being shown are unloaded.
+    """
+
+    def __init__(
+        self,
+        source: Session | ChunkedStore,
+        memoryBudget: int = CHANNEL_MEMORY_BUDGET,
+        timeRange: tuple[float, float] = None,
+    ):
+        """
+        :param source: file to load channels from
+        :param memoryBudget: bytes of loaded samples to allow
+        :param timeRange: start and end time in seconds to load, or None to
+            load whole channels
+        """
+        self.source = source
+        self.memoryBudget = memoryBudget
+        self.timeRange = timeRange
+        self.loaded = OrderedDict()  # channel -> DataArrays, least recently used first
+
+    def close(self):
+        """Closes the source file. Channels that are loaded stay loaded."""
+        self.source.close()
+
+    def isLoaded(self, channel: int) -> bool:
+        return channel in self.loaded
+
+    def loadedSize(self) -> int:
+        """Bytes taken up by all loaded channels"""
+        return sum(_dataSize(data) for data in self.loaded.values())
+
+    def load(self, channel: int) -> DataArrays:
+        """Reads the samples of a channel into memory
+        :param channel: channel number as listed in the source
+        :returns: samples of the channel
+        """
+        if channel in self.loaded:
+            self.loaded.move_to_end(channel)
+            return self.loaded[channel]
+        if self.timeRange is None:
+            stored = self.source.channelData(channel)
+        else:
+            stored = self.source.readRange(channel, *self.timeRange)
+        data = DataArrays(
+            times=np.array(stored.times),
+            voltages=np.array(stored.voltages),
+            channels=stored.channels,
+        )
+        self.loaded[channel] = data
+        return data
+
+    def pyramid(self, channel: int) -> MinMaxPyramid | None:
+        """Min/max levels stored with a loaded channel, e.g. by the file
+        cache, or None if there are none"""
+        if self.timeRange is not None or not isinstance(self.source, Session):
+            return None
+        return readPyramid(self.source, channel, self.loaded[channel])
+
+    def unload(self, channel: int):
+        """Drops the samples of a channel from memory"""
+        self.loaded.pop(channel, None)
+
+    def unloadExcess(self, shownChannels: list[int]) -> list[int]:
+        """Unloads channels that are not shown until the loaded channels fit
+        the memory budget
+        :param shownChannels: channels that must stay loaded
+        :returns: channels that were unloaded
+        """
+        unloaded = []
+        size = self.loadedSize()
+        for channel in list(self.loaded):
+            if size <= self.memoryBudget:
+                break
+            if channel in shownChannels:
+                continue
+            size -= _dataSize(self.loaded[channel])
+            self.unload(channel)
+            unloaded.append(channel)
+        return unloaded
+
+
+def _dataSize(data: DataArrays) -> int:
+    return data.times.nbytes + data.voltages.nbytes
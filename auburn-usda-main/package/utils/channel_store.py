@@ -0,0 +1,77 @@
+import numpy as np
+
+from package.utils.data_classes import DataArrays
+
+
+class ChannelStore:
+    """Growable storage for the samples of one channel. Samples are kept in
+    preallocated arrays that grow geometrically, so appending a chunk only
+    copies the chunk itself.
+    """
+
+    growthFactor = 1.5
+
+    def __init__(self, channel: int, capacity: int = 0):
+        self.channel = channel
+        self.size = 0
+        self.voltageMin = np.inf
+        self.voltageMax = -np.inf
+        self._times = np.empty(capacity, dtype=np.float64)
+        self._voltages = np.empty(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[: self.size]
+
+    @property
+    def voltages(self) -> np.ndarray:
+        return self._voltages[: self.size]
+
+    def reserve(self, capacity: int):
+        """Makes room for at least capacity samples
+        :param capacity: total number of samples the store should hold
+        """
+        if capacity <= len(self._times):
+            return
+        for name in ("_times", "_voltages"):
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, grown)
+
+    def append(self, times: np.ndarray, voltages: np.ndarray):
+        """Appends samples to the end of the store
+        :param times: sample times in seconds
+        :param voltages: sample voltages
+        """
+        end = self.size + len(times)
+        if end > len(self._times):
+            self.reserve(max(end, int(len(self._times) * self.growthFactor)))
+        self._times[self.size : end] = times
+        self._voltages[self.size : end] = voltages
+        self.size = end
+        if len(voltages):
+            self.voltageMin = min(self.voltageMin, float(voltages.min()))
+            self.voltageMax = max(self.voltageMax, float(voltages.max()))
+
+    def truncate(self, size: int):
+        """Drops every sample after the first size samples
+        :param size: number of samples to keep
+        """
+        self.size = min(size, self.size)
+        if self.size:
+            self.voltageMin = float(self.voltages.min())
+            self.voltageMax = float(self.voltages.max())
+        else:
+            self.voltageMin = np.inf
+            self.voltageMax = -np.inf
+
+    def data(self) -> DataArrays:
+        """Returns views of the stored samples"""
+        return DataArrays(
+            times=self.times,
+            voltages=self.voltages,
+            channels=np.broadcast_to(np.int64(self.channel), (self.size,)),
+        )
@@ -0,0 +1,297 @@
+"""Compressed chunked recordings (.epgz)
+
+Samples of each channel are split into chunks of a fixed number of samples,
+and every chunk is compressed on its own. The JSON header at the end of the
+file indexes the chunks of each channel by time range and byte range, so a
+time window of one channel can be read by decompressing only the chunks
+that overlap it. This suits archives on slow disks, where reading whole
+recordings is the bottleneck.
+
+The file starts with a fixed preamble (magic, format version, and the
+offset and length of the header).
+"""
+
+import dataclasses
+import json
+import lzma
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from package.utils.data_classes import DataArrays, EPGParameters
+from package.utils.demux import demultiplex
+from package.utils.file_reader import anaReadArrays, csvReadArrays
+from package.utils.session_file import estimateSampleRate
+
+CHUNKED_EXTENSION = ".epgz"
+CHUNKED_MAGIC = b"EPGCHNK\x00"
+CHUNKED_VERSION = 1
+PREAMBLE = struct.Struct("<8sIQQ")  # magic, version, header offset, header length
+CHUNK_SAMPLES = 65536  # samples per channel in each compressed chunk
+SAMPLE_DTYPE = np.dtype("<f8")
+COMPRESSORS = {
+    "zlib": (lambda raw: zlib.compress(raw, 6), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def _packChunk(times: np.ndarray, voltages: np.ndarray, compression: str) -> bytes:
+    """Compresses the samples of a chunk. Bytes are grouped by their
+    position within each float first, which compresses much better."""
+    values = np.concatenate(
+        [np.asarray(times, dtype=SAMPLE_DTYPE), np.asarray(voltages, dtype=SAMPLE_DTYPE)]
+    )
+    shuffled = values.view(np.uint8).reshape(-1, SAMPLE_DTYPE.itemsize).T.tobytes()
+    return COMPRESSORS[compression][0](shuffled)
+
+
+def _unpackChunk(packed: bytes, count: int, compression: str) -> tuple[np.ndarray, np.ndarray]:
+    """Reverses _packChunk
+    :returns: times and voltages of the chunk
+    """
+    shuffled = np.frombuffer(COMPRESSORS[compression][1](packed), dtype=np.uint8)
+    values = shuffled.reshape(SAMPLE_DTYPE.itemsize, -1).T.copy().view(SAMPLE_DTYPE).ravel()
+    return values[:count], values[count:]
+
+
+class ChunkedStore:
+    """Compressed chunked recording opened for reading"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.file = open(filepath, "rb")
+        magic, version, headerOffset, headerLength = PREAMBLE.unpack(self.file.read(PREAMBLE.size))
+        if magic != CHUNKED_MAGIC:
+            self.file.close()
+            raise ValueError(f"{filepath} is not a compressed EPG recording")
+        if version > CHUNKED_VERSION:
+            self.file.close()
+            raise ValueError(
+                f"{filepath} uses chunked format {version}, only up to {CHUNKED_VERSION} is supported"
+            )
+        self.file.seek(headerOffset)
+        self.header = json.loads(self.file.read(headerLength))
+        # Bytes of the file read so far, including the preamble and header
+        self.bytesRead = PREAMBLE.size + headerLength
+
+        self.sampleRate = self.header["sampleRate"]
+        self.channels = self.header["channels"]
+        self.events = self.header["events"]
+        self.compression = self.header["compression"]
+        parameters = self.header["epgParameters"]
+        self.epgParameters = EPGParameters(**parameters) if parameters else None
+        # channel -> columns of start time, end time, count, offset, length
+        self.index = {
+            int(channel): np.array(chunks, dtype=np.float64).reshape(-1, 5)
+            for channel, chunks in self.header["chunks"].items()
+        }
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def timeRange(self, channel: int) -> tuple[float, float]:
+        """First and last sample time of a channel"""
+        chunks = self.index[channel]
+        if len(chunks) == 0:
+            return 0, 0
+        return float(chunks[0, 0]), float(chunks[-1, 1])
+
+    def readRange(self, channel: int, start: float, end: float) -> DataArrays:
+        """Reads the samples of a channel within a time range, decompressing
+        only the chunks that overlap it
+        :param channel: channel number as listed in channels
+        :param start: first time to include in seconds
+        :param end: last time to include in seconds
+        :returns: samples with start <= time <= end
+        """
+        chunks = self.index[channel]
+        first = np.searchsorted(chunks[:, 1], start, side="left")
+        last = np.searchsorted(chunks[:, 0], end, side="right")
+        times, voltages = self._readChunks(chunks[first:last])
+        low = np.searchsorted(times, start, side="left")
+        high = np.searchsorted(times, end, side="right")
+        return DataArrays(
+            times=times[low:high],
+            voltages=voltages[low:high],
+            channels=np.broadcast_to(np.int64(channel), (high - low,)),
+        )
+
+    def channelData(self, channel: int) -> DataArrays:
+        """Reads all samples of a channel
+        :param channel: channel number as listed in channels
+        """
+        times, voltages = self._readChunks(self.index[channel])
+        return DataArrays(
+            times=times,
+            voltages=voltages,
+            channels=np.broadcast_to(np.int64(channel), times.shape),
+        )
+
+    def _readChunks(self, chunks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        times = []
+        voltages = []
+        for _, _, count, offset, length in chunks.astype(np.int64).tolist():
+            self.file.seek(offset)
+            packed = self.file.read(length)
+            self.bytesRead += length
+            chunkTimes, chunkVoltages = _unpackChunk(packed, count, self.compression)
+            times.append(chunkTimes)
+            voltages.append(chunkVoltages)
+        if not times:
+            return np.empty(0, dtype=SAMPLE_DTYPE), np.empty(0, dtype=SAMPLE_DTYPE)
+        return np.concatenate(times), np.concatenate(voltages)
+
+
+def readChunked(filepath: str) -> ChunkedStore:
+    """Opens a compressed chunked recording for reading
+    :param filepath: path of the .epgz file
+    """
+    return ChunkedStore(filepath)
+
+
+class ChunkedWriter:
+    """Writes a compressed chunked recording. Samples are buffered per
+    channel and written out a chunk at a time."""
+
+    def __init__(
+        self,
+        filepath: str,
+        sampleRate: float = 0,
+        epgParameters: EPGParameters = None,
+        compression: str = "zlib",
+        chunkSamples: int = CHUNK_SAMPLES,
+    ):
+        if compression not in COMPRESSORS:
+            raise ValueError(f"Unknown compression {compression}")
+        self.filepath = filepath
+        self.sampleRate = sampleRate
+        self.epgParameters = epgParameters
+        self.compression = compression
+        self.chunkSamples = chunkSamples
+        self.channels = []
+        self.events = []
+        self.chunks = {}  # channel -> [start time, end time, count, offset, length]
+        self.pending = {}  # channel -> ([times], [voltages]) not yet written
+        self.tempPath = filepath + ".tmp"
+        self.file = open(self.tempPath, "wb")
+        self.file.write(b"\x00" * PREAMBLE.size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.discard()
+
+    def append(self, data: DataArrays):
+        """Appends samples, which may belong to several channels
+        :param data: samples to append, in time order per channel
+        """
+        for channel, subset in zip(*demultiplex(data)):
+            self.appendChannel(channel, subset.times, subset.voltages)
+
+    def appendChannel(self, channel: int, times: np.ndarray, voltages: np.ndarray):
+        """Appends samples that all belong to one channel
+        :param channel: channel number
+        :param times: sample times in seconds, in increasing order
+        :param voltages: sample voltages
+        """
+        if channel not in self.channels:
+            self.channels.append(channel)
+            self.chunks[channel] = []
+            self.pending[channel] = ([], [])
+        pendingTimes, pendingVoltages = self.pending[channel]
+        pendingTimes.append(np.asarray(times, dtype=SAMPLE_DTYPE))
+        pendingVoltages.append(np.asarray(voltages, dtype=SAMPLE_DTYPE))
+        if sum(len(values) for values in pendingTimes) >= self.chunkSamples:
+            self._flush(channel, final=False)
+
+    def _flush(self, channel: int, final: bool):
+        """Writes the buffered samples of a channel as full chunks, and the
+        remainder too if final"""
+        pendingTimes, pendingVoltages = self.pending[channel]
+        times = np.concatenate(pendingTimes) if pendingTimes else np.empty(0)
+        voltages = np.concatenate(pendingVoltages) if pendingVoltages else np.empty(0)
+        written = 0
+        while len(times) - written >= self.chunkSamples or (final and written < len(times)):
+            count = min(self.chunkSamples, len(times) - written)
+            chunkTimes = times[written : written + count]
+            packed = _packChunk(chunkTimes, voltages[written : written + count], self.compression)
+            self.chunks[channel].append(
+                [float(chunkTimes[0]), float(chunkTimes[-1]), count, self.file.tell(), len(packed)]
+            )
+            self.file.write(packed)
+            written += count
+        self.pending[channel] = ([times[written:]], [voltages[written:]])
+
+    def addEvent(self, eventType: str, time: float, **values):
+        """Records an event such as a pause or resume in the header
+        :param eventType: kind of event, e.g. PAUSE or RESUME
+        :param time: recording time of the event in seconds
+        :param values: any extra JSON-serializable values of the event
+        """
+        self.events.append({"type": eventType, "time": time, **values})
+
+    def close(self):
+        """Writes the remaining samples and the header"""
+        for channel in self.channels:
+            self._flush(channel, final=True)
+        header = json.dumps(
+            {
+                "sampleRate": self.sampleRate,
+                "channels": self.channels,
+                "epgParameters": dataclasses.asdict(self.epgParameters) if self.epgParameters else None,
+                "events": self.events,
+                "compression": self.compression,
+                "chunks": {str(channel): chunks for channel, chunks in self.chunks.items()},
+            }
+        ).encode()
+        headerOffset = self.file.tell()
+        self.file.write(header)
+        self.file.seek(0)
+        self.file.write(PREAMBLE.pack(CHUNKED_MAGIC, CHUNKED_VERSION, headerOffset, len(header)))
+        self.file.close()
+        os.replace(self.tempPath, self.filepath)
+
+    def discard(self):
+        """Removes the partially written file"""
+        self.file.close()
+        os.remove(self.tempPath)
+
+
+def convertToChunked(sourcePath: str, destPath: str = None, compression: str = "zlib") -> str:
+    """Converts a .csv or .ana recording into a compressed chunked recording
+    :param sourcePath: recording to convert
+    :param destPath: file to write, defaults to the source path with the
+        .epgz extension
+    :param compression: zlib or lzma
+    :returns: path of the written file
+    """
+    root, fileType = os.path.splitext(sourcePath)
+    if destPath is None:
+        destPath = root + CHUNKED_EXTENSION
+    match fileType.lower():
+        case ".ana":
+            data = anaReadArrays(sourcePath)
+        case ".csv":
+            data = csvReadArrays(sourcePath)
+        case _:
+            raise ValueError(f"Cannot convert {fileType} files to compressed recordings")
+
+    with ChunkedWriter(destPath, compression=compression) as writer:
+        channels, channelData = demultiplex(data)
+        for channel, subset in zip(channels, channelData):
+            writer.appendChannel(channel, subset.times, subset.voltages)
+        if channelData:
+            writer.sampleRate = estimateSampleRate(channelData[0].times)
+    return destPath
@@ -1,8 +1,14 @@
 import dataclasses
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
 from package.utils.enums import AnnotationType
-from package.range_marker import RangeMarker
-from qwt import QwtPlotMarker
+
+# Only needed for annotations, so that data classes can be used without Qt
+if TYPE_CHECKING:
+    from package.range_marker import RangeMarker
+    from qwt import QwtPlotMarker
 
 @dataclass
 class DataPoint:
@@ -20,6 +26,47 @@ class DataPoint:
         return f"DataPoint: time:float={self.time}, voltage:float={self.voltage}, channel:int={self.channel}"
 
 
+@dataclass
+class DataArrays:
+    """Columnar counterpart of a list of DataPoints. Each field is a
+    contiguous array and index i of every array describes the same sample.
+    """
+    times: np.ndarray
+    voltages: np.ndarray
+    channels: np.ndarray
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, index):
+        """Selects the samples at index, which can be a slice, an index
+        array or a boolean mask
+        """
+        return DataArrays(
+            self.times[index], self.voltages[index], self.channels[index]
+        )
+
+    @staticmethod
+    def concatenate(blocks: list["DataArrays"]) -> "DataArrays":
+        """Joins blocks of samples, in order, into one"""
+        if not blocks:
+            return DataArrays(np.empty(0), np.empty(0), np.empty(0, dtype=np.int64))
+        return DataArrays(
+            np.concatenate([block.times for block in blocks]),
+            np.concatenate([block.voltages for block in blocks]),
+            np.concatenate([block.channels for block in blocks]),
+        )
+
+    def toDataPoints(self) -> list[DataPoint]:
+        """Expands the arrays into a list of DataPoints"""
+        return [
+            DataPoint(time, voltage, channel)
+            for time, voltage, channel in zip(
+                self.times.tolist(), self.voltages.tolist(), self.channels.tolist()
+            )
+        ]
+
+
 @dataclass
 class Annotation:
     timeStart: float
@@ -58,6 +105,6 @@ class EPGParameters:
 @dataclass 
 class MarkerGroup:
     id: int
-    marker: RangeMarker
-    leftBorder: QwtPlotMarker
-    rightBorder: QwtPlotMarker=None 
+    marker: "RangeMarker"
+    leftBorder: "QwtPlotMarker"
+    rightBorder: "QwtPlotMarker"=None 
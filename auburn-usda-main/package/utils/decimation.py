@@ -0,0 +1,204 @@
+import numpy as np
+
+from package.utils.enums import DecimationMethod
+from package.utils.min_max_pyramid import (
+    BASE_BLOCK,
+    LEVEL_FACTOR,
+    MinMaxPyramid,
+    sampleRange,
+)
+
+RELATIVE_CHANGE_SENSITIVITY = 6  # keeps changes larger than 1/6 of the mean squared change
+PREVIEW_POINTS = 2**16  # most samples read to find voltage ranges of a preview
+
+
+def strideDecimate(
+    times: np.ndarray, voltages: np.ndarray, factor: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keeps every factor-th sample
+    :param factor: number of samples each kept sample stands for
+    :returns: views of the kept sample times and voltages
+    """
+    return times[::factor], voltages[::factor]
+
+
+def minMaxDecimate(
+    times: np.ndarray, voltages: np.ndarray, factor: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keeps the smallest and largest sample of every block of factor
+    samples, in the order they occur, so that spikes are not lost
+    :param factor: number of samples in each block
+    :returns: times and voltages of two samples per block
+    """
+    voltages = np.asarray(voltages)
+    if len(voltages) == 0:
+        return np.asarray(times)[:0], voltages[:0]
+    blocks = len(voltages) // factor
+    grouped = voltages[: blocks * factor].reshape(blocks, factor)
+    starts = np.arange(blocks) * factor
+    minIndices = starts + grouped.argmin(axis=1)
+    maxIndices = starts + grouped.argmax(axis=1)
+
+    # The samples after the last full block form a shorter block
+    if blocks * factor < len(voltages):
+        tail = voltages[blocks * factor :]
+        minIndices = np.append(minIndices, blocks * factor + tail.argmin())
+        maxIndices = np.append(maxIndices, blocks * factor + tail.argmax())
+
+    indices = np.empty(2 * len(minIndices), dtype=np.int64)
+    indices[0::2] = np.minimum(minIndices, maxIndices)
+    indices[1::2] = np.maximum(minIndices, maxIndices)
+    return np.asarray(times)[indices], voltages[indices]
+
+
+def relativeChangeIndices(
+    voltages: np.ndarray, sensitivity: float = RELATIVE_CHANGE_SENSITIVITY
+) -> np.ndarray:
+    """Finds the samples that change noticeably from the sample before.
+    The first sample is always kept, and any later sample is kept when its
+    squared change is larger than the mean squared change divided by
+    sensitivity. The mean includes the first sample, which has no change.
+    :param voltages: sample voltages
+    :param sensitivity: larger values keep more samples
+    :returns: indices of the kept samples
+    """
+    voltages = np.asarray(voltages)
+    if len(voltages) == 0:
+        return np.empty(0, dtype=np.int64)
+    squaredChanges = np.diff(voltages) ** 2
+    threshold = squaredChanges.sum() / len(voltages) / sensitivity
+    return np.concatenate(([0], np.flatnonzero(squaredChanges > threshold) + 1))
+
+
+def relativeChangeFilter(
+    times: np.ndarray, voltages: np.ndarray, sensitivity: float = RELATIVE_CHANGE_SENSITIVITY
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keeps the samples that change noticeably from the sample before,
+    see relativeChangeIndices
+    :returns: times and voltages of the kept samples
+    """
+    indices = relativeChangeIndices(voltages, sensitivity)
+    return np.asarray(times)[indices], np.asarray(voltages)[indices]
+
+
+class DecimationEngine:
+    """Decimated versions of one channel at several resolutions, computed
+    once when the channel is loaded. Drawing a time range picks the
+    resolution that gives two to four points per pixel column.
+    - MIN_MAX keeps the smallest and largest sample of each block, see
+      MinMaxPyramid.
+    - STRIDE keeps every n-th sample. Each level is a view of the samples.
+    - RELATIVE_CHANGE drops samples that barely change from the sample
+      before, then keeps min/max levels of the remaining samples.
+
+    Building the levels reads every sample, so engines are built off the
+    GUI thread where possible. A preview engine instead draws stride views
+    and finds voltage ranges from at most PREVIEW_POINTS samples, which
+    is cheap enough to rebuild for every partial result of an import.
+    """
+
+    def __init__(
+        self,
+        times: np.ndarray,
+        voltages: np.ndarray,
+        method: DecimationMethod = DecimationMethod.MIN_MAX,
+        preview: bool = False,
+        pyramid: MinMaxPyramid = None,
+    ):
+        """
+        :param times: sample times in increasing order
+        :param voltages: sample voltages
+        :param method: how samples are dropped at lower resolutions
+        :param preview: whether to only draw stride views, ignoring method
+        :param pyramid: min/max summary of every sample if it was already
+            built, e.g. read from the file cache
+        """
+        self.preview = preview
+        if preview:
+            method = DecimationMethod.STRIDE
+        self.method = method
+        self.pyramid = None
+        self.strides = []
+        # Min/max summary of every sample, for the range of a time window
+        self.rangePyramid = pyramid
+        self.allTimes = times
+        self.allVoltages = voltages
+
+        if method == DecimationMethod.MIN_MAX:
+            self.summarizeRange()
+            self.pyramid = self.rangePyramid
+        if self.rangePyramid is not None:
+            self.voltageMin, self.voltageMax = self.rangePyramid.voltageRange()
+        elif preview:
+            sampled = voltages[:: max(len(voltages) // PREVIEW_POINTS, 1)]
+            self.voltageMin = float(np.min(sampled))
+            self.voltageMax = float(np.max(sampled))
+        else:
+            # The range of every sample, not just of the ones kept
+            self.voltageMin = float(np.min(voltages))
+            self.voltageMax = float(np.max(voltages))
+
+        if method == DecimationMethod.RELATIVE_CHANGE:
+            times, voltages = relativeChangeFilter(times, voltages)
+            self.pyramid = MinMaxPyramid(times, voltages)
+        self.times = times
+        self.voltages = voltages
+
+        if method == DecimationMethod.STRIDE:
+            # Level i keeps the first sample of each block of the min/max
+            # level i, so both draw the same number of points per pixel
+            factor = BASE_BLOCK // 2
+            while factor < len(times):
+                self.strides.append((factor, *strideDecimate(times, voltages, factor)))
+                factor *= LEVEL_FACTOR
+
+    def points(self, start: float, end: float, pixels: int) -> tuple[np.ndarray, np.ndarray]:
+        """Picks the points to draw for a time range
+        :param start: first time shown
+        :param end: last time shown
+        :param pixels: width of the chart in pixels
+        :returns: times and voltages to draw
+        """
+        if self.pyramid is not None:
+            return self.pyramid.points(start, end, pixels)
+
+        low, high = sampleRange(self.times, start, end)
+        samplesPerPixel = (high - low) / max(pixels, 1)
+        if samplesPerPixel < BASE_BLOCK or not self.strides:
+            return self.times[low:high], self.voltages[low:high]
+        levelIndex = int(np.log2(samplesPerPixel / BASE_BLOCK) / np.log2(LEVEL_FACTOR))
+        factor, times, voltages = self.strides[min(levelIndex, len(self.strides) - 1)]
+        # One kept sample on each side so that lines run to the edges
+        first = max(low // factor - 1, 0)
+        last = (high - 1) // factor + 2
+        return times[first:last], voltages[first:last]
+
+    def windowVoltageRange(self, start: float, end: float) -> tuple[float, float] | None:
+        """Smallest and largest voltage of the samples in a time range,
+        found in O(log n) from min/max summaries. Methods other than MIN_MAX
+        build the summary of every sample the first time this is called,
+        unless summarizeRange was called before. Previews only look at the
+        points they would draw.
+        :param start: first time of the range
+        :param end: last time of the range
+        :returns: None if there are no samples in the range
+        """
+        if self.preview:
+            voltages = self.points(start, end, PREVIEW_POINTS)[1]
+            if len(voltages) == 0:
+                return None
+            return float(np.min(voltages)), float(np.max(voltages))
+        self.summarizeRange()
+        low = int(np.searchsorted(self.allTimes, start, side="left"))
+        high = int(np.searchsorted(self.allTimes, end, side="right"))
+        return self.rangePyramid.rangeMinMax(low, high)
+
+    def summarizeRange(self):
+        """Builds the min/max summary of every sample used by
+        windowVoltageRange, if the method did not build it already"""
+        if self.rangePyramid is None:
+            self.rangePyramid = MinMaxPyramid(self.allTimes, self.allVoltages)
+
+    def voltageRange(self) -> tuple[float, float]:
+        """Smallest and largest voltage of the whole channel"""
+        return self.voltageMin, self.voltageMax
@@ -0,0 +1,92 @@
+import numpy as np
+
+from package.utils.data_classes import DataArrays
+
+# Channels are expected to show up within the first samples of a recording;
+# any channel that first appears later is located with a full scan
+FIRST_SEEN_WINDOW = 4096
+
+
+def demultiplex(data: DataArrays) -> tuple[list[int], list[DataArrays]]:
+    """Splits interleaved samples into one set of contiguous samples per
+    channel. Samples keep their relative order within each channel.
+    :param data: samples of any number of channels
+    :returns: channels in the order they first appear in, and the samples
+        of each of those channels
+    """
+    if len(data) == 0:
+        return [], []
+
+    codes, channelOfCode = _channelCodes(data.channels)
+    counts = np.bincount(codes, minlength=len(channelOfCode))
+    presentCodes = np.flatnonzero(counts)
+    firstSeen = _firstSeen(codes, presentCodes)
+    layout = presentCodes[np.argsort(firstSeen, kind="stable")]
+    channels = [int(channelOfCode[code]) for code in layout]
+
+    if len(layout) == 1:
+        return channels, [data]
+
+    # Channels that repeat in a fixed pattern can be split with strides
+    period = len(layout)
+    if np.array_equal(codes[:period], layout) and np.array_equal(
+        codes[period:], codes[:-period]
+    ):
+        return channels, [
+            _channelArrays(
+                channel,
+                np.ascontiguousarray(data.times[i::period]),
+                np.ascontiguousarray(data.voltages[i::period]),
+            )
+            for i, channel in enumerate(channels)
+        ]
+
+    # Otherwise a stable sort by channel groups the samples of each channel
+    order = np.argsort(codes, kind="stable")
+    times = data.times[order]
+    voltages = data.voltages[order]
+    ends = np.cumsum(counts)
+    return channels, [
+        _channelArrays(
+            channel,
+            times[ends[code] - counts[code] : ends[code]],
+            voltages[ends[code] - counts[code] : ends[code]],
+        )
+        for code, channel in zip(layout, channels)
+    ]
+
+
+def _channelCodes(channels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Maps channel numbers to small unsigned codes, which are counted and
+    sorted much faster than arbitrary integers
+    :param channels: channel of every sample
+    :returns: code of every sample, and the channel number of every code
+    """
+    low = int(channels.min())
+    span = int(channels.max()) - low + 1
+    if span <= 2**16:
+        dtype = np.uint8 if span <= 2**8 else np.uint16
+        codes = (channels - low).astype(dtype)
+        return codes, np.arange(low, low + span)
+    channelOfCode, codes = np.unique(channels, return_inverse=True)
+    return codes, channelOfCode
+
+
+def _firstSeen(codes: np.ndarray, presentCodes: np.ndarray) -> np.ndarray:
+    """Finds the index of the first sample of each present code"""
+    headCodes, headIndices = np.unique(codes[:FIRST_SEEN_WINDOW], return_index=True)
+    firstSeen = dict(zip(headCodes.tolist(), headIndices.tolist()))
+    return np.array(
+        [
+            firstSeen[code] if code in firstSeen else int(np.argmax(codes == code))
+            for code in presentCodes.tolist()
+        ]
+    )
+
+
+def _channelArrays(channel: int, times: np.ndarray, voltages: np.ndarray) -> DataArrays:
+    return DataArrays(
+        times=times,
+        voltages=voltages,
+        channels=np.broadcast_to(np.int64(channel), times.shape),
+    )
@@ -7,4 +7,14 @@ class AnnotationType(Enum):
 
 class Mode(Enum):
     DATA_ACQUISITION = 1
-    POST_ACQUISITION = 2
\ No newline at end of file
+    POST_ACQUISITION = 2
+
+class DecimationMethod(Enum):
+    MIN_MAX = 1
+    STRIDE = 2
+    RELATIVE_CHANGE = 3
+
+class FsyncPolicy(Enum):
+    NONE = 1
+    PERIODIC = 2
+    ON_PAUSE = 3
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import os
+
+from package.utils.data_classes import DataArrays
+from package.utils.min_max_pyramid import BASE_BLOCK, LEVEL_FACTOR, LEVEL_FIELDS, MinMaxPyramid
+from package.utils.session_file import (
+    SESSION_EXTENSION,
+    Session,
+    SessionWriter,
+    estimateSampleRate,
+    readSession,
+)
+
+CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "epg-visualizer")
+CACHE_SIZE_LIMIT = 4 * 2**30  # bytes
+
+
+def pyramidBlock(channel: int, field: str) -> str:
+    """Name of the block holding one field of the min/max levels of a
+    channel. The level layout is part of the name, so levels built with
+    other constants are not used."""
+    return f"{channel}/pyramid{BASE_BLOCK}x{LEVEL_FACTOR}/{field}"
+
+
+def readPyramid(session: Session, channel: int, data: DataArrays) -> MinMaxPyramid | None:
+    """Memory maps the min/max levels of a channel stored in a session file
+    :param session: session file, usually a cache entry
+    :param channel: channel number as listed in the session
+    :param data: samples of the channel, from the session or a copy of them
+    :returns: None if the session has no levels of the channel
+    """
+    names = {field: pyramidBlock(channel, field) for field in ("sizes", *LEVEL_FIELDS)}
+    if not all(session.hasBlock(name) for name in names.values()):
+        return None
+    arrays = {field: session.block(name) for field, name in names.items()}
+    return MinMaxPyramid.fromLevelArrays(data.times, data.voltages, arrays)
+
+
+class FileCache:
+    """Cache of parsed recordings, stored as session files so that they can
+    be memory mapped. Entries are keyed by the path, size and modification
+    time of the original file, so an edited file is parsed again. The least
+    recently used entries are evicted once the cache grows past its limit.
+    The min/max decimation levels of each channel are stored with it, so
+    that a cached file is displayed without building them again.
+    """
+
+    def __init__(self, directory: str = CACHE_DIRECTORY, sizeLimit: int = CACHE_SIZE_LIMIT):
+        self.directory = directory
+        self.sizeLimit = sizeLimit
+
+    def entryPath(self, filepath: str) -> str:
+        """Returns where the cache entry of a file is stored
+        :param filepath: path of the original recording
+        """
+        stat = os.stat(filepath)
+        key = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}"
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, name + SESSION_EXTENSION)
+
+    def load(self, filepath: str) -> Session | None:
+        """Opens the cached copy of a file if it is up to date
+        :param filepath: path of the original recording
+        :returns: memory-mapped session, or None if the file is not cached
+        """
+        entryPath = self.entryPath(filepath)
+        if not os.path.exists(entryPath):
+            return None
+        try:
+            session = readSession(entryPath)
+        except (OSError, ValueError) as error:
+            logging.warning("Discarding unreadable cache entry " + entryPath + ", " + str(error))
+            os.remove(entryPath)
+            return None
+        # The modification time of an entry records when it was last used
+        os.utime(entryPath)
+        return session
+
+    def store(
+        self,
+        filepath: str,
+        channels: list[int],
+        splitData: list[DataArrays],
+        entryPath: str = None,
+        pyramids: list[MinMaxPyramid] = None,
+    ):
+        """Adds the parsed, separated channels of a file to the cache
+        :param filepath: path of the original recording
+        :param channels: channel numbers in display order
+        :param splitData: samples of each channel, in the same order
+        :param entryPath: entry to write, taken before parsing started in
+            case the file changed since
+        :param pyramids: min/max levels of each channel, in the same order
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if entryPath is None:
+            entryPath = self.entryPath(filepath)
+        sampleRate = estimateSampleRate(splitData[0].times) if splitData else 0
+        with SessionWriter(entryPath, sampleRate) as writer:
+            for i, (channel, data) in enumerate(zip(channels, splitData)):
+                writer.appendChannel(channel, data.times, data.voltages)
+                if pyramids is not None and pyramids[i] is not None:
+                    for field, values in pyramids[i].levelArrays().items():
+                        writer.addBlock(pyramidBlock(channel, field), values)
+        self.evict()
+
+    def entries(self) -> list[os.DirEntry]:
+        """Lists cache entries, least recently used first"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(SESSION_EXTENSION)
+        ]
+        return sorted(entries, key=lambda entry: entry.stat().st_mtime)
+
+    def size(self) -> int:
+        """Total size of the cache entries in bytes"""
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits its limit"""
+        entries = self.entries()
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.sizeLimit:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                # Entries that are open cannot be removed on every platform
+                continue
+            total -= size
+            logging.info("Evicted " + entry.name + " from the file cache.")
+
+    def clear(self):
+        """Removes every entry from the cache"""
+        for entry in self.entries():
+            try:
+                os.remove(entry.path)
+            except OSError as error:
+                logging.warning("Unable to remove cache entry " + entry.name + ", " + str(error))
+        logging.info("File cache cleared.")
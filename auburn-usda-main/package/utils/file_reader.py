@@ -1,6 +1,20 @@
 import csv
+import io
+import warnings
+from array import array
+from collections.abc import Iterator
 
-from package.utils.data_classes import DataPoint
+import numpy as np
+
+from package.utils.data_classes import DataArrays, DataPoint
+
+ANA_HEADER_SIZE = 2  # .ana files start with a 2-byte marker
+NEWLINE = ord("\n")
+# NUL padding and bytes that are not valid ASCII are dropped while decoding
+ANA_DROPPED_BYTES = b"\x00" + bytes(range(0x80, 0x100))
+# Whitespace and other control bytes separate the values of an .ana line
+ANA_LAST_SEPARATOR = ord(" ")
+CHUNK_SIZE = 8 * 2**20  # bytes read at a time when importing in chunks
 
 
 def csvRead(filepath: str, channels: int = 1) -> list[DataPoint]:
@@ -9,47 +23,226 @@ def csvRead(filepath: str, channels: int = 1) -> list[DataPoint]:
     :param channels: number of channels
     :returns: list of DataPoints
     """
-    data = []
-    with open(filepath, newline="") as csvfile:
-        reader = csv.reader(csvfile)
+    return csvReadArrays(filepath, channels).toDataPoints()
+
+    # if not csvFormatCheck(df.iloc[0], channels):
+    #    print("Error") TODO: reimplement csvFormatCheck
+
 
+def csvReadArrays(filepath: str, channels: int = 1) -> DataArrays:
+    """Reads a csv file and returns its time, voltage and channel columns
+    as contiguous arrays. Rows with fewer than 3 values are skipped.
+    :param filepath: the file path to read the csv from
+    :param channels: number of channels
+    :returns: DataArrays holding the first three columns of the file
+    """
+    with open(filepath, newline="") as csvfile:
         # If there is a header, skip
         csvTestBytes = csvfile.read(1024)
         csvfile.seek(0)
-        if csv.Sniffer().has_header(csvTestBytes):
-            next(reader)
+        headerRows = _csvHeaderRows(csvTestBytes)
+        return _csvColumns(_csvParse(csvfile, headerRows))
 
-        for row in reader:
-            if len(row) < 3:
-                continue
-            data.append(DataPoint(row[0], row[1], row[2]))
-    return data
 
-    # if not csvFormatCheck(df.iloc[0], channels):
-    #    print("Error") TODO: reimplement csvFormatCheck
+def iterCsvChunks(filepath: str, chunkSize: int = CHUNK_SIZE) -> Iterator[tuple[DataArrays, int]]:
+    """Reads a csv file in chunks of whole rows
+    :param filepath: the file path to read the csv from
+    :param chunkSize: number of bytes read at a time
+    :returns: iterator of (samples in the chunk, bytes of the file read so far)
+    """
+    with open(filepath, "rb") as f:
+        headerRows = _csvHeaderRows(f.read(1024).decode(errors="ignore"))
+        f.seek(0)
+        for block, position in _iterLines(f, chunkSize):
+            values = _csvParse(io.StringIO(block.decode(), newline=""), headerRows)
+            headerRows = 0
+            if len(values):
+                yield _csvColumns(values), position
+
+
+def _iterLines(f, chunkSize: int) -> Iterator[tuple[bytes, int]]:
+    """Reads a binary file in blocks that end on a line boundary
+    :param f: file opened in binary mode
+    :param chunkSize: number of bytes read at a time
+    :returns: iterator of (block of whole lines, bytes of the file read so far)
+    """
+    carry = b""
+    while True:
+        block = f.read(chunkSize)
+        if not block:
+            if carry:
+                yield carry, f.tell()
+            return
+        block = carry + block
+        end = block.rfind(b"\n") + 1
+        carry = block[end:]
+        if end:
+            yield block[:end], f.tell()
+
+
+def _csvHeaderRows(csvTestBytes: str) -> int:
+    """Returns 1 if the sample of the csv file starts with a header, else 0"""
+    return 1 if csv.Sniffer().has_header(csvTestBytes) else 0
+
+
+def _csvParse(csvfile, headerRows: int) -> np.ndarray:
+    """Parses the first three values of every row of a csv file
+    :param csvfile: open csv file in text mode positioned at its start
+    :param headerRows: number of rows to skip at the start
+    :returns: 2D array with one row of time, voltage, channel per data row
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # Empty file
+            return np.loadtxt(
+                csvfile,
+                dtype=np.float64,
+                delimiter=",",
+                usecols=(0, 1, 2),
+                skiprows=headerRows,
+                comments=None,
+                quotechar='"',
+                ndmin=2,
+            )
+    except ValueError:
+        # Some rows are too short, fall back to reading row by row
+        csvfile.seek(0)
+        return _csvReadRows(csvfile, headerRows)
+
+
+def _csvColumns(values: np.ndarray) -> DataArrays:
+    """Splits parsed csv rows into contiguous columns"""
+    return DataArrays(
+        times=np.ascontiguousarray(values[:, 0]),
+        voltages=np.ascontiguousarray(values[:, 1]),
+        channels=values[:, 2].astype(np.int64),
+    )
+
+
+def _csvReadRows(csvfile, headerRows: int) -> np.ndarray:
+    """Reads the first three values of every row that has at least 3 values
+    :param csvfile: open csv file positioned at its start
+    :param headerRows: number of rows to skip at the start
+    :returns: 2D array with one row of time, voltage, channel per data row
+    """
+    reader = csv.reader(csvfile)
+    for _ in range(headerRows):
+        next(reader, None)
+
+    values = array("d")
+    for row in reader:
+        if len(row) < 3:
+            continue
+        values.extend((float(row[0]), float(row[1]), int(row[2])))
+    return np.frombuffer(values, dtype=np.float64).reshape(-1, 3)
+
+
+def _anaCleanBytes(raw: np.ndarray) -> tuple[bytes, int]:
+    """Strips the NUL padding, the byte following each newline and any
+    non-ASCII bytes from the raw contents of an .ana file. Only complete
+    lines are kept; trailing bytes without a newline are left unconsumed.
+    :param raw: uint8 array with the file contents after the 2-byte header
+    :returns: cleaned bytes made up of newline-terminated lines, and the
+        index in raw where the unconsumed bytes start. The index is
+        len(raw) + 1 if the byte after the last newline is still to come.
+    """
+    newlines = np.flatnonzero(raw == NEWLINE)
+    if len(newlines) == 0:
+        return b"", 0
+
+    # A newline consumes the byte after it, so in a run of consecutive
+    # newlines only every other one ends a line
+    runBreaks = np.flatnonzero(np.diff(newlines) != 1) + 1
+    if len(runBreaks) != len(newlines) - 1:
+        runStarts = np.zeros(len(newlines), dtype=np.int64)
+        runStarts[runBreaks] = runBreaks
+        np.maximum.accumulate(runStarts, out=runStarts)
+        offsets = np.arange(len(newlines)) - runStarts
+        newlines = newlines[offsets % 2 == 0]
+
+    end = newlines[-1] + 1
+    raw = raw[:end].copy()
+    skipped = newlines + 1
+    raw[skipped[skipped < end]] = 0
+    return raw.tobytes().translate(None, ANA_DROPPED_BYTES), end + 1
+
+
+def _anaParse(cleaned: bytes, filepath: str) -> DataArrays:
+    """Parses cleaned .ana lines of channel, time and voltage into arrays.
+    Values are counted per line before NumPy reads them all in one call, so
+    that, as with anaRead, blank lines are skipped and any other line
+    without exactly 3 values raises a ValueError.
+    """
+    raw = np.frombuffer(cleaned, dtype=np.uint8)
+    separators = raw <= ANA_LAST_SEPARATOR
+    # A value starts wherever a separator is followed by anything else
+    valueStarts = np.flatnonzero(~separators & np.r_[True, separators[:-1]])
+    lineEnds = np.flatnonzero(raw == NEWLINE)
+    valuesPerLine = np.diff(np.searchsorted(valueStarts, lineEnds), prepend=0)
+    badLines = np.flatnonzero((valuesPerLine != 3) & (valuesPerLine != 0))
+    if len(badLines):
+        start = lineEnds[badLines[0] - 1] + 1 if badLines[0] > 0 else 0
+        line = cleaned[start : lineEnds[badLines[0]]].decode("ascii").strip()
+        raise ValueError(f"{filepath} contains a row without 3 values: {line}")
+
+    if len(valueStarts) == 0:
+        # NumPy reads -1 from a string of nothing but whitespace
+        values = np.empty(0)
+    else:
+        with warnings.catch_warnings():
+            # Raised by NumPy when a value cannot be read
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                values = np.fromstring(cleaned.decode("ascii"), sep=" ")
+            except (DeprecationWarning, ValueError):
+                values = np.empty(0)
+    if len(values) != len(valueStarts):
+        raise ValueError(f"{filepath} contains values that are not numbers")
+    values = values.reshape(-1, 3)
+    return DataArrays(
+        times=np.ascontiguousarray(values[:, 1]),
+        voltages=np.ascontiguousarray(values[:, 2]),
+        channels=values[:, 0].astype(np.int64),
+    )
 
 
 def anaDecode(filepath: str) -> list[str]:
     """Reads .ana files in binary format and parses them to be readable
     :param filepath: filepath of .ana file to read from
     """
+    raw = np.fromfile(filepath, dtype=np.uint8)[ANA_HEADER_SIZE:]
+    return _anaCleanBytes(raw)[0].decode("ascii").split("\n")[:-1]
+
+
+def anaReadArrays(filepath: str) -> DataArrays:
+    """Reads an .ana file in one bulk read and parses it straight into arrays
+    :param filepath: filepath of .ana file to read from
+    :returns: DataArrays holding the channel, time and voltage columns
+    """
+    raw = np.fromfile(filepath, dtype=np.uint8)[ANA_HEADER_SIZE:]
+    return _anaParse(_anaCleanBytes(raw)[0], filepath)
+
 
-    lines = []
+def iterAnaChunks(filepath: str, chunkSize: int = CHUNK_SIZE) -> Iterator[tuple[DataArrays, int]]:
+    """Reads an .ana file in chunks of whole lines
+    :param filepath: filepath of .ana file to read from
+    :param chunkSize: number of bytes read at a time
+    :returns: iterator of (samples in the chunk, bytes of the file read so far)
+    """
     with open(filepath, "rb") as f:
-        f.read(1)  # Skip the first character
-        f.read(1)  # Skip the second character
-        line = ""
+        f.read(ANA_HEADER_SIZE)
+        carry = np.empty(0, dtype=np.uint8)
+        pendingSkip = 0
         while True:
-            c = f.read(1)
-            if not c:
-                break  # End of file
-            if c == b"\n":
-                f.read(1)  # Skip the character after newline
-                lines.append(line)
-                line = ""
-            if c != b"\x00":
-                line += c.decode("utf-8", errors="ignore")
-    return lines
+            block = np.frombuffer(f.read(chunkSize), dtype=np.uint8)
+            if len(block) == 0:
+                return
+            raw = np.concatenate((carry, block[pendingSkip:]))
+            cleaned, consumed = _anaCleanBytes(raw)
+            carry = raw[consumed:]
+            pendingSkip = max(consumed - len(raw), 0)
+            if cleaned:
+                yield _anaParse(cleaned, filepath), f.tell()
 
 
 def anaRead(filepath: str) -> list[DataPoint]:
@@ -57,11 +250,4 @@ def anaRead(filepath: str) -> list[DataPoint]:
     :param: filepath to read .ana file from
     :returns: list of DataPoints
     """
-    lines = anaDecode(filepath)
-    data = []
-    for elem in lines:
-        if not elem:
-            continue
-        channel, time, voltage = elem.split()
-        data.append(DataPoint(time, voltage, channel))
-    return data
+    return anaReadArrays(filepath).toDataPoints()
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from package.utils.channel_store import ChannelStore
+from package.utils.decimation import DecimationEngine
+from package.utils.demux import demultiplex
+from package.utils.enums import DecimationMethod
+from package.utils.file_cache import FileCache
+from package.utils.file_reader import iterAnaChunks, iterCsvChunks
+from package.utils.session_file import SessionWriter, estimateSampleRate
+
+PARTIAL_RESULT_INTERVAL = 0.5  # seconds between partial results while importing
+
+
+class ImportSignals(QObject):
+    """Signals sent from an ImportWorker back to the GUI thread"""
+
+    progress = Signal(int)  # bytes of the file read so far
+    partial = Signal(list, list)  # channels, samples of each channel so far
+    finished = Signal(list, list, list)  # channels, samples and DecimationEngine of each channel
+    indexed = Signal(str)  # session file the channels were written to
+    cancelled = Signal()
+    failed = Signal(str)  # error message
+
+
+class ImportWorker(QRunnable):
+    """Parses a csv or ana file and separates it by channel on a thread
+    pool thread. Results are sent back through signals so that charts are
+    only touched on the GUI thread. The decimation levels of each channel
+    are built here as well, so the GUI thread only has to draw them. If a
+    cache is given, the result is also stored in it once the charts have
+    been sent the data.
+
+    When only indexing, samples are not kept in memory at all: each channel
+    is written straight to a cache entry, whose channels can then be loaded
+    one at a time.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        cache: FileCache = None,
+        indexOnly: bool = False,
+        decimationMethod: DecimationMethod = DecimationMethod.MIN_MAX,
+    ):
+        super().__init__()
+        self.filename = filename
+        self.fileSize = os.path.getsize(filename)
+        self.signals = ImportSignals()
+        self.cache = cache
+        self.indexOnly = indexOnly
+        self.decimationMethod = decimationMethod
+        # Taken now in case the file is modified while it is being read
+        self.cacheEntry = cache.entryPath(filename) if cache else None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stops the import before the next chunk is parsed"""
+        self._cancelled.set()
+
+    def run(self):
+        try:
+            if self.indexOnly:
+                self.indexChunks()
+            else:
+                self.readChunks()
+        except Exception as error:
+            self.signals.failed.emit(str(error))
+
+    def iterChunks(self):
+        _, fileType = os.path.splitext(self.filename)
+        readChunks = iterAnaChunks if fileType.lower() == ".ana" else iterCsvChunks
+        return readChunks(self.filename)
+
+    def indexChunks(self):
+        """Separates the file by channel into its cache entry"""
+        os.makedirs(self.cache.directory, exist_ok=True)
+        writer = SessionWriter(self.cacheEntry)
+        try:
+            for chunk, position in self.iterChunks():
+                if self._cancelled.is_set():
+                    break
+                channels, channelData = demultiplex(chunk)
+                for channel, data in zip(channels, channelData):
+                    writer.appendChannel(channel, data.times, data.voltages)
+                if not writer.sampleRate and channelData:
+                    writer.sampleRate = estimateSampleRate(channelData[0].times)
+                self.signals.progress.emit(position)
+        except Exception:
+            writer.discard()
+            raise
+
+        if self._cancelled.is_set():
+            writer.discard()
+            self.signals.cancelled.emit()
+            return
+        writer.close()
+        self.cache.evict()
+        self.signals.indexed.emit(self.cacheEntry)
+
+    def readChunks(self):
+        """Reads the file into one ChannelStore per channel, sending partial
+        results as it goes
+        :returns: nothing, the channels, their samples and decimation levels
+            are sent with the finished signal
+        """
+        stores = {}
+        lastPartial = time.time()
+        for chunk, position in self.iterChunks():
+            if self._cancelled.is_set():
+                self.signals.cancelled.emit()
+                return
+
+            channels, channelData = demultiplex(chunk)
+            for channel, data in zip(channels, channelData):
+                if channel not in stores:
+                    stores[channel] = ChannelStore(channel)
+                    # Size the store for the whole file based on what has
+                    # been read so far, so it rarely has to grow
+                    stores[channel].reserve(int(len(data) * self.fileSize / position * 1.05))
+                stores[channel].append(data.times, data.voltages)
+
+            self.signals.progress.emit(position)
+            if time.time() - lastPartial > PARTIAL_RESULT_INTERVAL:
+                self.signals.partial.emit(
+                    list(stores), [store.data() for store in stores.values()]
+                )
+                lastPartial = time.time()
+
+        if self._cancelled.is_set():
+            self.signals.cancelled.emit()
+            return
+        channels = list(stores)
+        splitData = [store.data() for store in stores.values()]
+        decimations = []
+        for data in splitData:
+            if self._cancelled.is_set():
+                self.signals.cancelled.emit()
+                return
+            decimation = DecimationEngine(data.times, data.voltages, self.decimationMethod)
+            decimation.summarizeRange()
+            decimations.append(decimation)
+        self.signals.finished.emit(channels, splitData, decimations)
+
+        if self.cache is not None:
+            try:
+                self.cache.store(
+                    self.filename,
+                    channels,
+                    splitData,
+                    self.cacheEntry,
+                    [decimation.rangePyramid for decimation in decimations],
+                )
+            except OSError as error:
+                logging.error("Unable to cache " + self.filename + ", " + str(error))
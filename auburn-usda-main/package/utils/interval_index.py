@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class IntervalIndex:
+    """Index of closed intervals, such as annotations, for finding the ones
+    that overlap a time or a time range. Intervals are kept sorted by start
+    along with the running maximum of their ends, so a query only looks at
+    intervals that start before the range ends and after every earlier
+    interval has ended. This takes O(log n + k) for k results, unless a long
+    interval overlaps many short ones that do not reach the range.
+
+    Added intervals are collected and sorted in one go by the next query,
+    so adding many intervals in a row stays cheap.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.starts = np.empty(0)
+        self.ends = np.empty(0)
+        self.maxEnds = np.empty(0)
+        self.pending = []
+
+    def __len__(self):
+        return len(self.keys) + len(self.pending)
+
+    def add(self, key, start: float, end: float):
+        """Adds an interval
+        :param key: object returned by queries that overlap the interval
+        :param start: lower bound of the interval
+        :param end: upper bound of the interval
+        """
+        self.pending.append((key, min(start, end), max(start, end)))
+
+    def clear(self):
+        """Removes every interval"""
+        self.__init__()
+
+    def _build(self):
+        """Merges the pending intervals into the sorted arrays"""
+        if not self.pending:
+            return
+        keys, starts, ends = zip(*self.pending)
+        self.pending = []
+        starts = np.concatenate((self.starts, starts))
+        ends = np.concatenate((self.ends, ends))
+        keys = self.keys + list(keys)
+
+        # A stable sort keeps intervals with equal starts in the order added
+        order = np.argsort(starts, kind="stable")
+        self.keys = [keys[i] for i in order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.maxEnds = np.maximum.accumulate(self.ends)
+
+    def overlappingIndices(self, start: float, end: float) -> np.ndarray:
+        """Finds the intervals that overlap a range
+        :param start: lower bound of the range
+        :param end: upper bound of the range
+        :returns: positions of the overlapping intervals in keys, starts
+            and ends, in increasing order
+        """
+        self._build()
+        # Intervals before low have all ended before the range starts and
+        # intervals from high onwards start after it ends
+        low = int(np.searchsorted(self.maxEnds, start, side="left"))
+        high = int(np.searchsorted(self.starts, end, side="right"))
+        if low >= high:
+            return np.empty(0, dtype=np.int64)
+        return low + np.flatnonzero(self.ends[low:high] >= start)
+
+    def overlapping(self, start: float, end: float) -> list:
+        """Finds the intervals that overlap a range
+        :param start: lower bound of the range
+        :param end: upper bound of the range
+        :returns: keys of the overlapping intervals, ordered by start
+        """
+        return [self.keys[i] for i in self.overlappingIndices(start, end)]
+
+    def containing(self, x: float) -> list:
+        """Finds the intervals that contain a point
+        :returns: keys of the intervals, ordered by start
+        """
+        return self.overlapping(x, x)
@@ -0,0 +1,231 @@
+import numpy as np
+
+BASE_BLOCK = 8  # samples summarized by each block of the finest level
+LEVEL_FACTOR = 2  # blocks of a level merged into each block of the next
+LEVEL_FIELDS = ("minIndices", "maxIndices", "minValues", "maxValues")
+
+
+def sampleRange(times: np.ndarray, start: float, end: float) -> tuple[int, int]:
+    """Finds the samples within a time range, plus one sample on each side
+    so that lines run to the edges of the range
+    :param times: sample times in increasing order
+    :returns: index of the first sample and one past the last sample
+    """
+    low = max(int(np.searchsorted(times, start, side="left")) - 1, 0)
+    high = min(int(np.searchsorted(times, end, side="right")) + 1, len(times))
+    return low, high
+
+
+def visiblePoints(
+    times: np.ndarray, voltages: np.ndarray, start: float, end: float, pixels: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Picks the points to draw for a time range of samples that change too
+    often to keep a MinMaxPyramid of, such as a live recording
+    :param times: sample times in increasing order
+    :param voltages: sample voltages
+    :param start: first time shown
+    :param end: last time shown
+    :param pixels: width of the chart in pixels
+    :returns: views of the visible samples, or their min/max summary if
+        there are too many of them to draw
+    """
+    low, high = sampleRange(times, start, end)
+    if high - low < BASE_BLOCK * max(pixels, 1):
+        return times[low:high], voltages[low:high]
+    return MinMaxPyramid(times[low:high], voltages[low:high]).points(start, end, pixels)
+
+
+class MinMaxLevel:
+    """One level of a MinMaxPyramid. Block i summarizes samples
+    i * blockSize up to (i + 1) * blockSize by the index and value of its
+    smallest and largest voltage."""
+
+    def __init__(
+        self,
+        blockSize: int,
+        minIndices: np.ndarray,
+        maxIndices: np.ndarray,
+        minValues: np.ndarray,
+        maxValues: np.ndarray,
+    ):
+        self.blockSize = blockSize
+        self.minIndices = minIndices
+        self.maxIndices = maxIndices
+        self.minValues = minValues
+        self.maxValues = maxValues
+
+    def __len__(self):
+        return len(self.minIndices)
+
+
+class MinMaxPyramid:
+    """Multi-resolution min/max summary of one channel, used to draw any
+    time range with two to four points per pixel column. Each block is drawn
+    as its minimum and maximum sample in time order, so spikes stay visible
+    no matter how far the chart is zoomed out.
+    """
+
+    def __init__(self, times: np.ndarray, voltages: np.ndarray):
+        """
+        :param times: sample times in increasing order
+        :param voltages: sample voltages
+        """
+        self.times = times
+        self.voltages = voltages
+        self.levels = []
+
+        level = self._firstLevel(voltages)
+        while level is not None:
+            self.levels.append(level)
+            level = self._nextLevel(level) if len(level) > 1 else None
+
+    @classmethod
+    def fromLevelArrays(
+        cls, times: np.ndarray, voltages: np.ndarray, arrays: dict[str, np.ndarray]
+    ) -> "MinMaxPyramid":
+        """Rebuilds a pyramid from the arrays of levelArrays without reading
+        the samples. The levels are views of the arrays, so they can be
+        memory mapped.
+        :param times: sample times the levels were built from
+        :param voltages: sample voltages the levels were built from
+        :param arrays: sizes of the levels and each field of LEVEL_FIELDS
+        """
+        pyramid = cls.__new__(cls)
+        pyramid.times = times
+        pyramid.voltages = voltages
+        pyramid.levels = []
+        offset = 0
+        blockSize = BASE_BLOCK
+        for size in np.asarray(arrays["sizes"]).tolist():
+            pyramid.levels.append(
+                MinMaxLevel(blockSize, *(arrays[field][offset : offset + size] for field in LEVEL_FIELDS))
+            )
+            offset += size
+            blockSize *= LEVEL_FACTOR
+        return pyramid
+
+    def levelArrays(self) -> dict[str, np.ndarray]:
+        """Every level as one array per field, to store them, see
+        fromLevelArrays
+        :returns: sizes of the levels, and each field of LEVEL_FIELDS of
+            all levels one after the other
+        """
+        arrays = {"sizes": np.array([len(level) for level in self.levels], dtype=np.int64)}
+        for field in LEVEL_FIELDS:
+            values = [getattr(level, field) for level in self.levels]
+            arrays[field] = np.concatenate(values) if values else np.empty(0)
+        return arrays
+
+    @staticmethod
+    def _firstLevel(voltages: np.ndarray) -> MinMaxLevel | None:
+        if len(voltages) < BASE_BLOCK:
+            return None
+        blocks = len(voltages) // BASE_BLOCK
+        grouped = np.asarray(voltages[: blocks * BASE_BLOCK]).reshape(blocks, BASE_BLOCK)
+        starts = np.arange(blocks) * BASE_BLOCK
+        minIndices = starts + grouped.argmin(axis=1)
+        maxIndices = starts + grouped.argmax(axis=1)
+
+        # The samples after the last full block form a shorter block
+        if blocks * BASE_BLOCK < len(voltages):
+            tail = np.asarray(voltages[blocks * BASE_BLOCK :])
+            minIndices = np.append(minIndices, blocks * BASE_BLOCK + tail.argmin())
+            maxIndices = np.append(maxIndices, blocks * BASE_BLOCK + tail.argmax())
+        return MinMaxLevel(
+            BASE_BLOCK, minIndices, maxIndices, voltages[minIndices], voltages[maxIndices]
+        )
+
+    @staticmethod
+    def _nextLevel(level: MinMaxLevel) -> MinMaxLevel:
+        """Merges every LEVEL_FACTOR blocks of a level into one block"""
+        padding = -len(level) % LEVEL_FACTOR
+
+        def merge(indices, values, pick):
+            # Padding repeats the last block, which does not change the result
+            indices = np.pad(indices, (0, padding), mode="edge").reshape(-1, LEVEL_FACTOR)
+            values = np.pad(values, (0, padding), mode="edge").reshape(-1, LEVEL_FACTOR)
+            choice = pick(values, axis=1)
+            rows = np.arange(len(values))
+            return indices[rows, choice], values[rows, choice]
+
+        minIndices, minValues = merge(level.minIndices, level.minValues, np.argmin)
+        maxIndices, maxValues = merge(level.maxIndices, level.maxValues, np.argmax)
+        return MinMaxLevel(
+            level.blockSize * LEVEL_FACTOR, minIndices, maxIndices, minValues, maxValues
+        )
+
+    def points(self, start: float, end: float, pixels: int) -> tuple[np.ndarray, np.ndarray]:
+        """Picks the points to draw for a time range
+        :param start: first time shown
+        :param end: last time shown
+        :param pixels: width of the chart in pixels
+        :returns: times and voltages to draw, two to four points per pixel
+            once there are more samples than that
+        """
+        low, high = sampleRange(self.times, start, end)
+        samplesPerPixel = (high - low) / max(pixels, 1)
+        if samplesPerPixel < BASE_BLOCK or not self.levels:
+            return self.times[low:high], self.voltages[low:high]
+
+        # Coarsest level whose blocks are still no wider than a pixel
+        levelIndex = int(np.log2(samplesPerPixel / BASE_BLOCK) / np.log2(LEVEL_FACTOR))
+        level = self.levels[min(levelIndex, len(self.levels) - 1)]
+        first = low // level.blockSize
+        last = (high - 1) // level.blockSize + 1
+        minIndices = level.minIndices[first:last]
+        maxIndices = level.maxIndices[first:last]
+
+        # Draw the minimum and maximum of each block in the order they occur
+        indices = np.empty(2 * len(minIndices), dtype=np.int64)
+        indices[0::2] = np.minimum(minIndices, maxIndices)
+        indices[1::2] = np.maximum(minIndices, maxIndices)
+        return self.times[indices], self.voltages[indices]
+
+    def rangeMinMax(self, low: int, high: int) -> tuple[float, float] | None:
+        """Smallest and largest voltage of samples low up to high. The
+        range is split into the largest aligned blocks that fit, at most
+        two per level, so this takes O(log n) instead of a scan.
+        :param low: index of the first sample
+        :param high: one past the index of the last sample
+        :returns: None if the range is empty
+        """
+        if high <= low:
+            return None
+        # Samples outside whole blocks of the first level are read directly
+        first = -(-low // BASE_BLOCK)
+        last = high // BASE_BLOCK
+        if not self.levels or first >= last:
+            values = np.asarray(self.voltages[low:high])
+            return float(values.min()), float(values.max())
+        minimum = np.inf
+        maximum = -np.inf
+        for edge in (self.voltages[low : first * BASE_BLOCK], self.voltages[last * BASE_BLOCK : high]):
+            if len(edge):
+                minimum = min(minimum, float(np.min(edge)))
+                maximum = max(maximum, float(np.max(edge)))
+
+        # Blocks first up to last of a level, using the blocks that do not
+        # pair up with a neighbour before moving on to the next level
+        for level in self.levels:
+            if first >= last:
+                break
+            if first % LEVEL_FACTOR:
+                end = min(first + LEVEL_FACTOR - first % LEVEL_FACTOR, last)
+                minimum = min(minimum, float(level.minValues[first:end].min()))
+                maximum = max(maximum, float(level.maxValues[first:end].max()))
+                first = end
+            if last % LEVEL_FACTOR and first < last:
+                start = max(last - last % LEVEL_FACTOR, first)
+                minimum = min(minimum, float(level.minValues[start:last].min()))
+                maximum = max(maximum, float(level.maxValues[start:last].max()))
+                last = start
+            first //= LEVEL_FACTOR
+            last //= LEVEL_FACTOR
+        return minimum, maximum
+
+    def voltageRange(self) -> tuple[float, float]:
+        """Smallest and largest voltage of the whole channel"""
+        if not self.levels:
+            return float(np.min(self.voltages)), float(np.max(self.voltages))
+        top = self.levels[-1]
+        return float(top.minValues.min()), float(top.maxValues.max())
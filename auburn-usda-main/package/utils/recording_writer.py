@@ -0,0 +1,306 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from package.utils.data_classes import DataArrays
+from package.utils.enums import FsyncPolicy
+from package.utils.session_file import SessionWriter, timesBlock, voltagesBlock
+
+FLUSH_INTERVAL = 0.5  # seconds between writes of the buffered samples
+FLUSH_SAMPLES = 65536  # samples buffered before they are written sooner
+SPARE_BUFFERS = 2  # written buffers kept for reuse
+
+
+def formatDataRows(data: DataArrays) -> str:
+    """Formats samples as rows of the recording file with a single string
+    formatting operation
+    :returns: one 'time,DATA,voltage,channel' row per sample
+    """
+    values = np.column_stack((data.times, data.voltages, data.channels)).ravel()
+    return ("%.4f,DATA,%.4f,%d\n" * len(data)) % tuple(values.tolist())
+
+
+class SampleBuffer:
+    """Preallocated arrays that samples are copied into until they are
+    written, then reused"""
+
+    def __init__(self, capacity: int):
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.voltages = np.empty(capacity, dtype=np.float64)
+        self.channels = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        self.firstAppended = 0  # time.perf_counter() of the oldest sample
+
+    def free(self) -> int:
+        return len(self.times) - self.size
+
+    def append(self, data: DataArrays, start: int) -> int:
+        """Copies samples from start until the buffer is full
+        :returns: number of samples copied
+        """
+        if self.size == 0:
+            self.firstAppended = time.perf_counter()
+        count = min(len(data) - start, self.free())
+        end = self.size + count
+        self.times[self.size : end] = data.times[start : start + count]
+        self.voltages[self.size : end] = data.voltages[start : start + count]
+        self.channels[self.size : end] = data.channels[start : start + count]
+        self.size = end
+        return count
+
+    def data(self) -> DataArrays:
+        return DataArrays(self.times[: self.size], self.voltages[: self.size], self.channels[: self.size])
+
+
+class RecordingWriter:
+    """Writes a live recording to its csv file on a background thread.
+    Samples are copied into preallocated buffers, and the thread formats and
+    writes them a buffer at a time, every flushInterval seconds or as soon
+    as flushSamples samples are waiting, so saving costs the acquisition
+    thread a copy instead of a write. Other rows, such as PAUSE, are written
+    in the order they were added among the samples.
+
+    How often the file is forced to disk depends on the FsyncPolicy:
+    - NONE leaves it to the operating system.
+    - PERIODIC syncs after every write.
+    - ON_PAUSE syncs when the recording is saved by flush, on pause and
+      when it is closed.
+
+    If given a SessionWriter, the samples are also written to a session
+    file, with paused portions that are not kept removed as processData
+    removes them from the csv, so the session file is ready once the
+    writer is closed.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        fsyncPolicy: FsyncPolicy = FsyncPolicy.ON_PAUSE,
+        flushInterval: float = FLUSH_INTERVAL,
+        flushSamples: int = FLUSH_SAMPLES,
+        session: SessionWriter = None,
+    ):
+        """
+        :param filename: csv file the recording is written to
+        :param fsyncPolicy: when the file is forced to disk
+        :param flushInterval: most seconds samples wait to be written
+        :param flushSamples: samples per buffer, written once full
+        :param session: session file the recording is also written to
+        """
+        self.filename = filename
+        self.fsyncPolicy = fsyncPolicy
+        self.flushInterval = flushInterval
+        self.flushSamples = flushSamples
+        self.file = open(filename, "w")
+        self.session = session
+        # Samples in the session file when the last pause and resume rows
+        # were written, and the pause event they make up
+        self.pauseMark = {}
+        self.resumeMark = {}
+        self.pauseEvent = None
+
+        self.condition = threading.Condition()
+        self.active = SampleBuffer(flushSamples)
+        self.spare = [SampleBuffer(flushSamples)]
+        # Full buffers and other rows waiting to be written, in order
+        self.pending = deque()
+        self.flushRequested = 0
+        self.flushCompleted = 0
+        self.syncRequested = False
+        self.closing = False
+
+        # Metrics
+        self.appended = 0
+        self.written = 0
+        self.maxLatency = 0  # seconds from a sample being added to being written
+        self.bytesWritten = 0
+
+        # Not a daemon, so the interpreter waits for buffered samples to be
+        # written before it exits
+        self.thread = threading.Thread(target=self.run, name="RecordingWriter")
+        self.thread.start()
+
+    def append(self, data: DataArrays):
+        """Adds samples to be written"""
+        with self.condition:
+            start = 0
+            while start < len(data):
+                start += self.active.append(data, start)
+                if self.active.free() == 0:
+                    self.seal()
+                    self.condition.notify()
+            self.appended += len(data)
+
+    def writeEvent(self, row: str):
+        """Adds a row that is not a sample, written after every sample added
+        so far
+        :param row: complete row, ending with a line break
+        """
+        with self.condition:
+            self.seal()
+            self.pending.append(row)
+
+    def seal(self):
+        """Queues the active buffer for writing and starts filling a spare
+        one. Called with the condition held."""
+        if self.active.size == 0:
+            return
+        self.pending.append(self.active)
+        self.active = self.spare.pop() if self.spare else SampleBuffer(self.flushSamples)
+
+    def flush(self):
+        """Writes everything added so far and waits until it is written. The
+        file is synced to disk unless the policy is NONE."""
+        with self.condition:
+            self.seal()
+            self.flushRequested += 1
+            request = self.flushRequested
+            self.syncRequested = self.syncRequested or self.fsyncPolicy != FsyncPolicy.NONE
+            self.condition.notify()
+            # Stop waiting if the thread has died, as nothing would be written
+            while not self.condition.wait_for(
+                lambda: self.flushCompleted >= request, timeout=self.flushInterval
+            ):
+                if not self.thread.is_alive():
+                    logging.error("Writer of " + self.filename + " has stopped, samples were not written.")
+                    return
+
+    def close(self):
+        """Writes every remaining sample and row, then closes the file and
+        completes the session file"""
+        self.flush()
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.thread.join()
+        self.file.close()
+        if self.session is not None:
+            try:
+                self.session.close()
+            except OSError as error:
+                logging.error("Unable to write " + self.session.filepath + ", " + str(error))
+                self.session.discard()
+
+    def recordSessionEvent(self, row: str):
+        """Applies a PAUSE, RESUME or SAVE row to the session file. When the
+        paused portion is not saved, its samples are removed and the samples
+        read until the SAVE row are moved back by the time paused.
+        :param row: row written to the csv file
+        """
+        values = row.strip().split(",")
+        if values[1] in ("RESUME", "SAVE") and self.pauseEvent is None:
+            logging.warning("Ignoring " + values[1] + " without a PAUSE before it in " + self.session.filepath)
+            return
+        match values[1]:
+            case "PAUSE":
+                self.pauseMark = self.session.mark()
+                self.pauseEvent = {"type": "PAUSE", "time": float(values[0])}
+            case "RESUME":
+                self.resumeMark = self.session.mark()
+                self.pauseEvent["duration"] = float(values[2])
+            case "SAVE":
+                self.pauseEvent["saved"] = values[2] == "T"
+                self.session.events.append(self.pauseEvent)
+                if not self.pauseEvent["saved"]:
+                    resumed = self.session.truncate(self.resumeMark)
+                    self.session.truncate(self.pauseMark)
+                    for channel in self.session.channels:
+                        times = resumed.get(timesBlock(channel), [])
+                        if len(times):
+                            self.session.appendChannel(
+                                channel,
+                                times - self.pauseEvent["duration"],
+                                resumed[voltagesBlock(channel)],
+                            )
+                self.pauseEvent = None
+
+    def updateSession(self, item: str | DataArrays):
+        """Writes samples or applies a row to the session file. The session
+        file is given up on if that fails, without stopping the csv file
+        from being written.
+        :param item: samples, or a row written to the csv file
+        """
+        if self.session is None:
+            return
+        try:
+            if isinstance(item, str):
+                self.recordSessionEvent(item)
+            else:
+                self.session.append(item)
+        except Exception:
+            logging.exception("Unable to write " + self.session.filepath + ", it is discarded.")
+            try:
+                self.session.discard()
+            except OSError:
+                pass
+            self.session = None
+
+    def takeMetrics(self) -> tuple[float, int]:
+        """Returns the longest time a sample waited to be written since the
+        last call, in seconds, and the number of samples not written yet"""
+        with self.condition:
+            maxLatency = self.maxLatency
+            self.maxLatency = 0
+            return maxLatency, self.appended - self.written
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.pending or self.flushRequested > self.flushCompleted or self.closing,
+                    timeout=self.flushInterval,
+                )
+                # Samples are written at least every flushInterval
+                self.seal()
+                items = list(self.pending)
+                self.pending.clear()
+                request = self.flushRequested
+                sync = self.syncRequested or (
+                    self.fsyncPolicy == FsyncPolicy.PERIODIC and len(items) > 0
+                )
+                self.syncRequested = False
+                closing = self.closing
+
+            samples = 0
+            oldest = None
+            try:
+                for item in items:
+                    if isinstance(item, str):
+                        text = item
+                        self.updateSession(item)
+                    else:
+                        data = item.data()
+                        text = formatDataRows(data)
+                        self.updateSession(data)
+                        samples += item.size
+                        oldest = item.firstAppended if oldest is None else oldest
+                    self.file.write(text)
+                    self.bytesWritten += len(text)
+                if items or sync:
+                    self.file.flush()
+                if sync:
+                    os.fsync(self.file.fileno())
+            except (OSError, ValueError) as error:
+                logging.error("Unable to write to " + self.filename + ", " + str(error))
+            except Exception:
+                logging.exception("Unable to write to " + self.filename)
+            finally:
+                # Always completed, so that flush and close never wait on
+                # items that failed
+                latency = time.perf_counter() - oldest if oldest is not None else 0
+                with self.condition:
+                    for item in items:
+                        # Buffers added to keep up with a burst are let go
+                        if not isinstance(item, str) and len(self.spare) < SPARE_BUFFERS:
+                            item.size = 0
+                            self.spare.append(item)
+                    self.written += samples
+                    self.maxLatency = max(self.maxLatency, latency)
+                    self.flushCompleted = request
+                    self.condition.notify_all()
+            if closing:
+                return
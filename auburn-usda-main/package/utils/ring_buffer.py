@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of the most recent samples of a live channel.
+    Every sample is written twice, capacity apart, so the buffered samples
+    can always be read as one contiguous view instead of a copy. Appending
+    only writes the new samples, however long the recording gets.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        :param capacity: number of most recent samples kept
+        """
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self._times = np.empty(2 * capacity, dtype=np.float64)
+        self._voltages = np.empty(2 * capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def times(self) -> np.ndarray:
+        """View of the buffered sample times, oldest first"""
+        return self._times[self.start : self.start + self.size]
+
+    @property
+    def voltages(self) -> np.ndarray:
+        """View of the buffered sample voltages, oldest first"""
+        return self._voltages[self.start : self.start + self.size]
+
+    def append(self, times: np.ndarray, voltages: np.ndarray):
+        """Adds samples, dropping the oldest ones once the buffer is full
+        :param times: sample times in seconds
+        :param voltages: sample voltages
+        """
+        if len(times) >= self.capacity:
+            times = times[-self.capacity :]
+            voltages = voltages[-self.capacity :]
+            self.start = 0
+            self.size = 0
+        count = len(times)
+        end = (self.start + self.size) % self.capacity
+        first = min(count, self.capacity - end)
+        for buffer, values in ((self._times, times), (self._voltages, voltages)):
+            for offset in (0, self.capacity):
+                buffer[offset + end : offset + end + first] = values[:first]
+                buffer[offset : offset + count - first] = values[first:]
+
+        self.size += count
+        if self.size > self.capacity:
+            self.start = (self.start + self.size - self.capacity) % self.capacity
+            self.size = self.capacity
+
+    def dropNewest(self, count: int):
+        """Removes the newest samples
+        :param count: number of samples to remove
+        """
+        self.size = max(self.size - count, 0)
@@ -3,49 +3,129 @@ import os
 import time
 
 import pandas as pd
-from PySide6.QtCore import QObject, Qt, Signal, Slot
-from PySide6.QtSerialPort import QSerialPort, QSerialPortInfo
+from PySide6.QtCore import QObject, Qt, QThread, QTimer, Signal, Slot
+from PySide6.QtSerialPort import QSerialPortInfo
 from PySide6.QtWidgets import QMessageBox, QProgressDialog
 
-from package.utils.data_classes import Annotation, DataPoint
-from package.utils.enums import AnnotationType
+from package.utils.acquisition_worker import AcquisitionWorker, SampleQueue
+from package.utils.data_classes import Annotation, DataArrays, EPGParameters
+from package.utils.enums import AnnotationType, FsyncPolicy
 from package.utils.utils import formatEpochTimeToClockTime, formatEpochTimeToDuration
 
+DRAIN_INTERVAL = 20  # ms between drains of the sample queue
+QUEUE_REPORT_INTERVAL = 1  # seconds between reports of the sample queue
+
 
 class SerialData(QObject):
-    """Reads live serial data from EPG device"""
+    """Reads live serial data from EPG device. Serial reads, parsing and
+    writing to file happen on an acquisition thread, see AcquisitionWorker,
+    and the samples read are drained from a SampleQueue on a timer of the
+    GUI thread.
+    """
 
     ready = Signal()
-    progress = Signal(DataPoint)
+    progress = Signal(DataArrays)
     finished = Signal()
     processed = Signal(str)  # filenames
     resumed = Signal(
-        bool, list, float
+        bool, DataArrays, float
     )  # Save recording?, buffer, pause duration
     paused = Signal()
     startTime = Signal(float)
     addAnnotation = Signal(Annotation)
     addVerticalLine = Signal(float)  # x value, color
+    queueMetrics = Signal(int, int)  # most blocks waiting, blocks dropped
+    writerMetrics = Signal(float, int)  # longest wait to be written in seconds, samples not written
+
+    # Requests to the acquisition thread. They wait for it to finish so
+    # that rows are written in order and the file is complete on return.
+    setUpRequested = Signal(str, int, bool)  # port name, sample rate, binary framing
+    startRequested = Signal(float, float)  # start time, total time paused
+    discardPauseRequested = Signal(float)  # total time paused
+    paramRequested = Signal(str)
+    epgParametersChanged = Signal(object)  # EPGParameters
+    stopRequested = Signal()
+    createFileRequested = Signal(str, int)  # filename, fsync policy
+    eventRequested = Signal(str)
+    saveRequested = Signal()
+    closeFileRequested = Signal()
 
     def __init__(self):
         super().__init__()
         self.serialData = None
         self.isPlaying = False
         self.isPaused = False
-        self.file = None
         self.filename = ""
 
         self.buffer = []
         self.waitingForUserInput = False
+        # Default parameters sent to the EPG during initialization
+        self.epgParameters = EPGParameters(
+            inputResistance=100000,
+            amplifierGain=0,
+            dcBias=1,
+            excitationAmplitude=0,
+            excitationFrequency=1000,
+        )
 
         # Time management
         self.started = 0
         self.ended = 0
         self.sampleRate = 100 # samples per second, Hz
-        self.elapsedTime = 0  # in seconds
+        # Ask the EPG to send binary frames instead of ASCII lines, which
+        # it only does if its firmware supports them
+        self.binaryFraming = False
+        # When the recording file is forced to disk
+        self.fsyncPolicy = FsyncPolicy.ON_PAUSE
         self.timeWhenPaused = 0  # in seconds
         self.totalTimePaused = 0
 
+        # Acquisition thread and the queue it hands samples over in
+        self.queue = SampleQueue()
+        self.worker = AcquisitionWorker(self.queue)
+        self.acquisitionThread = QThread()
+        self.worker.moveToThread(self.acquisitionThread)
+        self.worker.ready.connect(self.ready)
+        blocking = Qt.ConnectionType.BlockingQueuedConnection
+        self.setUpRequested.connect(self.worker.setUpSerial, blocking)
+        self.startRequested.connect(self.worker.startReadingData, blocking)
+        self.discardPauseRequested.connect(self.worker.discardPause, blocking)
+        self.paramRequested.connect(self.worker.sendParam, blocking)
+        self.epgParametersChanged.connect(self.worker.setEpgParameters, blocking)
+        self.stopRequested.connect(self.worker.stopReadingData, blocking)
+        self.createFileRequested.connect(self.worker.createFile, blocking)
+        self.eventRequested.connect(self.worker.writeEvent, blocking)
+        self.saveRequested.connect(self.worker.saveFile, blocking)
+        self.closeFileRequested.connect(self.worker.closeFile, blocking)
+        self.acquisitionThread.start()
+
+        self.lastQueueReport = time.time()
+        self.reportedOverflows = 0
+        self.drainTimer = QTimer(self)
+        self.drainTimer.timeout.connect(self.drainQueue)
+        self.drainTimer.start(DRAIN_INTERVAL)
+
+    @property
+    def elapsedTime(self) -> float:
+        """Time of the last sample read, in seconds"""
+        return self.worker.elapsedTime
+
+    @property
+    def file(self):
+        """Writer of the file the recording is saved to, fed by the
+        acquisition thread"""
+        return self.worker.writer
+
+    def shutdown(self):
+        """Stops the acquisition thread, first saving the recording if one
+        is still open so that no buffered samples are lost"""
+        if self.worker.writer is not None:
+            self.stopRequested.emit()
+            self.closeFile()
+        self.drainTimer.stop()
+        self.acquisitionThread.quit()
+        self.acquisitionThread.wait()
+
     """ 
     Serial port-related functions
     """
@@ -76,74 +156,9 @@ class SerialData(QObject):
             self.finished.emit()
             return -1
 
-        # Set up serial port for reading
-        self.serial = QSerialPort()
-        self.serial.setPortName(portName)
-        self.serial.setBaudRate(
-            QSerialPort.BaudRate.Baud9600, QSerialPort.Direction.Input
-        )
-
-        # Wait for EPG to be ready before streaming data
-        if (not self.serial.open(QSerialPort.OpenModeFlag.ReadWrite)):
-                print("Unable to open serial port")
-                logging.error("Unable to open serial port.")
-                return 
-        
-        # Wait for response from EPG
-        self.serial.readyRead.connect(lambda message = "INIT":self.waitForMessageFromEPG(message), Qt.ConnectionType.UniqueConnection)
-
-        # To test without dealing with EPG setup, comment out everything after
-        # the line that says wait for EPG to be ready before streaming data.
-        # Also upload code in resources/teensy_code/noInitialization to Teensy
-
-        self.ready.emit()
-        self.serial.readyRead.connect(self.readData)
-
-    @Slot(str)
-    def waitForMessageFromEPG(self, message: str):
-        """Waits until serial data matching specific message can be read.
-        param message: message that should be waited for before proceeding
-        to next step of initialization
-
-        :param message: message that should be waited for
-        """
-        while self.serial.canReadLine():
-            data = str(self.serial.readLine().data(), "utf-8").strip()
-            label = data.split(",")[0]
-            if label != message:
-                return
-
-            match label:
-                case "INIT":
-                    logging.info("INIT message received  - teensy initialization is complete.")
-                    logging.info("Sending BEGIN message...")
-                    self.serial.readyRead.disconnect()
-                    self.serial.readyRead.connect(
-                        lambda message="BEGIN": self.waitForMessageFromEPG(message)
-                    )
-                    self.serial.flush()
-                    self.serial.readAll()
-                    self.serial.write(bytes(f"BEGIN,{self.sampleRate}\n".encode()))
-                    break
-                case "BEGIN":
-                    logging.info("BEGIN message received - teensy is ready to read parameters.")
-                    logging.info("Sending default parameters, Ri = 100000, Gain = 0, Bias = 0, Freq = 100, Amp = 0.")
-                    self.serial.readyRead.disconnect()
-                    self.serial.readyRead.connect(
-                        lambda message="PARAM": self.waitForMessageFromEPG(message)
-                    )
-                    # PARAM, channel #, input resistance, amplifier gain, DC bias, excitation frequency, excitation amplitude
-                    self.serial.write(bytes("PARAM,1,100000,0,1,1000,0\n".encode()))
-                    break
-                case "PARAM":
-                    logging.info("Default parameter values are set, ready to record.")
-                    self.serial.readyRead.disconnect()
-                    self.serial.readyRead.connect(
-                        self.readData, Qt.ConnectionType.UniqueConnection
-                    )
-                    self.serial.close()
-                    self.ready.emit()
-                    break
+        # The port is opened and the handshake with the EPG is done on the
+        # acquisition thread
+        self.setUpRequested.emit(portName, self.sampleRate, self.binaryFraming)
 
     def startReadingData(self):
         """Opens serial port and reads data when available"""
@@ -154,49 +169,43 @@ class SerialData(QObject):
         if self.started == 0:
             self.started = time.time()
             self.startTime.emit(self.started)
-            if not self.serial.open(QSerialPort.OpenModeFlag.ReadWrite):
-                logging.error("Unable to open serial port.")
+            self.startRequested.emit(self.started, self.totalTimePaused)
 
         # If resuming from a paused recording
         if self.isPaused:
             # Add amount of time that the recording was paused
             timePausedFor = time.time() - self.timeWhenPaused
-            self.file.write(f"{self.elapsedTime},RESUME,{timePausedFor:.4f}\n")
+            self.eventRequested.emit(f"RESUME,{timePausedFor:.4f}")
             self.promptSavePaused(timePausedFor)
 
         self.isPlaying = True
         self.isPaused = False
 
     @Slot()
-    def readData(self):
-        """Given output in the form of 'O, pre-rect voltage, post-rect voltage',
-        displays on visualizer and saves to file
-        :param data: bytes representing voltage data
+    def drainQueue(self):
+        """Takes the blocks of samples read by the acquisition thread since
+        the last drain and displays them with one signal. While the user is
+        deciding whether to keep a paused portion, samples are stored in a
+        buffer instead.
         """
-
-        while self.serial.canReadLine():
-            data = str(self.serial.readLine(), "utf-8").strip().split(",")
-            label = data[0]
-            if label == "O":
-                self.elapsedTime = round(
-                    time.time() - self.totalTimePaused - self.started, 4
-                )
-                voltage = data[1]
-                channel = 0 # Placeholder value
-                point = DataPoint(self.elapsedTime, voltage, channel)
-                row = f"{point.time:.4f},DATA,{point.voltage:.4f},{channel}\n"
-                # If user is deciding where to save paused data or not
-                # store incoming data points into buffer
-                if self.waitingForUserInput:
-                    self.buffer.append(point)
-                else:
-                    self.progress.emit([point])
-                self.file.write(row)
-            elif label == "PARAM": # The Teensy writes back if it reads a parameter change request
-                logging.info("Change in parameters registered by Teensy, " + data)
+        blocks = self.queue.drain()
+        if blocks:
+            # If user is deciding where to save paused data or not
+            # store incoming data points into buffer
+            if self.waitingForUserInput:
+                self.buffer.extend(blocks)
             else:
-                print("Error in parsing")
-                logging.error("Unable to parse the received data, " + data)
+                self.progress.emit(DataArrays.concatenate(blocks))
+
+        now = time.time()
+        if now - self.lastQueueReport >= QUEUE_REPORT_INTERVAL:
+            overflows = self.queue.overflows
+            self.queueMetrics.emit(self.queue.takeMaxDepth(), overflows - self.reportedOverflows)
+            self.reportedOverflows = overflows
+            self.lastQueueReport = now
+            writer = self.worker.writer
+            if writer is not None:
+                self.writerMetrics.emit(*writer.takeMetrics())
 
     def pauseData(self):
         """Pauses serial data acquisition"""
@@ -204,12 +213,11 @@ class SerialData(QObject):
             return
         self.paused.emit()
 
-        elapsedTime = self.elapsedTime
         self.timeWhenPaused = time.time()
 
         logging.info("Recording is paused.")
 
-        self.file.write(f"{elapsedTime:.4f},PAUSE\n")
+        self.eventRequested.emit("PAUSE")
         self.saveFile()
 
         self.isPaused = True
@@ -224,23 +232,22 @@ class SerialData(QObject):
             # If recording is paused when user ends the session,
             # ask user whether they want to keep the paused portion or not
             timePausedFor = self.ended - self.timeWhenPaused
-            self.file.write(f"{self.elapsedTime},RESUME,{timePausedFor:.4f}\n")
+            self.eventRequested.emit(f"RESUME,{timePausedFor:.4f}")
             self.promptSavePaused(timePausedFor)
 
+        # Samples that arrived before the port is closed are still saved
+        self.stopRequested.emit()
+        self.drainQueue()
         totalTime = self.elapsedTime + self.totalTimePaused
         #print("Stopping serial communication and closing file...")
         logging.info("Recording has stopped. Saving recording...")
         self.finished.emit()
-        text = f"{self.elapsedTime:.4f},END,Total elapsed time in hh:mm:ss: {formatEpochTimeToDuration(self.elapsedTime)}. Total recording time including time paused: {formatEpochTimeToDuration(totalTime)}. Computer clock says it has been {formatEpochTimeToDuration(self.ended - self.started)}\n"
-
-        self.file.write(text)
+        text = f"END,Total elapsed time in hh:mm:ss: {formatEpochTimeToDuration(self.elapsedTime)}. Total recording time including time paused: {formatEpochTimeToDuration(totalTime)}. Computer clock says it has been {formatEpochTimeToDuration(self.ended - self.started)}"
 
-        self.saveFile()
+        self.eventRequested.emit(text)
         self.closeFile()
-        self.serial.close()
 
         # Reset time
-        self.elapsedTime = 0
         self.timeWhenPaused = 0
         self.totalTimePaused = 0
         self.started = 0
@@ -282,6 +289,8 @@ class SerialData(QObject):
         df.timestamp.round(4)
         outputFile = os.path.splitext(self.filename)[0]
         pd.DataFrame(df).to_csv(outputFile + "_processed.csv", index=False)
+        # The session file of the processed recording was written while
+        # recording, see RecordingWriter
         progressDialog.setValue(len(pauses))
 
         # Prompt user whether they want to view recording in
@@ -302,22 +311,21 @@ class SerialData(QObject):
         port to update configurations on the hardware side.
         :param param: string representing parameters to change
         """
-        isOpen = self.serial.isOpen()
-        if not isOpen:
-            if not self.serial.open(QSerialPort.OpenModeFlag.ReadWrite):
-                print("Couldn't open port")
-                logging.error("Serial port is not open, unable to send to parameters.")
-                #TODO: report attempted values, and the original value
-                return 
-        self.serial.write(bytes(param.encode()))
+        self.paramRequested.emit(param)
         parts = param.strip().split(',')
         output_vector = [int(float(parts[2])), float(parts[3]), float(parts[4]), int(float(parts[5])), float(parts[6])]
+        self.epgParameters = EPGParameters(
+            inputResistance=output_vector[0],
+            amplifierGain=output_vector[1],
+            dcBias=output_vector[2],
+            excitationAmplitude=output_vector[4],
+            excitationFrequency=output_vector[3],
+        )
+        self.epgParametersChanged.emit(self.epgParameters)
         # PARAM, channel #, input resistance, amplifier gain, DC bias, excitation frequency, excitation amplitude
         logging.info("Updating parameters, Ri: "+str(output_vector[0])+", Gain: "+str(output_vector[1])+", Bias: "+str(output_vector[2])+", Freq: "+str(output_vector[3])
                      +", Amp: "+str(output_vector[4])+".")
         #TODO: ADD UNITS; check for error/confirmation - what are some possible feedback from engineers
-        if not isOpen:
-            self.serial.close()
 
     def promptSavePaused(self, timePausedFor):
         """Show message box that asks user whether or not to keep the
@@ -342,8 +350,8 @@ class SerialData(QObject):
 
         if answer == QMessageBox.StandardButton.Yes:
             # No annotation to save, save paused portion
-            self.file.write(f"{self.elapsedTime},SAVE,T\n")
-            self.resumed.emit(True, self.buffer, timePausedFor)
+            self.eventRequested.emit("SAVE,T")
+            self.resumed.emit(True, DataArrays.concatenate(self.buffer), timePausedFor)
             self.buffer = []
             self.waitingForUserInput = False
             logging.info("Paused portion is saved, and recording is resumed.")
@@ -351,20 +359,16 @@ class SerialData(QObject):
             # Get elapsed time when recording was paused
             timeStart = self.timeWhenPaused - self.totalTimePaused - self.started
             self.totalTimePaused += timePausedFor
+            # The row and the new offset are set together, so no sample is
+            # read in between with the old offset
+            self.discardPauseRequested.emit(self.totalTimePaused)
 
             duration = 0
-            self.file.write(f"{self.elapsedTime},SAVE,F\n")
             logging.info("Paused portion is not saved, and recording is resumed.")
             # Edit times of points in buffer to account for paused portion
             # being removed
-            buffer = list(
-                map(
-                    lambda point: DataPoint(
-                        point.time - timePausedFor, point.voltage, point.channel
-                    ),
-                    self.buffer,
-                )
-            )
+            buffer = DataArrays.concatenate(self.buffer)
+            buffer.times = buffer.times - timePausedFor
             self.resumed.emit(False, buffer, timePausedFor)
             self.buffer = []
             self.waitingForUserInput = False
@@ -388,15 +392,16 @@ class SerialData(QObject):
         """Creates a new csv file where data is stored"""
         #print("Saving data in " + name)
         logging.info("Recording starts and will be saved to"+name)
-        self.file = open(name, "w")
+        self.epgParametersChanged.emit(self.epgParameters)
+        self.createFileRequested.emit(name, self.fsyncPolicy.value)
         self.filename = name
 
     def saveFile(self):
-        """Saves data by flushing out data in memory"""
-        self.file.flush()
+        """Saves data by writing out every sample so far"""
+        self.saveRequested.emit()
 
     def closeFile(self):
-        """Closes current file that EPG data is saved to"""
-        self.file.close()      
-        self.file = None
-        logging.info("Recording is saved.")
\ No newline at end of file
+        """Closes current file that EPG data is saved to, once every sample
+        has been written"""
+        self.closeFileRequested.emit()
+        logging.info("Recording is saved.")
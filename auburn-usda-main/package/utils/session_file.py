@@ -0,0 +1,339 @@
+"""Binary session files (.epgs)
+
+A session file starts with a fixed preamble (magic, format version and
+header length), followed by a JSON header and then the sample blocks. The
+header holds the sample rate, channel list, EPG parameters and pause/resume
+events, and describes every block by dtype, shape and offset. Blocks are
+64-byte aligned so that readers can memory map each of them directly.
+"""
+
+import dataclasses
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+
+from package.utils.data_classes import DataArrays, EPGParameters
+from package.utils.demux import demultiplex
+from package.utils.file_reader import anaReadArrays, csvReadArrays
+
+SESSION_EXTENSION = ".epgs"
+SESSION_MAGIC = b"EPGSESS\x00"
+SESSION_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")  # magic, version, header length
+BLOCK_ALIGNMENT = 64
+TIME_DTYPE = np.dtype("<f8")
+VOLTAGE_DTYPE = np.dtype("<f8")
+
+
+def _align(offset: int) -> int:
+    """Rounds offset up to the next block boundary"""
+    return -(-offset // BLOCK_ALIGNMENT) * BLOCK_ALIGNMENT
+
+
+def timesBlock(channel: int) -> str:
+    """Name of the block holding the sample times of a channel"""
+    return f"{channel}/times"
+
+
+def voltagesBlock(channel: int) -> str:
+    """Name of the block holding the sample voltages of a channel"""
+    return f"{channel}/voltages"
+
+
+def estimateSampleRate(times: np.ndarray) -> float:
+    """Estimates the sample rate of a channel from its sample times
+    :param times: sorted sample times in seconds
+    :returns: samples per second, or 0 if it cannot be estimated
+    """
+    if len(times) < 2:
+        return 0
+    step = float(np.median(np.diff(times[:10000])))
+    return round(1 / step, 4) if step > 0 else 0
+
+
+class Session:
+    """Session file opened for reading. Sample blocks are memory mapped, so
+    opening is instant and only the pages that are accessed are read.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        # Blocks are mapped from this handle, so that they can still be
+        # opened if the file is replaced or removed, e.g. by cache eviction
+        self.file = open(filepath, "rb")
+        magic, version, headerLength = PREAMBLE.unpack(self.file.read(PREAMBLE.size))
+        if magic != SESSION_MAGIC:
+            self.file.close()
+            raise ValueError(f"{filepath} is not an EPG session file")
+        if version > SESSION_VERSION:
+            self.file.close()
+            raise ValueError(
+                f"{filepath} uses session format {version}, only up to {SESSION_VERSION} is supported"
+            )
+        self.header = json.loads(self.file.read(headerLength))
+
+        self.dataOffset = _align(PREAMBLE.size + headerLength)
+        self.sampleRate = self.header["sampleRate"]
+        self.channels = self.header["channels"]
+        self.events = self.header["events"]
+        parameters = self.header["epgParameters"]
+        self.epgParameters = EPGParameters(**parameters) if parameters else None
+
+    def close(self):
+        """Closes the file. Blocks that were already mapped stay readable."""
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def hasBlock(self, name: str) -> bool:
+        return name in self.header["blocks"]
+
+    def block(self, name: str) -> np.ndarray:
+        """Memory maps a block of the session file
+        :param name: name of the block
+        :returns: read-only array backed by the file
+        """
+        block = self.header["blocks"][name]
+        dtype = np.dtype(block["dtype"])
+        shape = tuple(block["shape"])
+        if 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(
+            self.file,
+            dtype=dtype,
+            mode="r",
+            offset=self.dataOffset + block["offset"],
+            shape=shape,
+        )
+
+    def channelData(self, channel: int) -> DataArrays:
+        """Returns the samples of one channel without reading them into memory
+        :param channel: channel number as listed in channels
+        """
+        times = self.block(timesBlock(channel))
+        return DataArrays(
+            times=times,
+            voltages=self.block(voltagesBlock(channel)),
+            channels=np.broadcast_to(np.int64(channel), times.shape),
+        )
+
+    def readRange(self, channel: int, start: float, end: float) -> DataArrays:
+        """Returns the samples of a channel within a time range, without
+        reading them into memory
+        :param channel: channel number as listed in channels
+        :param start: first time to include in seconds
+        :param end: last time to include in seconds
+        :returns: samples with start <= time <= end
+        """
+        data = self.channelData(channel)
+        low = np.searchsorted(data.times, start, side="left")
+        high = np.searchsorted(data.times, end, side="right")
+        return data[low:high]
+
+
+def readSession(filepath: str) -> Session:
+    """Opens a session file for reading
+    :param filepath: path of the .epgs file
+    :returns: Session whose channel data is memory mapped
+    """
+    return Session(filepath)
+
+
+class SessionWriter:
+    """Writes a session file incrementally. Samples are appended per channel
+    to spill files next to the destination, which are assembled into the
+    final file when the writer is closed.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        sampleRate: float = 0,
+        epgParameters: EPGParameters = None,
+    ):
+        self.filepath = filepath
+        self.sampleRate = sampleRate
+        self.epgParameters = epgParameters
+        self.channels = []
+        self.events = []
+        self.extraBlocks = {}
+        self.spills = {}  # block name -> [file, dtype, count]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _spill(self, name: str, dtype: np.dtype):
+        if name not in self.spills:
+            spillFile = open(f"{self.filepath}.{name.replace('/', '.')}.tmp", "w+b")
+            self.spills[name] = [spillFile, dtype, 0]
+        return self.spills[name]
+
+    def append(self, data: DataArrays):
+        """Appends samples, which may belong to several channels
+        :param data: samples to append, in time order per channel
+        """
+        for channel, subset in zip(*demultiplex(data)):
+            self.appendChannel(channel, subset.times, subset.voltages)
+
+    def appendChannel(self, channel: int, times: np.ndarray, voltages: np.ndarray):
+        """Appends samples that all belong to one channel
+        :param channel: channel number
+        :param times: sample times in seconds
+        :param voltages: sample voltages
+        """
+        if channel not in self.channels:
+            self.channels.append(channel)
+        for name, values, dtype in (
+            (timesBlock(channel), times, TIME_DTYPE),
+            (voltagesBlock(channel), voltages, VOLTAGE_DTYPE),
+        ):
+            spill = self._spill(name, dtype)
+            spill[0].write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            spill[2] += len(values)
+
+    def mark(self) -> dict[str, int]:
+        """Number of values appended to each block so far, see truncate"""
+        return {name: spill[2] for name, spill in self.spills.items()}
+
+    def truncate(self, mark: dict[str, int]) -> dict[str, np.ndarray]:
+        """Removes the values appended since mark was taken
+        :param mark: number of values to keep in each block, from mark
+        :returns: values removed from each block
+        """
+        removed = {}
+        for name, spill in self.spills.items():
+            spillFile, dtype, count = spill
+            kept = mark.get(name, 0)
+            spillFile.seek(kept * dtype.itemsize)
+            removed[name] = np.frombuffer(spillFile.read(), dtype=dtype)
+            spillFile.seek(kept * dtype.itemsize)
+            spillFile.truncate()
+            spill[2] = kept
+        return removed
+
+    def addBlock(self, name: str, values: np.ndarray):
+        """Stores an additional named array in the session file
+        :param name: block name, unique within the file
+        :param values: array to store
+        """
+        self.extraBlocks[name] = np.ascontiguousarray(values)
+
+    def addEvent(self, eventType: str, time: float, **values):
+        """Records an event such as a pause or resume in the header
+        :param eventType: kind of event, e.g. PAUSE or RESUME
+        :param time: recording time of the event in seconds
+        :param values: any extra JSON-serializable values of the event
+        """
+        self.events.append({"type": eventType, "time": time, **values})
+
+    def close(self):
+        """Writes the header and all blocks to the session file"""
+        for channel in self.channels:
+            self._spill(timesBlock(channel), TIME_DTYPE)
+            self._spill(voltagesBlock(channel), VOLTAGE_DTYPE)
+
+        blocks = {}
+        offset = 0
+        for name, (_, dtype, count) in self.spills.items():
+            blocks[name] = {"dtype": dtype.str, "shape": [count], "offset": offset}
+            offset = _align(offset + count * dtype.itemsize)
+        for name, values in self.extraBlocks.items():
+            blocks[name] = {
+                "dtype": values.dtype.str,
+                "shape": list(values.shape),
+                "offset": offset,
+            }
+            offset = _align(offset + values.nbytes)
+
+        header = json.dumps(
+            {
+                "sampleRate": self.sampleRate,
+                "channels": self.channels,
+                "epgParameters": dataclasses.asdict(self.epgParameters) if self.epgParameters else None,
+                "events": self.events,
+                "blocks": blocks,
+            }
+        ).encode()
+        dataOffset = _align(PREAMBLE.size + len(header))
+
+        tempPath = self.filepath + ".tmp"
+        with open(tempPath, "wb") as f:
+            f.write(PREAMBLE.pack(SESSION_MAGIC, SESSION_VERSION, len(header)))
+            f.write(header)
+            for name, (spillFile, _, _) in self.spills.items():
+                f.seek(dataOffset + blocks[name]["offset"])
+                spillFile.seek(0)
+                shutil.copyfileobj(spillFile, f)
+            for name, values in self.extraBlocks.items():
+                f.seek(dataOffset + blocks[name]["offset"])
+                f.write(values.tobytes())
+            f.truncate(dataOffset + offset)
+        os.replace(tempPath, self.filepath)
+        self.discard()
+
+    def discard(self):
+        """Removes the spill files without writing the session file"""
+        for spillFile, _, _ in self.spills.values():
+            spillFile.close()
+            os.remove(spillFile.name)
+        self.spills = {}
+
+
+def writeSession(
+    filepath: str,
+    channels: list[int],
+    channelData: list[DataArrays],
+    sampleRate: float = 0,
+    epgParameters: EPGParameters = None,
+    events: list[dict] = None,
+):
+    """Writes already separated channel data to a session file
+    :param filepath: path of the .epgs file to write
+    :param channels: channel numbers in display order
+    :param channelData: samples of each channel, in the same order
+    :param sampleRate: samples per second
+    :param epgParameters: EPG settings the recording was made with
+    :param events: pause/resume events, each a dict with type and time
+    """
+    with SessionWriter(filepath, sampleRate, epgParameters) as writer:
+        for channel, data in zip(channels, channelData):
+            writer.appendChannel(channel, data.times, data.voltages)
+        writer.events.extend(events or [])
+
+
+def convertToSession(sourcePath: str, destPath: str = None) -> str:
+    """Converts a .csv or .ana recording into a session file
+    :param sourcePath: recording to convert
+    :param destPath: session file to write, defaults to the source path
+        with the .epgs extension
+    :returns: path of the written session file
+    """
+    root, fileType = os.path.splitext(sourcePath)
+    if destPath is None:
+        destPath = root + SESSION_EXTENSION
+    match fileType.lower():
+        case ".ana":
+            data = anaReadArrays(sourcePath)
+        case ".csv":
+            data = csvReadArrays(sourcePath)
+        case _:
+            raise ValueError(f"Cannot convert {fileType} files to sessions")
+
+    with SessionWriter(destPath) as writer:
+        writer.append(data)
+        firstChannel = data.channels[0] if len(data) else 0
+        writer.sampleRate = estimateSampleRate(data.times[data.channels == firstChannel])
+    return destPath
@@ -0,0 +1,122 @@
+import logging
+import time
+
+import numpy as np
+
+LOOP_TIME_CONSTANT = 5  # seconds over which errors against the host clock are corrected
+MAX_RATE_ERROR = 0.05  # largest difference allowed from the negotiated sample rate
+RESYNC_THRESHOLD = 1  # seconds of error after which times jump to the host clock
+LOG_INTERVAL = 10  # seconds between drift and jitter statistics in the log
+
+
+class SampleTimebase:
+    """Times the samples of a live recording from their index and the
+    sample rate, instead of from when each sample happened to be parsed.
+    Once per block, the time of its last sample is compared with a
+    monotonic host clock and the difference is corrected over
+    LOOP_TIME_CONSTANT seconds, both in phase and in sample period, like a
+    critically damped phase-locked loop. Sample times then
+    follow the device's clock from one sample to the next, without the
+    jitter of the serial port and event loop, while staying in step with
+    the host clock over the whole recording.
+
+    The drift of the device's clock in parts per million and the jitter of
+    the host clock against the timebase are logged every LOG_INTERVAL
+    seconds.
+    """
+
+    def __init__(self, sampleRate: float, started: float):
+        """
+        :param sampleRate: samples per second negotiated with the device
+        :param started: time the recording started at, according to the Unix epoch
+        """
+        self.nominalPeriod = 1 / sampleRate
+        self.period = self.nominalPeriod
+        # Monotonic clock reading at the start of the recording
+        self.startedMonotonic = time.monotonic() - (time.time() - started)
+        self.anchorIndex = None  # index of the sample the next block is timed from
+        self.anchorTime = 0
+        self.lastBlock = 0  # host time of the last block
+        self.nextIndex = 0  # index of the next sample when the device sends none
+
+        # Statistics since they were last logged
+        self.errorCount = 0
+        self.errorSquares = 0
+        self.maxError = 0
+        self.resyncs = 0
+        self.lastLog = 0
+
+    def hostTime(self) -> float:
+        """Seconds since the start of the recording on the monotonic clock"""
+        return time.monotonic() - self.startedMonotonic
+
+    def blockTimes(self, count: int = 0, indices: np.ndarray = None) -> np.ndarray:
+        """Times a block of samples that has just been read
+        :param count: number of samples, numbered on from the last block
+            when indices is None
+        :param indices: sample counter of each sample, if the device sends one
+        :returns: time of each sample in seconds since the start of the recording
+        """
+        now = self.hostTime()
+        if indices is None:
+            indices = self.nextIndex + np.arange(count)
+        if len(indices) == 0:
+            return np.empty(0)
+        if self.anchorIndex is None:
+            # The first block ends now
+            self.anchorIndex = int(indices[-1])
+            self.anchorTime = now
+        times = self.anchorTime + (indices - self.anchorIndex) * self.period
+        self.nextIndex = int(indices[-1]) + 1
+        self.discipline(now, int(indices[-1]), float(times[-1]))
+        return times
+
+    def discipline(self, now: float, lastIndex: int, lastTime: float):
+        """Corrects the timebase by the error of the last sample of a block
+        against the host clock, in proportion to the time since the last block
+        :param now: host time the block was read at
+        :param lastIndex: index of the last sample of the block
+        :param lastTime: time given to the last sample of the block
+        """
+        error = now - lastTime
+        interval = now - self.lastBlock
+        self.lastBlock = now
+        if abs(error) > RESYNC_THRESHOLD:
+            # Samples were lost or held up, so start again from the host clock
+            correction = error
+            self.resyncs += 1
+        else:
+            correction = error * min(2 * interval / LOOP_TIME_CONSTANT, 1)
+            rateError = self.period / self.nominalPeriod - 1 + error * interval / LOOP_TIME_CONSTANT**2
+            rateError = min(max(rateError, -MAX_RATE_ERROR), MAX_RATE_ERROR)
+            self.period = self.nominalPeriod * (1 + rateError)
+            self.errorCount += 1
+            self.errorSquares += error**2
+            self.maxError = max(self.maxError, abs(error))
+        # Samples never go back in time
+        correction = max(correction, -self.period / 2)
+        self.anchorIndex = lastIndex
+        self.anchorTime = lastTime + correction
+
+        if now - self.lastLog >= LOG_INTERVAL:
+            self.logStatistics()
+            self.lastLog = now
+
+    def drift(self) -> float:
+        """How much faster the device samples than the negotiated rate, in
+        parts per million"""
+        return (self.nominalPeriod / self.period - 1) * 1e6
+
+    def logStatistics(self):
+        """Logs the drift and jitter since they were last logged"""
+        if self.errorCount == 0 and self.resyncs == 0:
+            return
+        jitter = np.sqrt(self.errorSquares / self.errorCount) if self.errorCount else 0
+        logging.info(
+            f"Timebase: drift {self.drift():+.0f} ppm, jitter {jitter * 1000:.2f} ms rms, "
+            f"{self.maxError * 1000:.2f} ms max, {self.resyncs} resyncs."
+        )
+        self.errorCount = 0
+        self.errorSquares = 0
+        self.maxError = 0
+        self.resyncs = 0
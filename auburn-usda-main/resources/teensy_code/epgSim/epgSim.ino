@@ -5,6 +5,25 @@
 
 char transmitBuffer[200];              // buffer to update with data values and send over serial
 
+// Binary framing, used when the host asks for it with BEGIN,<fs>,BINARY
+// Frame: sync word A5 5A, format, values per sample, sample count (uint16),
+// counter of the first sample (uint32), samples, CRC-16/CCITT-FALSE of
+// everything after the sync word. All fields are little-endian.
+const uint8_t SAMPLE_INT16 = 0;
+const int FRAME_SAMPLES = 64;
+const int FRAME_VALUES = 2;            // pre-rect and post-rect voltage
+const int HEADER_SIZE = 10;
+const int FRAME_SIZE = HEADER_SIZE + FRAME_SAMPLES * FRAME_VALUES * 2 + 2;
+const long BINARY_BAUD_RATE = 921600;
+
+bool binaryFraming = false;
+int sampleRate = 100;
+uint32_t sampleCounter = 0;            // index of the next sample
+uint32_t nextSampleMicros = 0;
+int16_t frameSamples[FRAME_SAMPLES * FRAME_VALUES];
+int frameFill = 0;                     // samples in the current frame
+uint8_t frameBuffer[FRAME_SIZE];
+
 // This function executes exactly once at start up
 void setup() {
   Serial.begin(9600);
@@ -18,7 +37,13 @@ void setup() {
   //PARAMS,1,9,2000,0,0,0
   String beginMessage = Serial.readString();           // read begin command
   int fs = parseBegin(beginMessage);         // parse begin command
-  sprintf(transmitBuffer, "BEGIN,%d(Hz)", fs);
+  sampleRate = fs > 0 ? fs : 100;
+  binaryFraming = beginMessage.indexOf("BINARY") >= 0;
+  if (binaryFraming) {
+    sprintf(transmitBuffer, "BEGIN,%d(Hz),BINARY", fs);
+  } else {
+    sprintf(transmitBuffer, "BEGIN,%d(Hz)", fs);
+  }
   Serial.println(transmitBuffer);     
 
   do{
@@ -29,19 +54,77 @@ void setup() {
   float* p = parseParams(paramMessage);
   sprintf(transmitBuffer, "PARAM,%f,%f,%f,%f,%f,%f", p[0], p[1], p[2], p[3], p[4], p[5]);
   Serial.println(transmitBuffer);
+
+  if (binaryFraming) {
+    // Ignored over USB, but lets a hardware UART keep up
+    Serial.flush();
+    Serial.begin(BINARY_BAUD_RATE);
+  }
+  nextSampleMicros = micros();
 }
 
 // This repeats as long as the device is powered on
 void loop() {
-  Serial.println("O," + String(random(1023)) + "," + String(random(1023)));
-  delay(100);
+  if (binaryFraming) {
+    loopBinary();
+    return;
+  }
+  // One line per sample at the negotiated rate, as the host times lines
+  // by their count
+  if ((int32_t)(micros() - nextSampleMicros) >= 0) {
+    Serial.println("O," + String(random(1023)) + "," + String(random(1023)));
+    nextSampleMicros += 1000000UL / sampleRate;
+  }
+}
+
+// Takes samples at the negotiated rate and sends them in frames of
+// FRAME_SAMPLES samples
+void loopBinary() {
+  uint32_t period = 1000000UL / sampleRate;
+  while ((int32_t)(micros() - nextSampleMicros) >= 0) {
+    frameSamples[frameFill * FRAME_VALUES] = random(1023);
+    frameSamples[frameFill * FRAME_VALUES + 1] = random(1023);
+    frameFill++;
+    nextSampleMicros += period;
+    if (frameFill == FRAME_SAMPLES) {
+      sendFrame(sampleCounter);
+      sampleCounter += FRAME_SAMPLES;
+      frameFill = 0;
+    }
+  }
+}
+
+void sendFrame(uint32_t counter) {
+  uint16_t count = FRAME_SAMPLES;
+  frameBuffer[0] = 0xA5;
+  frameBuffer[1] = 0x5A;
+  frameBuffer[2] = SAMPLE_INT16;
+  frameBuffer[3] = FRAME_VALUES;
+  memcpy(frameBuffer + 4, &count, 2);                 // Teensy is little-endian
+  memcpy(frameBuffer + 6, &counter, 4);
+  memcpy(frameBuffer + HEADER_SIZE, frameSamples, FRAME_SAMPLES * FRAME_VALUES * 2);
+  uint16_t crc = crc16(frameBuffer + 2, FRAME_SIZE - 4);
+  memcpy(frameBuffer + FRAME_SIZE - 2, &crc, 2);
+  Serial.write(frameBuffer, FRAME_SIZE);
+}
+
+// CRC-16/CCITT-FALSE: polynomial 0x1021, initial value 0xFFFF
+uint16_t crc16(const uint8_t* data, int length) {
+  uint16_t crc = 0xFFFF;
+  for (int i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
 }
 
 
 int parseBegin(String s){
   std::string std_s = s.c_str();                      // convert s from primitive string to class string
   int ind1 = std_s.find(",");                         // find index of "," which occurs before sampling rate
-  int ind2 = std_s.find("(");                         // find index of "(" which occurs after sampling rate
+  int ind2 = std_s.find_first_of("(,\r\n", ind1+1);  // find end of sampling rate, "(" or "," before BINARY
   int fs = std::stoi(std_s.substr(ind1+1, ind2-ind1));// pick out sampling rate and convert to int
   return fs;
 }
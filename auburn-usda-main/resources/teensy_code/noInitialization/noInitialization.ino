@@ -7,6 +7,6 @@ void setup() {
 // This repeats as long as the device is powered on
 void loop() {
   Serial.println("O," + String(random(400)) + "," + String(random(400)));
-  delay(100);
+  delay(10);                   // 100 Hz, the sample rate the host assumes
 
 }
@@ -0,0 +1,65 @@
+import numpy as np
+
+from package.utils.acquisition_worker import parseDataLines
+
+TRIALS = 300
+OTHER_LINES = [b"PARAM,1,100000,0,1,1000,0", b"", b"INIT", b"O,", b"O,abc,1", b"O,1.5.2,3", b"X,1,2"]
+
+
+def plainParse(lines: bytes) -> tuple[list[float], list[bytes]]:
+    """Parses one line at a time"""
+    voltages = []
+    otherLines = []
+    badLines = []
+    for line in lines.replace(b"\r", b"").split(b"\n")[:-1]:
+        if not line.startswith(b"O,"):
+            otherLines.append(line)
+            continue
+        try:
+            voltages.append(float(line.split(b",")[1]))
+        except (IndexError, ValueError):
+            badLines.append(line)
+    return voltages, otherLines + badLines
+
+
+def randomDataLine(generator: np.random.Generator) -> bytes:
+    pre, post = generator.integers(-1023, 1024, 2)
+    match int(generator.integers(0, 6)):
+        case 0:
+            return b"O,%.4f,%d" % (pre / 7, post)
+        case 1:
+            # Only the pre-rect voltage
+            return b"O,%d" % pre
+        case 2:
+            return b"O,%d,,%d" % (pre, post)
+        case _:
+            return b"O,%d,%d" % (pre, post)
+
+
+def test_matches_parsing_line_by_line():
+    generator = np.random.default_rng(0)
+    for _ in range(TRIALS):
+        count = int(generator.integers(0, 50))
+        # Most blocks hold only well formed lines of one layout
+        mixed = generator.random() < 0.5
+        lines = []
+        for _ in range(count):
+            if mixed and generator.random() < 0.2:
+                lines.append(OTHER_LINES[int(generator.integers(0, len(OTHER_LINES)))])
+            elif mixed:
+                lines.append(randomDataLine(generator))
+            else:
+                lines.append(b"O,%d,%d" % tuple(generator.integers(-1023, 1024, 2)))
+        ending = b"\r\n" if generator.random() < 0.5 else b"\n"
+        block = b"".join(line + ending for line in lines)
+
+        voltages, otherLines = parseDataLines(block)
+        expectedVoltages, expectedOtherLines = plainParse(block)
+        assert voltages.tolist() == expectedVoltages
+        assert otherLines == expectedOtherLines
+
+
+def test_empty_block():
+    voltages, otherLines = parseDataLines(b"")
+    assert len(voltages) == 0
+    assert otherLines == []
@@ -0,0 +1,89 @@
+import numpy as np
+
+from package.utils.binary_frames import (
+    FRAME_SAMPLES,
+    FRAME_VALUES,
+    HEADER,
+    SAMPLE_FLOAT32,
+    SYNC_WORD,
+    FrameParser,
+    encodeFrame,
+    frameSize,
+)
+
+
+def randomFrames(generator: np.random.Generator, frames: int, sampleFormat: int = 0) -> tuple[bytes, np.ndarray]:
+    """Encodes frames of random samples numbered from 0"""
+    samples = generator.integers(-1000, 1000, (frames * FRAME_SAMPLES, FRAME_VALUES))
+    data = b"".join(
+        encodeFrame(i, samples[i : i + FRAME_SAMPLES], sampleFormat)
+        for i in range(0, len(samples), FRAME_SAMPLES)
+    )
+    return data, samples.astype(np.float64)
+
+
+def feedInPieces(parser: FrameParser, data: bytes, generator: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Feeds data in reads of random sizes, as from the serial port"""
+    cuts = np.sort(generator.integers(0, len(data), 20))
+    indices, samples = [], []
+    for start, end in zip(np.r_[0, cuts], np.r_[cuts, len(data)]):
+        blockIndices, blockSamples = parser.feed(data[start:end])
+        indices.append(blockIndices)
+        samples.append(blockSamples)
+    return np.concatenate(indices), np.concatenate(samples)
+
+
+def test_decodes_frames_read_in_any_sizes():
+    generator = np.random.default_rng(0)
+    for sampleFormat in (0, SAMPLE_FLOAT32):
+        data, expected = randomFrames(generator, 50, sampleFormat)
+        parser = FrameParser()
+        indices, samples = feedInPieces(parser, data, generator)
+        assert np.array_equal(indices, np.arange(len(expected)))
+        assert np.array_equal(samples, expected)
+        assert parser.crcErrors == parser.skippedBytes == parser.lostSamples == 0
+        assert parser.carry == b""
+
+
+def test_drops_corrupted_frames_and_resynchronizes():
+    generator = np.random.default_rng(1)
+    data, expected = randomFrames(generator, 20)
+    size = frameSize(0, FRAME_VALUES, FRAME_SAMPLES)
+    corrupted = bytearray(data)
+    for frame in (3, 4, 11):
+        corrupted[frame * size + HEADER.size + 5] ^= 0xFF
+    # Noise before the first frame and a false sync word between two frames
+    noise = b"\x01" + SYNC_WORD + b"\x00\x07" + bytes(20)
+    corrupted = noise + corrupted[: 7 * size] + SYNC_WORD + b"\x09" + corrupted[7 * size :]
+
+    parser = FrameParser()
+    indices, samples = feedInPieces(parser, bytes(corrupted), generator)
+    kept = np.ones(len(expected), dtype=bool)
+    for frame in (3, 4, 11):
+        kept[frame * FRAME_SAMPLES : (frame + 1) * FRAME_SAMPLES] = False
+    assert np.array_equal(indices, np.flatnonzero(kept))
+    assert np.array_equal(samples, expected[kept])
+    assert parser.crcErrors == 3
+    assert parser.lostSamples == 3 * FRAME_SAMPLES
+
+
+def test_skips_a_false_sync_word_without_waiting_for_its_frame():
+    generator = np.random.default_rng(2)
+    data, expected = randomFrames(generator, 1)
+    # A header that claims a frame far larger than the negotiated one
+    falseHeader = HEADER.pack(SYNC_WORD, 0, FRAME_VALUES, 4000, 0)
+    parser = FrameParser()
+    indices, samples = parser.feed(falseHeader + data)
+    assert np.array_equal(indices, np.arange(FRAME_SAMPLES))
+    assert np.array_equal(samples, expected)
+    assert parser.skippedBytes == len(falseHeader)
+
+
+def test_counts_samples_lost_between_frames():
+    generator = np.random.default_rng(3)
+    samples = generator.integers(0, 1023, (FRAME_SAMPLES, FRAME_VALUES))
+    parser = FrameParser()
+    parser.feed(encodeFrame(0, samples))
+    indices, _ = parser.feed(encodeFrame(5 * FRAME_SAMPLES, samples))
+    assert indices[0] == 5 * FRAME_SAMPLES
+    assert parser.lostSamples == 4 * FRAME_SAMPLES
@@ -0,0 +1,207 @@
+import numpy as np
+import pytest
+
+from package.utils.decimation import (
+    RELATIVE_CHANGE_SENSITIVITY,
+    DecimationEngine,
+    minMaxDecimate,
+    relativeChangeIndices,
+)
+from package.utils.enums import DecimationMethod
+from package.utils.min_max_pyramid import BASE_BLOCK, LEVEL_FACTOR, MinMaxPyramid
+
+"""
+Randomized checks of the decimation helpers against plain scans of every
+sample. Voltages are whole numbers so that ties between samples are common
+and sums of squared changes are exact.
+"""
+
+TRIALS = 200
+
+
+def randomChannel(generator: np.random.Generator, maxSamples: int = 3000) -> tuple[np.ndarray, np.ndarray]:
+    """Sample times in increasing order, not evenly spaced, and voltages
+    with repeated values"""
+    count = int(generator.integers(1, maxSamples))
+    times = np.cumsum(generator.uniform(0.0005, 0.0015, count))
+    voltages = generator.integers(-50, 50, count).astype(np.float64)
+    return times, voltages
+
+
+def randomWindow(generator: np.random.Generator, times: np.ndarray) -> tuple[float, float, int]:
+    """Time range, which may reach past either end of the samples, and a
+    chart width in pixels"""
+    start, end = np.sort(generator.uniform(times[0] - 0.01, times[-1] + 0.01, 2))
+    return float(start), float(end), int(generator.integers(1, 400))
+
+
+def plainMinMaxIndices(voltages: list, blockSize: int, first: int = 0, last: int = None) -> list[int]:
+    """Index of the first smallest and first largest sample of each block,
+    in the order they occur"""
+    last = -(-len(voltages) // blockSize) if last is None else last
+    indices = []
+    for block in range(first, last):
+        start = block * blockSize
+        values = voltages[start : start + blockSize]
+        smallest = start + values.index(min(values))
+        largest = start + values.index(max(values))
+        indices += [min(smallest, largest), max(smallest, largest)]
+    return indices
+
+
+def plainSampleRange(times: list, start: float, end: float) -> tuple[int, int]:
+    """Samples within a time range plus one on each side"""
+    low = sum(1 for time in times if time < start)
+    high = sum(1 for time in times if time <= end)
+    return max(low - 1, 0), min(high + 1, len(times))
+
+
+def plainLevelCount(count: int) -> int:
+    """Number of min/max levels of a MinMaxPyramid of count samples"""
+    if count < BASE_BLOCK:
+        return 0
+    levels = 1
+    blockSize = BASE_BLOCK
+    while -(-count // blockSize) > 1:
+        levels += 1
+        blockSize *= LEVEL_FACTOR
+    return levels
+
+
+def plainLevelIndex(samples: int, pixels: int, levels: int) -> int | None:
+    """Level drawn for samples over pixels, None for every sample"""
+    samplesPerPixel = samples / pixels
+    if samplesPerPixel < BASE_BLOCK or levels == 0:
+        return None
+    levelIndex = 0
+    while BASE_BLOCK * LEVEL_FACTOR ** (levelIndex + 1) <= samplesPerPixel:
+        levelIndex += 1
+    return min(levelIndex, levels - 1)
+
+
+def plainMinMaxPoints(times: list, voltages: list, start: float, end: float, pixels: int) -> list[int]:
+    """Indices of the samples a min/max pyramid draws for a time range"""
+    low, high = plainSampleRange(times, start, end)
+    levelIndex = plainLevelIndex(high - low, pixels, plainLevelCount(len(times)))
+    if levelIndex is None:
+        return list(range(low, high))
+    blockSize = BASE_BLOCK * LEVEL_FACTOR**levelIndex
+    return plainMinMaxIndices(voltages, blockSize, low // blockSize, (high - 1) // blockSize + 1)
+
+
+def plainRelativeChangeIndices(voltages: list, sensitivity: float = RELATIVE_CHANGE_SENSITIVITY) -> list[int]:
+    changes = [(voltages[i] - voltages[i - 1]) ** 2 for i in range(1, len(voltages))]
+    threshold = sum(changes) / len(voltages) / sensitivity
+    return [0] + [i + 1 for i, change in enumerate(changes) if change > threshold]
+
+
+def test_min_max_decimate():
+    generator = np.random.default_rng(0)
+    for _ in range(TRIALS):
+        times, voltages = randomChannel(generator)
+        factor = int(generator.integers(1, 100))
+        indices = plainMinMaxIndices(voltages.tolist(), factor)
+        decimatedTimes, decimatedVoltages = minMaxDecimate(times, voltages, factor)
+        assert np.array_equal(decimatedTimes, times[indices])
+        assert np.array_equal(decimatedVoltages, voltages[indices])
+    emptyTimes, emptyVoltages = minMaxDecimate(np.empty(0), np.empty(0), 8)
+    assert len(emptyTimes) == len(emptyVoltages) == 0
+
+
+def test_relative_change_indices():
+    generator = np.random.default_rng(1)
+    for _ in range(TRIALS):
+        _, voltages = randomChannel(generator)
+        # Long flat stretches, so that samples are actually dropped
+        voltages[generator.random(len(voltages)) < 0.7] = 0
+        sensitivity = float(generator.uniform(0.5, 20))
+        expected = plainRelativeChangeIndices(voltages.tolist(), sensitivity)
+        assert relativeChangeIndices(voltages, sensitivity).tolist() == expected
+    assert len(relativeChangeIndices(np.empty(0))) == 0
+
+
+def test_min_max_engine_points():
+    generator = np.random.default_rng(2)
+    for _ in range(TRIALS):
+        times, voltages = randomChannel(generator)
+        engine = DecimationEngine(times, voltages, DecimationMethod.MIN_MAX)
+        start, end, pixels = randomWindow(generator, times)
+        indices = plainMinMaxPoints(times.tolist(), voltages.tolist(), start, end, pixels)
+        pointTimes, pointVoltages = engine.points(start, end, pixels)
+        assert np.array_equal(pointTimes, times[indices])
+        assert np.array_equal(pointVoltages, voltages[indices])
+
+
+def test_stride_engine_points():
+    generator = np.random.default_rng(3)
+    for _ in range(TRIALS):
+        times, voltages = randomChannel(generator)
+        engine = DecimationEngine(times, voltages, DecimationMethod.STRIDE)
+        start, end, pixels = randomWindow(generator, times)
+        low, high = plainSampleRange(times.tolist(), start, end)
+        # Strides are half a min/max block, and as many as fit in the samples
+        strides = sum(1 for k in range(64) if BASE_BLOCK // 2 * LEVEL_FACTOR**k < len(times))
+        levelIndex = plainLevelIndex(high - low, pixels, strides)
+        if levelIndex is None:
+            indices = list(range(low, high))
+        else:
+            factor = BASE_BLOCK // 2 * LEVEL_FACTOR**levelIndex
+            first = max(low // factor - 1, 0) * factor
+            last = min(((high - 1) // factor + 2) * factor, len(times))
+            indices = list(range(first, last, factor))
+        pointTimes, pointVoltages = engine.points(start, end, pixels)
+        assert np.array_equal(pointTimes, times[indices])
+        assert np.array_equal(pointVoltages, voltages[indices])
+
+
+def test_relative_change_engine_points():
+    generator = np.random.default_rng(4)
+    for _ in range(TRIALS):
+        times, voltages = randomChannel(generator)
+        voltages[generator.random(len(voltages)) < 0.5] = 0
+        engine = DecimationEngine(times, voltages, DecimationMethod.RELATIVE_CHANGE)
+        kept = plainRelativeChangeIndices(voltages.tolist())
+        start, end, pixels = randomWindow(generator, times)
+        indices = plainMinMaxPoints(times[kept].tolist(), voltages[kept].tolist(), start, end, pixels)
+        pointTimes, pointVoltages = engine.points(start, end, pixels)
+        assert np.array_equal(pointTimes, times[kept][indices])
+        assert np.array_equal(pointVoltages, voltages[kept][indices])
+
+
+@pytest.mark.parametrize("method", list(DecimationMethod))
+def test_window_voltage_range(method):
+    generator = np.random.default_rng(5)
+    for _ in range(TRIALS // 4):
+        times, voltages = randomChannel(generator)
+        engine = DecimationEngine(times, voltages, method)
+        assert engine.voltageRange() == (voltages.min(), voltages.max())
+        for _ in range(4):
+            start, end, _ = randomWindow(generator, times)
+            inside = [v for t, v in zip(times.tolist(), voltages.tolist()) if start <= t <= end]
+            expected = (min(inside), max(inside)) if inside else None
+            assert engine.windowVoltageRange(start, end) == expected
+
+
+def test_range_min_max():
+    generator = np.random.default_rng(6)
+    for _ in range(TRIALS):
+        times, voltages = randomChannel(generator)
+        pyramid = MinMaxPyramid(times, voltages)
+        values = voltages.tolist()
+        for _ in range(10):
+            low, high = generator.integers(0, len(values) + 1, 2).tolist()
+            expected = (min(values[low:high]), max(values[low:high])) if low < high else None
+            assert pyramid.rangeMinMax(low, high) == expected
+
+
+def test_pyramid_from_level_arrays():
+    generator = np.random.default_rng(7)
+    for _ in range(TRIALS // 4):
+        times, voltages = randomChannel(generator)
+        pyramid = MinMaxPyramid(times, voltages)
+        restored = MinMaxPyramid.fromLevelArrays(times, voltages, pyramid.levelArrays())
+        assert len(restored.levels) == len(pyramid.levels) == plainLevelCount(len(times))
+        start, end, pixels = randomWindow(generator, times)
+        for points, restoredPoints in zip(pyramid.points(start, end, pixels), restored.points(start, end, pixels)):
+            assert np.array_equal(points, restoredPoints)
+        assert restored.voltageRange() == pyramid.voltageRange()
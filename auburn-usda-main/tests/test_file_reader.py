@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from package.utils.file_reader import anaReadArrays, iterAnaChunks
+
+TRIALS = 50
+
+
+def writeAnaFile(path, rows: list[str]):
+    """Writes rows as an .ana file, UTF-16 encoded after a 2-byte marker"""
+    with open(path, "wb") as f:
+        f.write(b"\xff\xfe" + "".join(row + "\r\n" for row in rows).encode("utf-16-le"))
+
+
+def plainParse(rows: list[str]) -> np.ndarray:
+    """Channel, time and voltage of each row, as anaRead has always split them"""
+    values = []
+    for row in rows:
+        if not row:
+            continue
+        channel, time, voltage = row.split()
+        values.append((float(channel), float(time), float(voltage)))
+    return np.array(values).reshape(-1, 3)
+
+
+def randomRows(generator: np.random.Generator) -> list[str]:
+    rows = []
+    for sample in range(int(generator.integers(0, 300))):
+        separator = ["\t", " ", "  ", " \t"][int(generator.integers(0, 4))]
+        channel = int(generator.integers(1, 5))
+        rows.append(separator.join((str(channel), f"{sample / 100:.4f}", f"{generator.uniform(-5, 5):.6f}")))
+        if generator.random() < 0.05:
+            rows.append("")
+    return rows
+
+
+def test_matches_parsing_line_by_line(tmp_path):
+    generator = np.random.default_rng(0)
+    for trial in range(TRIALS):
+        rows = randomRows(generator)
+        path = tmp_path / f"{trial}.ana"
+        writeAnaFile(path, rows)
+        expected = plainParse(rows)
+
+        data = anaReadArrays(str(path))
+        assert np.array_equal(data.channels, expected[:, 0].astype(np.int64))
+        assert np.array_equal(data.times, expected[:, 1])
+        assert np.array_equal(data.voltages, expected[:, 2])
+
+        chunkSize = int(generator.integers(1, 200))
+        chunks = [chunk for chunk, _ in iterAnaChunks(str(path), chunkSize)]
+        assert np.array_equal(np.concatenate([c.times for c in chunks] + [np.empty(0)]), expected[:, 1])
+        assert np.array_equal(np.concatenate([c.voltages for c in chunks] + [np.empty(0)]), expected[:, 2])
+
+
+@pytest.mark.parametrize("row", ["0\t1.0", "0\t2.0\t3.0\t4.0", "1\t2.0\tx", "1 2.0 3.0 4"])
+def test_rows_without_3_values_raise(tmp_path, row):
+    path = tmp_path / "bad.ana"
+    writeAnaFile(path, ["1\t0.0000\t1.5", row, "1\t0.0200\t2.5"])
+    with pytest.raises(ValueError):
+        anaReadArrays(str(path))
+    with pytest.raises(ValueError):
+        list(iterAnaChunks(str(path), 16))
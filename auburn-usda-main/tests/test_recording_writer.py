@@ -0,0 +1,77 @@
+import os
+import threading
+
+import numpy as np
+
+from package.utils.data_classes import DataArrays
+from package.utils.recording_writer import RecordingWriter
+from package.utils.session_file import SessionWriter, readSession
+
+TIMEOUT = 10  # seconds after which a writer call is taken to hang
+
+
+def samples(start: int, count: int) -> DataArrays:
+    indices = np.arange(start, start + count)
+    return DataArrays(indices / 100, indices.astype(np.float64), np.zeros(count, dtype=np.int64))
+
+
+def finishes(call) -> bool:
+    """Whether call returns within TIMEOUT seconds"""
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    return not thread.is_alive()
+
+
+def dataRows(filename: str) -> int:
+    with open(filename) as file:
+        return sum(1 for line in file if ",DATA," in line)
+
+
+def test_failing_session_does_not_hang_flush_or_close(tmp_path):
+    session = SessionWriter(str(tmp_path / "recording.epgs"))
+
+    def failingAppend(data):
+        raise TypeError("unexpected")
+
+    session.append = failingAppend
+    writer = RecordingWriter(str(tmp_path / "recording.csv"), flushInterval=0.05, session=session)
+    writer.append(samples(0, 100))
+    assert finishes(writer.flush)
+    writer.append(samples(100, 100))
+    writer.writeEvent("2.0000,PAUSE\n")
+    assert finishes(writer.close)
+    assert not writer.thread.is_alive()
+    # The csv file is still complete, and the session file is given up on
+    assert dataRows(tmp_path / "recording.csv") == 200
+    assert not os.path.exists(tmp_path / "recording.epgs")
+    assert os.listdir(tmp_path) == ["recording.csv"]
+
+
+def test_resume_without_pause_is_ignored(tmp_path):
+    session = SessionWriter(str(tmp_path / "recording.epgs"))
+    writer = RecordingWriter(str(tmp_path / "recording.csv"), flushInterval=0.05, session=session)
+    writer.append(samples(0, 100))
+    writer.writeEvent("1.0000,RESUME,0.5000\n")
+    writer.writeEvent("1.0000,SAVE,F\n")
+    writer.append(samples(100, 100))
+    assert finishes(writer.close)
+    with readSession(str(tmp_path / "recording.epgs")) as recording:
+        assert len(recording.channelData(0).times) == 200
+        assert recording.events == []
+
+
+def test_discarded_pause_is_removed_from_session(tmp_path):
+    session = SessionWriter(str(tmp_path / "recording.epgs"))
+    writer = RecordingWriter(str(tmp_path / "recording.csv"), flushInterval=0.05, session=session)
+    writer.append(samples(0, 100))
+    writer.writeEvent("0.9900,PAUSE\n")
+    writer.append(samples(100, 50))
+    writer.writeEvent("1.4900,RESUME,0.5000\n")
+    writer.append(samples(150, 20))
+    writer.writeEvent("1.6900,SAVE,F\n")
+    assert finishes(writer.close)
+    with readSession(str(tmp_path / "recording.epgs")) as recording:
+        data = recording.channelData(0)
+        assert np.allclose(data.times, np.r_[np.arange(100), np.arange(150, 170) - 50] / 100)
+        assert recording.events[0]["saved"] is False